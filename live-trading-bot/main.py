@@ -1,4 +1,20 @@
 from AlgorithmImports import *
+import os
+
+import numpy as np
+
+from offline.book import CoarseDay, SymbolBook, select_rows
+from offline.checkpoint import CheckpointError, code_hash, dumps, loads
+from offline.events import EventLog
+from offline.profiling import Profiler
+from offline.rebalance import minimum_order_margin, plan_rebalance
+from offline.signals import evaluate
+
+# Sources of the decision state a checkpoint holds (initial_alloc_done, last purchase prices)
+CHECKPOINT_MODULES = (
+    "main.py", "offline/signals.py", "offline/rebalance.py", "offline/fills.py", "offline/book.py",
+    "offline/checkpoint.py",
+)
 
 class BuffettStrategy(QCAlgorithm):
     def Initialize(self):
@@ -6,6 +22,18 @@ class BuffettStrategy(QCAlgorithm):
         self.SetStartDate(2020, 1, 1)
         self.SetCash(100000)
 
+        # Per-callback timing; True logs PROFILE lines at the end of the run, which
+        # `python -m offline.profiling backtests/<run>` turns into a table and flame graph
+        self.profile = False
+        self.profiler = Profiler(enabled=self.profile)
+        self.profiler.instrument(
+            self, "Log", "Rebalance", "MarketOrder", "InitialAllocate", "RebalancePortfolio",
+            "LogPortfolioSummary", "SelectCoarse",
+        )
+        # Lean binds OnData / OnSecuritiesChanged before Initialize runs, so they delegate to timed methods
+        self._on_data = self.profiler.wrap("OnData", self._on_data)
+        self._on_securities_changed = self.profiler.wrap("OnSecuritiesChanged", self._on_securities_changed)
+
         # Define target stocks and allocation weights
         self.symbols = ["AAPL", "MSFT", "XOM", "GOLD", "NEE"]
         self.target_allocation = {
@@ -21,25 +49,70 @@ class BuffettStrategy(QCAlgorithm):
         self.call_threshold = 0.10
         self.put_threshold = 0.10
         self.dca_fraction = 0.10
+        # Rebalances skip names whose weight is within this distance of the target
+        self.rebalance_band = 0.0
+
+        # Universe mode: > 0 trades the top names by dollar volume from coarse data instead of
+        # self.symbols, splitting universe_weight equally between them
+        self.universe_size = 0
+        self.universe_weight = 0.80
+        self.universe_min_price = 5.0
 
         # Flags and trackers
         self.initial_alloc_done = False
-        self.last_purchase_price = {}
+        # Per-symbol state (last purchase price, ...) in arrays indexed by book column
+        self.book = SymbolBook()
+
+        # Structured event log; set event_log_path to also write JSON lines from a background thread.
+        # Every event is logged unless rate limited, e.g.
+        # {"signal": (1, timedelta(days=5)), "holding": (1, timedelta(days=5))} keeps one per key per 5 days
+        self.event_log_path = None
+        self.event_rate_limits = None
+        self.events = EventLog(
+            self.Log,
+            path=self.event_log_path,
+            rate_limits=self.event_rate_limits,
+            untimed=("holding",),
+        )
+
+        # Decision-state snapshots in the ObjectStore every checkpoint_days (0 turns them off); a restarted
+        # deployment resumes initial_alloc_done and the last purchase prices from one written by the same code
+        self.checkpoint_days = 0
+        self.checkpoint_key = "buffett-strategy/state.snap"
+        # The hash covers the modules that compute the saved state, not just this file
+        folder = os.path.dirname(os.path.abspath(__file__))
+        self.checkpoint_code = code_hash([os.path.join(folder, name) for name in CHECKPOINT_MODULES])
+        self.last_checkpoint = None
+        # Holdings of the restored snapshot, compared once the brokerage holdings are synced
+        self.checkpoint_holdings = None
 
         # Add securities and set raw data mode
         self.symbol_objects = {}
-        for ticker in self.symbols:
-            equity = self.AddEquity(ticker, Resolution.Daily)
-            equity.SetDataNormalizationMode(DataNormalizationMode.Raw)
-            self.symbol_objects[ticker] = equity.Symbol
+        if self.universe_size > 0:
+            self.symbols = []
+            self.target_allocation = {}
+            self.UniverseSettings.Resolution = Resolution.Daily
+            self.UniverseSettings.DataNormalizationMode = DataNormalizationMode.Raw
+            self.AddUniverse(self.SelectCoarse)
+            self.schedule_symbol = self.AddEquity("SPY", Resolution.Daily).Symbol
+        else:
+            for ticker in self.symbols:
+                equity = self.AddEquity(ticker, Resolution.Daily)
+                equity.SetDataNormalizationMode(DataNormalizationMode.Raw)
+                self.symbol_objects[ticker] = equity.Symbol
+                self.book.add(ticker)
+            self.schedule_symbol = self.symbol_objects["AAPL"]
 
         # Set warm-up period
         self.SetWarmUp(timedelta(days=5))
+        self.RestoreCheckpoint()
 
         # Schedule events
-        self.Schedule.On(self.DateRules.EveryDay(), self.TimeRules.AfterMarketOpen(self.symbol_objects["AAPL"], 1), self.InitialAllocate)
-        self.Schedule.On(self.DateRules.MonthStart(self.symbol_objects["AAPL"]), self.TimeRules.At(10, 0), self.RebalancePortfolio)
-        self.Schedule.On(self.DateRules.EveryDay(), self.TimeRules.BeforeMarketClose(self.symbol_objects["AAPL"], 5), self.LogPortfolioSummary)
+        self.Schedule.On(self.DateRules.EveryDay(), self.TimeRules.AfterMarketOpen(self.schedule_symbol, 1), self.InitialAllocate)
+        self.Schedule.On(self.DateRules.MonthStart(self.schedule_symbol), self.TimeRules.At(10, 0), self.RebalancePortfolio)
+        self.Schedule.On(self.DateRules.EveryDay(), self.TimeRules.BeforeMarketClose(self.schedule_symbol, 5), self.LogPortfolioSummary)
+        if self.checkpoint_days > 0:
+            self.Schedule.On(self.DateRules.EveryDay(), self.TimeRules.BeforeMarketClose(self.schedule_symbol, 1), self.SaveCheckpoint)
 
     def InitialAllocate(self):
         """Perform initial purchases to reach target allocations."""
@@ -47,14 +120,8 @@ class BuffettStrategy(QCAlgorithm):
             return
 
         self.Log(f"{self.Time} >> Performing initial allocations")
-        for ticker, weight in self.target_allocation.items():
-            symbol = self.symbol_objects[ticker]
-            if not self.Securities[symbol].HasData:
-                self.Log(f"{self.Time} >> Skipping {ticker}: No data available.")
-                continue
-            self.SetHoldings(symbol, weight)
-            price = self.Securities[symbol].Price
-            self.last_purchase_price[ticker] = price
+        for ticker, price in self.Rebalance():
+            weight = self.target_allocation[ticker]
             self.Log(f"{self.Time} >> Bought {ticker} target weight {weight*100:.0f}% at ${price:.2f}")
         self.initial_alloc_done = True
 
@@ -64,63 +131,210 @@ class BuffettStrategy(QCAlgorithm):
             return
 
         self.Log(f"{self.Time} >> Monthly rebalancing to target allocations")
-        for ticker, weight in self.target_allocation.items():
-            symbol = self.symbol_objects[ticker]
-            if not self.Securities[symbol].HasData:
+        self.Rebalance()
+
+    def Rebalance(self):
+        """Bring every target ticker with data to its weight in one batch, sells first.
+
+        Returns (ticker, price) of the tickers that were priced.
+        """
+        priced = []
+        for ticker in self.target_allocation:
+            if self.Securities[self.symbol_objects[ticker]].HasData:
+                priced.append(ticker)
+            else:
                 self.Log(f"{self.Time} >> Skipping {ticker}: No data available.")
-                continue
-            self.SetHoldings(symbol, weight)
-            self.last_purchase_price[ticker] = self.Securities[symbol].Price
+        symbols = [self.symbol_objects[ticker] for ticker in priced]
+        prices = np.array([self.Securities[symbol].Price for symbol in symbols])
+        plan = plan_rebalance(
+            np.array([self.Portfolio[symbol].Quantity for symbol in symbols]),
+            prices,
+            np.array([self.target_allocation[ticker] for ticker in priced]),
+            self.Portfolio.Cash,
+            np.array([self.Securities[symbol].SymbolProperties.LotSize for symbol in symbols]),
+            self.rebalance_band,
+            # Like SetHoldings, targets net out open orders (queued DCA / DRIP orders)
+            np.array([sum(order.Quantity for order in self.Transactions.GetOpenOrders(symbol)) for symbol in symbols]),
+            minimum_margin=minimum_order_margin(self.universe_size),
+            # Weights apply to the whole portfolio, including holdings without data or a target
+            total_value=self.Portfolio.TotalPortfolioValue,
+        )
+        for column, quantity in zip(plan.columns, plan.quantity):
+            self.MarketOrder(symbols[column], int(quantity))
+        for ticker, price in zip(priced, prices):
+            self.book.last_purchase_price[self.book.column(ticker)] = price
+        return list(zip(priced, prices))
 
     def OnData(self, data):
         """Handle new data points: dividends, DCA triggers, and option signals."""
+        self._on_data(data)
+
+    def _on_data(self, data):
         if self.IsWarmingUp:
             return
 
-        # Process dividend events for DRIP
+        # Gather the slice into arrays and run every check in one batched pass
+        count = self.book.capacity
+        prices = np.zeros(count)
+        has_bar = np.zeros(count, dtype=bool)
+        quantity = np.zeros(count)
+        dividends = np.zeros(count)
         for ticker in self.symbols:
+            column = self.book.column(ticker)
             symbol = self.symbol_objects[ticker]
+            prices[column] = self.Securities[symbol].Price
+            quantity[column] = self.Portfolio[symbol].Quantity
             if data.Dividends.ContainsKey(symbol):
-                dividend = data.Dividends[symbol]
-                shares_owned = self.Portfolio[symbol].Quantity
-                dividend_cash = dividend.Distribution * shares_owned
-                if dividend_cash > 0:
-                    price = self.Securities[symbol].Price
-                    shares_to_buy = int(dividend_cash / price)
-                    if shares_to_buy > 0:
-                        self.MarketOrder(symbol, shares_to_buy)
-                        self.Log(f"{self.Time} >> DRIP: Reinvested dividend ${dividend_cash:.2f} into {shares_to_buy} shares of {ticker} at ${price:.2f}")
-                        self.last_purchase_price[ticker] = price
-
-        # Daily checks for price-based decisions
-        for ticker in self.symbols:
-            symbol = self.symbol_objects[ticker]
-            if not data.ContainsKey(symbol) or data[symbol] is None:
-                continue
-            price = data[symbol].Close
+                dividends[column] = data.Dividends[symbol].Distribution
+            if data.ContainsKey(symbol) and data[symbol] is not None:
+                has_bar[column] = True
+                prices[column] = data[symbol].Close
+
+        intents = evaluate(
+            prices, has_bar, self.book.last_purchase_price, quantity, dividends,
+            self.dca_threshold, self.call_threshold, self.put_threshold, self.dca_fraction,
+        )
+        self.book.last_purchase_price = intents.last_purchase_price
 
-            if ticker in self.last_purchase_price:
-                last_price = self.last_purchase_price[ticker]
-                if price < last_price * (1 - self.dca_threshold):
-                    current_qty = self.Portfolio[symbol].Quantity
-                    shares_to_buy = max(1, int(current_qty * self.dca_fraction))
-                    self.MarketOrder(symbol, shares_to_buy)
-                    self.last_purchase_price[ticker] = price
-                    self.Log(f"{self.Time} >> DCA: Bought additional {shares_to_buy} shares of {ticker} at ${price:.2f} (price dropped {self.dca_threshold*100:.0f}% below last buy)")
+        for column in np.nonzero(intents.drip)[0]:
+            ticker = self.book.keys[column]
+            self.MarketOrder(self.symbol_objects[ticker], int(intents.drip[column]))
+            self.events.emit(
+                "drip", self.Time, "DRIP: Reinvested dividend ${cash:.2f} into {shares} shares of {ticker} at ${price:.2f}",
+                key=ticker, ticker=ticker, cash=intents.dividend_cash[column], shares=int(intents.drip[column]), price=prices[column],
+            )
 
-                if price > last_price * (1 + self.call_threshold):
-                    self.Log(f"{self.Time} >> SIGNAL: Consider selling covered call on {ticker} at ${price:.2f} (+{self.call_threshold*100:.0f}% from last buy)")
+        for column in np.nonzero(intents.dca)[0]:
+            ticker = self.book.keys[column]
+            self.MarketOrder(self.symbol_objects[ticker], int(intents.dca[column]))
+            self.events.emit(
+                "dca", self.Time, "DCA: Bought additional {shares} shares of {ticker} at ${price:.2f} (price dropped {threshold:.0%} below last buy)",
+                key=ticker, ticker=ticker, shares=int(intents.dca[column]), price=prices[column], threshold=self.dca_threshold,
+            )
 
-                if price < last_price * (1 - self.put_threshold):
-                    self.Log(f"{self.Time} >> SIGNAL: Consider buying protective put on {ticker} at ${price:.2f} (-{self.put_threshold*100:.0f}% from last buy)")
+        for column in np.nonzero(intents.covered_call)[0]:
+            ticker = self.book.keys[column]
+            self.events.emit(
+                "signal", self.Time, "SIGNAL: Consider selling covered call on {ticker} at ${price:.2f} (+{threshold:.0%} from last buy)",
+                key=(ticker, "covered_call"), ticker=ticker, kind="covered_call", price=prices[column], threshold=self.call_threshold,
+            )
+
+        for column in np.nonzero(intents.protective_put)[0]:
+            ticker = self.book.keys[column]
+            self.events.emit(
+                "signal", self.Time, "SIGNAL: Consider buying protective put on {ticker} at ${price:.2f} (-{threshold:.0%} from last buy)",
+                key=(ticker, "protective_put"), ticker=ticker, kind="protective_put", price=prices[column], threshold=self.put_threshold,
+            )
+
+    def SelectCoarse(self, coarse):
+        """Pick the universe_size largest names by dollar volume that have fundamentals."""
+        coarse = list(coarse)
+        day = CoarseDay(
+            self.Time, None, None,
+            np.array([c.Price for c in coarse]), None, np.array([c.DollarVolume for c in coarse]),
+            np.array([c.HasFundamentalData for c in coarse], dtype=bool), None, None,
+        )
+        return [coarse[row].Symbol for row in select_rows(day, self.universe_size, self.universe_min_price)]
+
+    def OnSecuritiesChanged(self, changes):
+        """Track universe additions and removals, keeping equal target weights."""
+        self._on_securities_changed(changes)
+
+    def _on_securities_changed(self, changes):
+        if self.universe_size <= 0:
+            return
+        for security in changes.RemovedSecurities:
+            ticker = security.Symbol.Value
+            if ticker not in self.symbol_objects:
+                continue
+            self.Liquidate(security.Symbol)
+            self.book.remove(ticker)
+            del self.symbol_objects[ticker]
+        for security in changes.AddedSecurities:
+            if security.Symbol == self.schedule_symbol:
+                continue
+            self.symbol_objects[security.Symbol.Value] = security.Symbol
+            self.book.add(security.Symbol.Value)
+        self.symbols = list(self.symbol_objects)
+        weight = self.universe_weight / max(len(self.symbols), 1)
+        self.target_allocation = {ticker: weight for ticker in self.symbols}
 
     def LogPortfolioSummary(self):
         """Log a brief summary of the portfolio."""
         total_value = self.Portfolio.TotalPortfolioValue
         cash = self.Portfolio.Cash
-        self.Log(f"{self.Time} >> Portfolio Value: ${total_value:.2f}, Cash: ${cash:.2f}")
+        self.events.emit("summary", self.Time, "Portfolio Value: ${value:.2f}, Cash: ${cash:.2f}", value=total_value, cash=cash)
         for ticker in self.symbols:
             symbol = self.symbol_objects[ticker]
             holding = self.Portfolio[symbol]
             if holding.Invested:
-                self.Log(f"   {ticker}: {holding.Quantity} shares, Avg Price: ${holding.AveragePrice:.2f}, Current: ${self.Securities[symbol].Price:.2f}")
+                self.events.emit(
+                    "holding", self.Time, "   {ticker}: {quantity} shares, Avg Price: ${average:.2f}, Current: ${price:.2f}",
+                    key=ticker, ticker=ticker, quantity=holding.Quantity, average=holding.AveragePrice, price=self.Securities[symbol].Price,
+                )
+
+    def SaveCheckpoint(self, force=False):
+        """Snapshot the decision state once checkpoint_days have passed since the last one."""
+        if self.IsWarmingUp or (not force and self.last_checkpoint and (self.Time - self.last_checkpoint).days < self.checkpoint_days):
+            return
+        tickers = list(self.book.columns)
+        columns = [self.book.column(ticker) for ticker in tickers]
+        state = {"initial_alloc_done": self.initial_alloc_done, "tickers": tickers, "cash": float(self.Portfolio.Cash)}
+        arrays = {
+            "last_purchase_price": self.book.last_purchase_price[columns],
+            "quantity": np.array([float(self.Portfolio[self.symbol_objects[ticker]].Quantity) for ticker in tickers]),
+        }
+        data = dumps(self.Time.date(), self.checkpoint_code, state, arrays)
+        self.ObjectStore.SaveBytes(self.checkpoint_key, bytearray(data))
+        self.last_checkpoint = self.Time
+
+    def RestoreCheckpoint(self):
+        """Load the newest snapshot in live mode if this code wrote it; holdings come from the brokerage.
+
+        Backtests always start over: the local ObjectStore keeps the state a previous run ended with.
+        """
+        if not self.LiveMode or self.checkpoint_days <= 0 or not self.ObjectStore.ContainsKey(self.checkpoint_key):
+            return
+        try:
+            snapshot = loads(bytes(self.ObjectStore.ReadBytes(self.checkpoint_key)), self.checkpoint_key)
+        except CheckpointError as error:
+            self.Log(f"{self.Time} >> Ignoring checkpoint: {error}")
+            return
+        if snapshot.code != self.checkpoint_code:
+            self.Log(f"{self.Time} >> Ignoring checkpoint of {snapshot.day}: written by different code")
+            return
+        if snapshot.day > np.datetime64(self.Time.date(), "D"):
+            self.Log(f"{self.Time} >> Ignoring checkpoint of {snapshot.day}: later than the algorithm time")
+            return
+        self.initial_alloc_done = snapshot.state["initial_alloc_done"]
+        self.checkpoint_holdings = (snapshot.day, {})
+        for ticker, price, quantity in zip(snapshot.state["tickers"], snapshot.arrays["last_purchase_price"], snapshot.arrays["quantity"]):
+            if ticker not in self.book:
+                continue
+            self.book.last_purchase_price[self.book.column(ticker)] = price
+            self.checkpoint_holdings[1][ticker] = quantity
+        self.Log(f"{self.Time} >> Resumed decision state from checkpoint of {snapshot.day}")
+
+    def OnWarmupFinished(self):
+        """Compare the restored snapshot's holdings with the brokerage's, now that they are synced."""
+        if self.checkpoint_holdings is None:
+            return
+        day, holdings = self.checkpoint_holdings
+        self.checkpoint_holdings = None
+        for ticker, quantity in holdings.items():
+            held = self.Portfolio[self.symbol_objects[ticker]].Quantity
+            if held != quantity:
+                self.Log(f"{self.Time} >> Checkpoint of {day} held {quantity:g} {ticker}, portfolio holds {held}")
+
+    def OnEndOfAlgorithm(self):
+        """Flush the event log, report what the rate limits dropped, write the profile and a last checkpoint."""
+        if self.checkpoint_days > 0:
+            self.SaveCheckpoint(force=True)
+        try:
+            self.events.close()
+        except (OSError, TypeError, ValueError) as error:
+            self.Log(f"{self.Time} >> Event log writer failed: {error}")
+        dropped = {category: count for category, count in self.events.dropped().items() if count}
+        if dropped:
+            self.Log(f"{self.Time} >> Event log dropped {dropped}")
+        self.profiler.emit()
@@ -0,0 +1 @@
+"""Offline research tools for BuffettStrategy that run without the Lean container."""
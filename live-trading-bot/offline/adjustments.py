@@ -0,0 +1,216 @@
+"""Compiled split/dividend factor and ticker-map index.
+
+Every ``factor_files/*.csv`` and ``map_files/*.csv`` is packed into one set of
+concatenated NumPy arrays with per-symbol offsets and cached next to the
+columnar bar cache. Lookups are binary searches over those arrays, and
+``adjust`` turns a whole raw bar array into raw, split-adjusted, adjusted or
+total-return prices with a single ``searchsorted``.
+
+Factor rows follow LEAN's convention: a row's factors apply to every date on
+or before the row date and after the previous row's date.
+
+Map rows give the last date each ticker was in use; the first row is the
+listing date.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER, FORMAT_VERSION, Source, fingerprint, is_fresh, write_manifest
+from offline.data import DATA_FOLDER, FactorRows, corporate_actions, yyyymmdd_to_datetime64
+
+NORMALIZATION_MODES = ("raw", "split_adjusted", "adjusted", "total_return")
+
+Factors = namedtuple("Factors", "price_factor split_factor")
+TickerRange = namedtuple("TickerRange", "symbol ticker start end")
+
+
+def _list_csv(folder):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if name.endswith(".csv"))
+
+
+def _pack(groups):
+    """Concatenate per-symbol row lists into (names, offsets, rows)."""
+    names = sorted(groups)
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    for index, name in enumerate(names):
+        offsets[index + 1] = offsets[index] + len(groups[name])
+    rows = [row for name in names for row in groups[name]]
+    return np.array(names), offsets, rows
+
+
+def compile_index(data_folder=None, cache_folder=None):
+    """Parse every factor and map file into the cached index; returns its folder."""
+    root = os.path.join(data_folder or DATA_FOLDER, "equity", "usa")
+    folder = os.path.join(cache_folder or CACHE_FOLDER, "equity", "usa", "adjustments")
+    factor_folder = os.path.join(root, "factor_files")
+    map_folder = os.path.join(root, "map_files")
+
+    factors = {}
+    for name in _list_csv(factor_folder):
+        rows = np.loadtxt(os.path.join(factor_folder, name), delimiter=",", dtype=np.float64, ndmin=2)
+        factors[name[:-4]] = [tuple(row) for row in rows]
+    maps = {}
+    for name in _list_csv(map_folder):
+        with open(os.path.join(map_folder, name)) as handle:
+            rows = [line.strip().split(",") for line in handle if line.strip()]
+        maps[name[:-4]] = [(int(row[0]), row[1]) for row in rows]
+
+    factor_names, factor_offsets, factor_rows = _pack(factors)
+    factor_rows = np.array(factor_rows, dtype=np.float64).reshape(-1, 4)
+    map_names, map_offsets, map_rows = _pack(maps)
+
+    os.makedirs(folder, exist_ok=True)
+    np.savez(
+        os.path.join(folder, "index.npz"),
+        factor_symbols=factor_names,
+        factor_offsets=factor_offsets,
+        factor_dates=yyyymmdd_to_datetime64(factor_rows[:, 0].astype(np.int64)).astype(np.int64),
+        price_factor=factor_rows[:, 1],
+        split_factor=factor_rows[:, 2],
+        reference_price=factor_rows[:, 3],
+        map_symbols=map_names,
+        map_offsets=map_offsets,
+        map_dates=yyyymmdd_to_datetime64([row[0] for row in map_rows]).astype(np.int64),
+        map_tickers=np.array([row[1] for row in map_rows]),
+    )
+    sources = [os.path.join(factor_folder, name) for name in _list_csv(factor_folder)]
+    sources += [os.path.join(map_folder, name) for name in _list_csv(map_folder)]
+    write_manifest(folder, {
+        "version": FORMAT_VERSION,
+        "sources": {path: fingerprint(path) for path in sources},
+    })
+    return folder
+
+
+def _day_numbers(values):
+    return np.asarray(values).astype("datetime64[D]").astype(np.int64)
+
+
+class AdjustmentIndex:
+    """Read-only view of the compiled factor and map arrays."""
+
+    def __init__(self, folder):
+        with np.load(os.path.join(folder, "index.npz")) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+        self.factor_position = {name: index for index, name in enumerate(self.arrays["factor_symbols"])}
+        self.map_position = {name: index for index, name in enumerate(self.arrays["map_symbols"])}
+        self._ticker_ranges = None
+
+    @classmethod
+    def load(cls, data_folder=None, cache_folder=None):
+        """Open the index, recompiling it when a factor or map file changed."""
+        root = os.path.join(data_folder or DATA_FOLDER, "equity", "usa")
+        folder = os.path.join(cache_folder or CACHE_FOLDER, "equity", "usa", "adjustments")
+        sources = [
+            Source(None, os.path.join(root, kind, name))
+            for kind in ("factor_files", "map_files")
+            for name in _list_csv(os.path.join(root, kind))
+        ]
+        if not is_fresh(folder, sources):
+            compile_index(data_folder, cache_folder)
+        return cls(folder)
+
+    def _factor_slice(self, symbol):
+        position = self.factor_position.get(symbol.lower())
+        if position is None:
+            return None
+        offsets = self.arrays["factor_offsets"]
+        return slice(offsets[position], offsets[position + 1])
+
+    def factor_rows(self, symbol):
+        """FactorRows of a symbol (as read_factor_file returns), or None."""
+        rows = self._factor_slice(symbol)
+        if rows is None:
+            return None
+        return FactorRows(
+            self.arrays["factor_dates"][rows].astype("datetime64[D]"),
+            self.arrays["price_factor"][rows],
+            self.arrays["split_factor"][rows],
+            self.arrays["reference_price"][rows],
+        )
+
+    def factors(self, symbol, dates):
+        """Price and split factors in effect on each date (1.0 when unknown)."""
+        days = _day_numbers(dates)
+        rows = self._factor_slice(symbol)
+        if rows is None or rows.start == rows.stop:
+            ones = np.ones(days.shape)
+            return Factors(ones, ones.copy())
+        row_days = self.arrays["factor_dates"][rows]
+        positions = np.searchsorted(row_days, days, side="left")
+        known = positions < len(row_days)
+        positions = np.minimum(positions, len(row_days) - 1)
+        price = np.where(known, self.arrays["price_factor"][rows][positions], 1.0)
+        split = np.where(known, self.arrays["split_factor"][rows][positions], 1.0)
+        return Factors(price, split)
+
+    def dividends_paid(self, symbol, dates):
+        """Cumulative split-adjusted dividends paid on or before each date."""
+        days = _day_numbers(dates)
+        rows = self._factor_slice(symbol)
+        if rows is None or rows.stop - rows.start < 2:
+            return np.zeros(days.shape)
+        row_days = self.arrays["factor_dates"][rows]
+        price_factor = self.arrays["price_factor"][rows]
+        split_factor = self.arrays["split_factor"][rows]
+        reference = self.arrays["reference_price"][rows]
+        # The change between rows i and i+1 is paid on the first day after row i
+        distribution = reference[:-1] * (1 - price_factor[:-1] / price_factor[1:]) * split_factor[:-1]
+        paid = np.concatenate(([0.0], np.cumsum(distribution)))
+        return paid[np.searchsorted(row_days[:-1], days, side="left")]
+
+    def adjust(self, symbol, dates, prices, mode="adjusted"):
+        """Normalize raw prices observed on ``dates`` like LEAN's DataNormalizationMode."""
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode {mode!r}; expected one of {NORMALIZATION_MODES}")
+        prices = np.asarray(prices, dtype=np.float64)
+        if mode == "raw":
+            return prices
+        factors = self.factors(symbol, dates)
+        if mode == "split_adjusted":
+            return prices * factors.split_factor
+        if mode == "adjusted":
+            return prices * factors.price_factor * factors.split_factor
+        return prices * factors.split_factor + self.dividends_paid(symbol, dates)
+
+    def corporate_actions(self, symbol, trading_days):
+        """(dividend, split) arrays of a symbol aligned on trading days."""
+        return corporate_actions(self.factor_rows(symbol), trading_days)
+
+    def ticker(self, symbol, date):
+        """Ticker a map-file symbol traded under on a date, or None outside its listing."""
+        position = self.map_position.get(symbol.lower())
+        if position is None:
+            return None
+        offsets = self.arrays["map_offsets"]
+        row_days = self.arrays["map_dates"][offsets[position]:offsets[position + 1]]
+        day = _day_numbers(date)
+        if len(row_days) == 0 or day < row_days[0] or day > row_days[-1]:
+            return None
+        return str(self.arrays["map_tickers"][offsets[position] + np.searchsorted(row_days, day)])
+
+    def resolve(self, ticker, date):
+        """Map-file symbol that used ``ticker`` on ``date`` (e.g. renames), or None."""
+        if self._ticker_ranges is None:
+            self._ticker_ranges = self._build_ticker_ranges()
+        day = _day_numbers(date)
+        for entry in self._ticker_ranges.get(ticker.lower(), ()):
+            if entry.start <= day <= entry.end:
+                return entry.symbol
+        return None
+
+    def _build_ticker_ranges(self):
+        ranges = {}
+        offsets = self.arrays["map_offsets"]
+        dates = self.arrays["map_dates"]
+        tickers = self.arrays["map_tickers"]
+        for position, symbol in enumerate(self.arrays["map_symbols"]):
+            start = dates[offsets[position]]
+            for row in range(offsets[position], offsets[position + 1]):
+                ranges.setdefault(str(tickers[row]), []).append(TickerRange(str(symbol), str(tickers[row]), start, dates[row]))
+                start = dates[row] + 1
+        return ranges
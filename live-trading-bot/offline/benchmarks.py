@@ -0,0 +1,346 @@
+"""Benchmark suite for the strategy replay and the data path, tracked per commit.
+
+Cases, each at a number of symbols (``--scales``, default 5, 500 and 5,000):
+
+* ``replay``: two years of the vectorized daily BuffettStrategy replay
+  (``offline.engine``) on a synthetic random-walk market.
+* ``minute``: decoding one day of LEAN minute trade zips per symbol with
+  ``offline.data.read_intraday_bars``; ``minute-aapl`` decodes the real
+  ``equity/usa/minute/aapl`` files (not scaled).
+* ``options``: indexing a synthetic option-chain zip of eight contracts per
+  symbol, loading the near-the-money ones and pricing their Greeks.
+* ``results``: locating and parsing the equity chart and the orders of a
+  synthetic Lean result JSON with 20 orders per symbol.
+
+Synthetic files are generated once under the cache folder and reused. Each
+case is timed ``--repeat`` times; the minimum and median are stored as
+``<commit>.json`` (``-dirty`` when the tree has local changes) and compared
+with a baseline run (``--baseline``, default the latest other commit). A case
+is flagged when its minimum grew by more than ``--threshold`` plus the
+run-to-run spread (median over minimum) seen in either run, and by at least
+``--min-delta`` seconds.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time as timer
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+from offline import options
+from offline.cache import CACHE_FOLDER
+from offline.data import DATA_FOLDER, intraday_files, read_intraday_bars
+from offline.engine import Market, StrategyParams, run_backtest
+from offline.results import ResultFile
+
+BENCHMARK_FOLDER = os.path.join(CACHE_FOLDER, "benchmarks")
+DATASET_VERSION = 1
+CASES = ("replay", "minute", "minute-aapl", "options", "results")
+SCALES = (5, 500, 5000)
+# Scale-independent cases run once per suite
+FIXED_CASES = ("minute-aapl",)
+SYNTHETIC_DAY = "20210104"
+REPLAY_DAYS = 504
+CONTRACTS_PER_SYMBOL = 8
+ORDERS_PER_SYMBOL = 20
+
+
+def tickers(count):
+    return tuple(f"S{number:05d}" for number in range(count))
+
+
+def synthetic_market(symbols, days=REPLAY_DAYS, seed=0):
+    """A Market of random-walk daily bars with missing bars, dividends and a few splits."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2019-12-27")
+    dates = np.busday_offset(start, np.arange(days), roll="forward")
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (days, symbols)), axis=0))
+    opens = close * (1 + rng.normal(0, 0.003, (days, symbols)))
+    has_bar = rng.random((days, symbols)) > 0.01
+    close[~has_bar] = np.nan
+    opens[~has_bar] = np.nan
+    dividends = np.zeros((days, symbols))
+    payers = rng.random(symbols) < 0.3
+    dividends[::63] = np.where(payers, 0.25, 0.0)
+    splits = np.ones((days, symbols))
+    splits[rng.integers(0, days, max(symbols // 100, 1)), rng.integers(0, symbols, max(symbols // 100, 1))] = 0.5
+    return Market(tickers(symbols), dates, opens, close, has_bar, dividends, splits)
+
+
+def _dataset_folder(name, scale):
+    return os.path.join(BENCHMARK_FOLDER, f"data-v{DATASET_VERSION}", f"{name}-{scale}")
+
+
+def _ready(folder):
+    return os.path.exists(os.path.join(folder, ".complete"))
+
+
+def _mark_ready(folder):
+    with open(os.path.join(folder, ".complete"), "w"):
+        pass
+
+
+def minute_dataset(symbols, seed=0):
+    """A data folder with one day of minute trade bars for each synthetic symbol."""
+    folder = _dataset_folder("minute", symbols)
+    if _ready(folder):
+        return folder
+    rng = np.random.default_rng(seed)
+    times = (np.arange(390) + 570) * 60000
+    for ticker in tickers(symbols):
+        close = np.round(500000 * np.exp(np.cumsum(rng.normal(0, 0.001, 390)))).astype(np.int64)
+        opens = np.roll(close, 1)
+        opens[0] = close[0]
+        rows = np.column_stack([times, opens, np.maximum(opens, close) + 100, np.minimum(opens, close) - 100, close,
+                                rng.integers(100, 10000, 390)])
+        target = os.path.join(folder, "equity", "usa", "minute", ticker.lower())
+        os.makedirs(target, exist_ok=True)
+        with zipfile.ZipFile(os.path.join(target, f"{SYNTHETIC_DAY}_trade.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(f"{SYNTHETIC_DAY}_{ticker.lower()}_minute_trade.csv",
+                             "\n".join(",".join(map(str, row)) for row in rows.tolist()))
+    _mark_ready(folder)
+    return folder
+
+
+def option_dataset(symbols, seed=0):
+    """A data folder with one option-chain zip of CONTRACTS_PER_SYMBOL contracts per symbol."""
+    folder = _dataset_folder("options", symbols)
+    if _ready(folder):
+        return folder
+    rng = np.random.default_rng(seed)
+    path = options.option_zip_path("synth", SYNTHETIC_DAY, data_folder=folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = symbols * CONTRACTS_PER_SYMBOL
+    strikes = np.round(rng.uniform(50, 150, count), 1)
+    expiries = np.datetime64("2021-01-04") + rng.integers(3, 120, count)
+    times = np.arange(570, 960, 15) * 60000
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for number, (strike, expiry) in enumerate(zip(strikes, expiries)):
+            right = "call" if number % 2 else "put"
+            intrinsic = max(100 - strike, 0) if right == "call" else max(strike - 100, 0)
+            price = int((intrinsic + rng.uniform(0.5, 5)) * 10000)
+            rows = "\n".join(f"{time},{price},{price},{price},{price},{number % 50 + 1}" for time in times)
+            expiry = str(expiry).replace("-", "")
+            archive.writestr(
+                f"{SYNTHETIC_DAY}_synth_minute_trade_american_{right}_{int(strike * 10000)}_{expiry}_{number}.csv", rows
+            )
+    _mark_ready(folder)
+    return folder
+
+
+def result_dataset(symbols, seed=0):
+    """A synthetic Lean result JSON with an hourly equity chart and ORDERS_PER_SYMBOL orders per symbol."""
+    folder = _dataset_folder("results", symbols)
+    path = os.path.join(folder, "result.json")
+    if _ready(folder):
+        return path
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    start = int(np.datetime64("2020-01-01T00:00:00", "s").astype(np.int64))
+    points = 7 * REPLAY_DAYS
+    equity = 100000 * np.exp(np.cumsum(rng.normal(0, 0.002, points)))
+    values = [[start + step * 3600] + [round(value, 2)] * 4 for step, value in enumerate(equity.tolist())]
+    orders = {}
+    for number, ticker in enumerate(np.repeat(tickers(symbols), ORDERS_PER_SYMBOL).tolist()):
+        orders[str(number + 1)] = {
+            "type": 0, "id": number + 1, "symbol": {"value": ticker, "id": f"{ticker} R735QTJ8XC9X", "permtick": ticker},
+            "price": round(float(rng.uniform(10, 500)), 2), "time": "2020-01-02T14:31:00Z",
+            "quantity": float(rng.integers(1, 100)), "status": 3, "tag": "", "properties": {"timeInForce": {}},
+        }
+    document = {
+        "charts": {
+            "Strategy Equity": {"name": "Strategy Equity", "series": {"Equity": {"name": "Equity", "values": values}}},
+            "Benchmark": {"name": "Benchmark", "series": {"Benchmark": {"name": "Benchmark", "values": values}}},
+        },
+        "orders": orders,
+        "statistics": {"Sharpe Ratio": "0.5"},
+    }
+    with open(path, "w") as handle:
+        json.dump(document, handle)
+    _mark_ready(folder)
+    return path
+
+
+def case_setup(case, scale):
+    """Build the inputs of one case and return the function to time."""
+    if case == "replay":
+        market = synthetic_market(scale)
+        symbols = market.symbols
+        params = StrategyParams(
+            start=str(market.days[5]), cash=20000.0 * scale, symbols=symbols,
+            target_allocation={ticker: 0.8 / scale for ticker in symbols},
+        )
+        return lambda: run_backtest(params, market)
+    if case == "minute":
+        folder = minute_dataset(scale)
+        names = tickers(scale)
+        return lambda: [read_intraday_bars(ticker, SYNTHETIC_DAY, "minute", "trade", folder) for ticker in names]
+    if case == "minute-aapl":
+        days = [date for date, _ in intraday_files("aapl", "minute", "trade", DATA_FOLDER)]
+        return lambda: [read_intraday_bars("aapl", date, "minute", "trade", DATA_FOLDER) for date in days]
+    if case == "options":
+        folder = option_dataset(scale)
+
+        def load():
+            # Time the cold path: parse the member names again
+            options._indexes.clear()
+            chain = options.load_chain("synth", SYNTHETIC_DAY, "15:00", spot=100.0, data_folder=folder)
+            return options.chain_greeks(chain)
+
+        return load
+    if case == "results":
+        path = result_dataset(scale)
+
+        def parse():
+            with ResultFile(path, use_index=False) as result:
+                result.series("Strategy Equity", "Equity")
+                return sum(1 for _ in result.iter_orders())
+
+        return parse
+    raise ValueError(f"Unknown case {case!r}; expected one of {CASES}")
+
+
+def time_case(function, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        function()
+        runs.append(timer.perf_counter() - started)
+    return {"min": min(runs), "median": float(np.median(runs)), "runs": runs}
+
+
+def run_suite(cases=CASES, scales=SCALES, repeat=3, report=print):
+    results = {}
+    for case in cases:
+        for scale in ((None,) if case in FIXED_CASES else scales):
+            name = case if scale is None else f"{case}/{scale}"
+            function = case_setup(case, scale)
+            results[name] = time_case(function, repeat)
+            report(f"   {name:<20}{results[name]['min'] * 1000:>10.1f} ms (median {results[name]['median'] * 1000:.1f} ms)")
+    return results
+
+
+def _git(*arguments):
+    try:
+        return subprocess.run(
+            ("git",) + arguments, cwd=os.path.dirname(__file__), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def current_commit():
+    """Short HEAD hash, with ``-dirty`` when tracked files have local changes."""
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if _git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(commit, results, folder=None):
+    folder = folder or os.path.join(BENCHMARK_FOLDER, "results")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{commit}.json")
+    with open(path, "w") as handle:
+        json.dump({"commit": commit, "time": datetime.now().isoformat(timespec="seconds"),
+                   "machine": machine(), "results": results}, handle, indent=1)
+    return path
+
+
+def load_results(folder=None):
+    """Stored suite runs, oldest first."""
+    folder = folder or os.path.join(BENCHMARK_FOLDER, "results")
+    runs = []
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            if name.endswith(".json"):
+                with open(os.path.join(folder, name)) as handle:
+                    runs.append(json.load(handle))
+    return sorted(runs, key=lambda run: run["time"])
+
+
+def find_baseline(runs, commit, baseline=None):
+    """The run of ``baseline`` (a commit prefix), or the latest run of another commit."""
+    if baseline:
+        matches = [run for run in runs if run["commit"].startswith(baseline)]
+        return matches[-1] if matches else None
+    others = [run for run in runs if run["commit"].split("-")[0] != commit.split("-")[0]]
+    return others[-1] if others else None
+
+
+def _spread(timing):
+    return timing["median"] / timing["min"] - 1 if timing["min"] > 0 else 0.0
+
+
+def compare(baseline, current, threshold=0.10, min_delta=0.005):
+    """Rows of (case, baseline s, current s, ratio, flag) for the cases both runs timed.
+
+    Changes smaller than ``min_delta`` seconds are never flagged: millisecond
+    cases jitter by more than any relative threshold.
+    """
+    rows = []
+    for name, timing in current.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = timing["min"] / previous["min"] if previous["min"] > 0 else float("inf")
+        noise = threshold + max(_spread(timing), _spread(previous))
+        flag = ""
+        if abs(timing["min"] - previous["min"]) >= min_delta:
+            flag = "REGRESSION" if ratio > 1 + noise else "faster" if ratio < 1 / (1 + noise) else ""
+        rows.append((name, previous["min"], timing["min"], ratio, flag))
+    return rows
+
+
+def format_comparison(rows, baseline_commit, commit):
+    lines = [f"{'case':<20}{baseline_commit:>14}{commit:>14}{'ratio':>9}"]
+    for name, previous, current, ratio, flag in rows:
+        lines.append(f"{name:<20}{previous * 1000:>11.1f} ms{current * 1000:>11.1f} ms{ratio:>9.2f}  {flag}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the replay and data path and compare with an earlier commit.")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("--scales", nargs="+", type=int, default=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", help="commit to compare against (default: latest run of another commit)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown beyond the noise that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="seconds below which changes are noise")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    commit = current_commit()
+    print(f"Benchmarks at {commit}")
+    results = run_suite(args.cases, args.scales, args.repeat)
+    runs = load_results()
+    if not args.no_save:
+        print(f"Saved {save_results(commit, results)}")
+
+    baseline = find_baseline(runs, commit, args.baseline)
+    if baseline is None:
+        print("No baseline run to compare with")
+        return
+    rows = compare(baseline["results"], results, args.threshold, args.min_delta)
+    print(format_comparison(rows, baseline["commit"], commit))
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regressions beyond the noise threshold")
+        if args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Per-symbol strategy state and coarse universe selection.
+
+Per-symbol strategy state lives in ``SymbolBook``: dense NumPy arrays indexed
+by a column that a dict assigns once per symbol, so adding, looking up or
+dropping a symbol is O(1) and every per-day computation is a vector
+operation over the book, whether it holds five names or three thousand.
+``select_rows`` picks a ``CoarseDay``'s top names by dollar volume.
+
+These are what ``main.py`` needs at run time, so this module only depends on
+NumPy; ``offline.universe`` builds the coarse index and the replay on top.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+COARSE_COLUMNS = ("close", "volume", "dollar_volume", "has_fundamental", "price_factor", "split_factor")
+
+CoarseDay = namedtuple("CoarseDay", "date security symbol " + " ".join(COARSE_COLUMNS))
+
+
+def select_rows(day, size, min_price=5.0, require_fundamental=True):
+    """Indices into a CoarseDay of its top ``size`` names by dollar volume."""
+    eligible = day.close >= min_price
+    if require_fundamental:
+        eligible &= day.has_fundamental
+    candidates = np.flatnonzero(eligible)
+    if len(candidates) > size:
+        top = np.argpartition(-day.dollar_volume[candidates], size - 1)[:size]
+        candidates = candidates[top]
+    return candidates[np.argsort(-day.dollar_volume[candidates], kind="stable")]
+
+
+class SymbolBook:
+    """Per-symbol strategy state in dense arrays, grown by doubling.
+
+    ``columns`` maps a symbol key (ticker or security id) to its column; a
+    dropped symbol's column is recycled for the next new one.
+    """
+
+    FIELDS = ("quantity", "pending", "weight", "price", "last_purchase_price")
+
+    def __init__(self, capacity=64):
+        self.columns = {}
+        self.keys = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.active = np.zeros(capacity, dtype=bool)
+        self.quantity = np.zeros(capacity)
+        self.pending = np.zeros(capacity)
+        self.weight = np.zeros(capacity)
+        self.price = np.full(capacity, np.nan)
+        self.last_purchase_price = np.full(capacity, np.nan)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    @property
+    def capacity(self):
+        return len(self.active)
+
+    def _grow(self):
+        size = self.capacity
+        self.keys.extend([None] * size)
+        self.free.extend(range(2 * size - 1, size - 1, -1))
+        self.active = np.concatenate((self.active, np.zeros(size, dtype=bool)))
+        for name in self.FIELDS:
+            fill = np.nan if name in ("price", "last_purchase_price") else 0.0
+            setattr(self, name, np.concatenate((getattr(self, name), np.full(size, fill))))
+
+    def add(self, key):
+        """Column of a symbol, assigning a fresh one on first sight."""
+        column = self.columns.get(key)
+        if column is None:
+            if not self.free:
+                self._grow()
+            column = self.free.pop()
+            self.columns[key] = column
+            self.keys[column] = key
+            self.active[column] = True
+        return column
+
+    def remove(self, key):
+        """Drop a symbol and reset its column for reuse."""
+        column = self.columns.pop(key, None)
+        if column is None:
+            return
+        self.keys[column] = None
+        self.active[column] = False
+        self.quantity[column] = self.pending[column] = self.weight[column] = 0.0
+        self.price[column] = self.last_purchase_price[column] = np.nan
+        self.free.append(column)
+
+    def column(self, key):
+        return self.columns.get(key)
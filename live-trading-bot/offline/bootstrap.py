@@ -0,0 +1,201 @@
+"""Bootstrap robustness of a strategy's daily returns.
+
+One backtest is one path; resampling its daily returns gives a distribution
+of CAGR, maximum drawdown and Sharpe ratio instead. Two resamplers are
+offered:
+
+* ``block``: circular moving-block bootstrap. Blocks of ``block`` consecutive
+  days keep short-range dependence (volatility clustering, the DCA/rebalance
+  rhythm) while the order of blocks is random.
+* ``shuffle``: a random permutation of the same returns per path. CAGR and
+  Sharpe do not change under a permutation, so this isolates how much of the
+  drawdown comes from the particular order of days.
+
+Paths are (paths, days) float32 arrays of log returns, built ``chunk`` paths
+at a time so the working set stays under ``memory_bytes`` whatever the number
+of paths. Only the drawdown needs the whole path (a cumulative sum and running
+peak per row); block-bootstrap CAGR and Sharpe come from prefix sums of the
+returns over each sampled block.
+"""
+import argparse
+import time as timer
+
+import numpy as np
+
+from offline.market_hours import MarketCalendar
+from offline.metrics import TRADING_DAYS_PER_YEAR, cagr, daily_returns, max_drawdown, sharpe_ratio
+from offline.results import ResultFile
+
+METHODS = ("block", "shuffle")
+METRICS = ("cagr", "drawdown", "sharpe")
+DEFAULT_LEVELS = (0.025, 0.05, 0.5, 0.95, 0.975)
+# Per path and day: the float32 log growth and its running peak (plus the shuffle's copy)
+BYTES_PER_CELL = 3 * 4
+# Seconds to subtract from UTC chart times to land on the New York trading day
+EXCHANGE_OFFSET = 4 * 3600
+
+
+def equity_from_result(path, chart="Strategy Equity", series="Equity"):
+    """Closing equity of each trading day from a Lean result JSON.
+
+    The chart is sampled on calendar days and intraday; the last point of each
+    exchange-calendar trading day is kept.
+    """
+    with ResultFile(path) as result:
+        points = np.asarray(result.series(chart, series), dtype=np.float64)
+    if not len(points):
+        return np.empty(0)
+    # Chart times are UTC seconds; a fixed -4h shift puts EST and EDT midnights on their own day
+    days = ((points[:, 0].astype(np.int64) - EXCHANGE_OFFSET) // 86400).astype("datetime64[D]")
+    last = np.append(days[1:] != days[:-1], True)
+    keep = last & MarketCalendar.load().is_trading_day(days)
+    # Candlestick points are [time, open, high, low, close]; plain ones [time, value]
+    return points[keep, -1]
+
+
+def equity_from_replay(params=None, data_folder=None):
+    """Daily equity of an offline replay of BuffettStrategy."""
+    from offline.engine import run_backtest
+
+    return run_backtest(params, data_folder=data_folder).equity
+
+
+def block_starts(generator, paths, length, block):
+    """(paths, blocks) random start days of a circular moving-block bootstrap."""
+    return generator.integers(0, length, size=(paths, -(-length // block)))
+
+
+def _block_sums(prefix, starts, block, length):
+    """Per-path sums of a daily series over the sampled blocks, the last one truncated."""
+    blocks = starts.shape[1]
+    tail = length - (blocks - 1) * block
+    full = prefix[starts[:, :-1] + block] - prefix[starts[:, :-1]]
+    return full.sum(axis=1) + prefix[starts[:, -1] + tail] - prefix[starts[:, -1]]
+
+
+def block_paths(log_returns, starts, block):
+    """(paths, days) float32 log returns of the sampled blocks (days wrap around)."""
+    length = len(log_returns)
+    extended = np.concatenate([log_returns, log_returns[:block - 1]]).astype(np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(extended, block)
+    return windows[starts].reshape(len(starts), -1)[:, :length]
+
+
+def shuffled_paths(generator, log_returns, paths):
+    """(paths, days) float32 log returns, an independent permutation per path."""
+    tiled = np.broadcast_to(log_returns.astype(np.float32), (paths, len(log_returns)))
+    return generator.permuted(tiled, axis=1)
+
+
+def path_drawdowns(log_returns):
+    """Maximum drawdown of each row of a (paths, days) log-return array, overwriting it."""
+    growth = np.cumsum(log_returns, axis=1, out=log_returns)
+    peaks = np.maximum.accumulate(growth, axis=1)
+    np.subtract(peaks, growth, out=peaks)
+    # The path starts at zero log growth, which is also a peak
+    worst = np.maximum(peaks.max(axis=1), -growth.min(axis=1))
+    return -np.expm1(-worst.astype(np.float64))
+
+
+def _sharpe(total, total_squares, length, periods_per_year):
+    mean = total / length
+    variance = (total_squares - length * mean ** 2) / (length - 1)
+    deviation = np.sqrt(np.maximum(variance, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(deviation > 0, mean / deviation * np.sqrt(periods_per_year), 0.0)
+
+
+def simulate(returns, paths=10000, method="block", block=20, seed=None, memory_bytes=256 << 20, chunk=None,
+             periods_per_year=TRADING_DAYS_PER_YEAR):
+    """Metric samples of ``paths`` resampled paths: {"cagr": array, "drawdown": ..., "sharpe": ...}."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}; expected one of {METHODS}")
+    returns = np.asarray(returns, dtype=np.float64)
+    log_returns = np.log1p(returns)
+    length = len(returns)
+    if length < 2:
+        raise ValueError("Need at least two returns to resample")
+    block = max(1, min(block, length))
+    chunk = chunk or max(1, memory_bytes // (length * BYTES_PER_CELL))
+    samples = {name: np.empty(paths) for name in METRICS}
+    if method == "shuffle":
+        # A permutation keeps the sums, so only the drawdown varies
+        samples["cagr"][:] = np.expm1(log_returns.sum() * periods_per_year / length)
+        samples["sharpe"][:] = sharpe_ratio(returns, periods_per_year)
+    else:
+        # Block sums come from prefix sums over the wrapped-around series
+        wrapped = np.concatenate([returns, returns[:block]])
+        prefixes = {
+            name: np.concatenate([[0.0], np.cumsum(values)])
+            for name, values in (("log", np.log1p(wrapped)), ("simple", wrapped), ("squares", wrapped ** 2))
+        }
+    # One child stream per chunk: reproducible for a seed and chunk size
+    streams = np.random.SeedSequence(seed).spawn(-(-paths // chunk))
+    for first, stream in zip(range(0, paths, chunk), streams):
+        count = min(chunk, paths - first)
+        rows = slice(first, first + count)
+        generator = np.random.default_rng(stream)
+        if method == "shuffle":
+            samples["drawdown"][rows] = path_drawdowns(shuffled_paths(generator, log_returns, count))
+            continue
+        starts = block_starts(generator, count, length, block)
+        growth = _block_sums(prefixes["log"], starts, block, length)
+        samples["cagr"][rows] = np.expm1(growth * periods_per_year / length)
+        samples["sharpe"][rows] = _sharpe(
+            _block_sums(prefixes["simple"], starts, block, length),
+            _block_sums(prefixes["squares"], starts, block, length),
+            length, periods_per_year,
+        )
+        samples["drawdown"][rows] = path_drawdowns(block_paths(log_returns, starts, block))
+    return samples
+
+
+def confidence_intervals(samples, levels=DEFAULT_LEVELS):
+    """{metric: {level: quantile}} of simulate's samples."""
+    return {
+        name: dict(zip(levels, np.quantile(values, levels)))
+        for name, values in samples.items()
+    }
+
+
+def observed(equity, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """The metrics of the original path, for comparison with the intervals."""
+    return {
+        "cagr": cagr(equity, periods_per_year),
+        "drawdown": max_drawdown(equity),
+        "sharpe": sharpe_ratio(daily_returns(equity), periods_per_year),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals of CAGR, drawdown and Sharpe.")
+    parser.add_argument("--result", help="Lean result JSON to take the equity curve from (default: offline replay)")
+    parser.add_argument("--end", help="end date of the offline replay")
+    parser.add_argument("--paths", type=int, default=100000)
+    parser.add_argument("--method", default="block", choices=METHODS + ("both",))
+    parser.add_argument("--block", type=int, default=20, help="block length in days")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--memory-mb", type=int, default=256, help="bound on the per-chunk working set")
+    args = parser.parse_args()
+
+    if args.result:
+        equity = equity_from_result(args.result)
+    else:
+        from offline.engine import StrategyParams
+
+        equity = equity_from_replay(StrategyParams(end=args.end))
+    returns = daily_returns(equity)
+    baseline = observed(equity)
+    print(f"{len(returns)} daily returns: " + ", ".join(f"{name} {value:.4f}" for name, value in baseline.items()))
+
+    for method in METHODS if args.method == "both" else (args.method,):
+        started = timer.perf_counter()
+        samples = simulate(returns, args.paths, method, args.block, args.seed, args.memory_mb << 20)
+        elapsed = timer.perf_counter() - started
+        print(f"{method}: {args.paths} paths in {elapsed:.2f} s")
+        for name, quantiles in confidence_intervals(samples).items():
+            print(f"   {name:<9}" + "  ".join(f"p{level * 100:g} {value:8.4f}" for level, value in quantiles.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Columnar, memory-mapped cache of the LEAN equity zip/CSV tree.
+
+Each (ticker, resolution, trade/quote) series is converted once into a folder
+of ``.npy`` columns: ``time`` holds int64 epoch milliseconds (exchange time)
+and every price/size column stays in LEAN's integer deci-cent units. A
+``days``/``offsets`` pair indexes the rows of each trading day, so one day or
+a date range is a zero-copy slice of the memory-mapped arrays.
+
+``manifest.json`` records the mtime, size and SHA-1 of every source zip. A
+series is rebuilt when files appear or disappear or when a zip's content hash
+changes; a touched zip with unchanged content only refreshes the manifest.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+
+from offline.data import (
+    DATA_FOLDER,
+    MILLISECONDS_PER_DAY,
+    QUOTE_COLUMNS,
+    TRADE_COLUMNS,
+    WHOLE_HISTORY_RESOLUTIONS,
+    equity_path,
+    intraday_files,
+    read_day_rows,
+    read_history_rows,
+    to_bars,
+)
+
+CACHE_FOLDER = os.path.join(os.path.dirname(DATA_FOLDER), ".cache", "columnar")
+FORMAT_VERSION = 1
+
+Source = namedtuple("Source", "date path")
+
+
+def column_names(kind):
+    return TRADE_COLUMNS if kind == "trade" else QUOTE_COLUMNS
+
+
+def series_folder(ticker, resolution="daily", kind="trade", cache_folder=None):
+    """Return the cache folder of one ticker/resolution/kind series."""
+    return os.path.join(cache_folder or CACHE_FOLDER, "equity", "usa", resolution, ticker.lower(), kind)
+
+
+def list_sources(ticker, resolution="daily", kind="trade", data_folder=None):
+    """List the source zips a series is built from."""
+    if resolution in WHOLE_HISTORY_RESOLUTIONS:
+        path = equity_path(ticker, resolution, data_folder)
+        return [Source(None, path)] if kind == "trade" and os.path.exists(path) else []
+    return [Source(date, path) for date, path in intraday_files(ticker, resolution, kind, data_folder)]
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": file_sha1(path)}
+
+
+def read_manifest(folder):
+    try:
+        with open(os.path.join(folder, "manifest.json")) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(folder, manifest):
+    path = os.path.join(folder, "manifest.json")
+    with open(path + ".tmp", "w") as handle:
+        json.dump(manifest, handle)
+    os.replace(path + ".tmp", path)
+
+
+def is_fresh(folder, sources):
+    """Check a cached series against its sources, refreshing touched-but-equal mtimes."""
+    manifest = read_manifest(folder)
+    if not manifest or manifest.get("version") != FORMAT_VERSION:
+        return False
+    recorded = manifest["sources"]
+    if set(recorded) != {source.path for source in sources}:
+        return False
+
+    touched = False
+    for source in sources:
+        entry = recorded[source.path]
+        stat = os.stat(source.path)
+        if stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]:
+            continue
+        if stat.st_size != entry["size"] or file_sha1(source.path) != entry["sha1"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        touched = True
+    if touched:
+        write_manifest(folder, manifest)
+    return True
+
+
+def build_series(ticker, resolution="daily", kind="trade", data_folder=None, cache_folder=None):
+    """Convert a series' zips into columnar .npy files; returns the folder or None."""
+    sources = list_sources(ticker, resolution, kind, data_folder)
+    if not sources:
+        return None
+    names = column_names(kind)
+    times = []
+    blocks = []
+    for source in sources:
+        if source.date is None:
+            time, rows = read_history_rows(source.path, len(names))
+        else:
+            time, rows = read_day_rows(source.path, source.date, len(names))
+        times.append(time)
+        blocks.append(rows)
+
+    time = np.concatenate(times)
+    rows = np.concatenate(blocks)
+    order = np.argsort(time, kind="stable")
+    time = time[order]
+    rows = rows[order]
+    days, offsets = day_index(time)
+
+    folder = series_folder(ticker, resolution, kind, cache_folder)
+    staging = folder + ".building"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, "time.npy"), time)
+    np.save(os.path.join(staging, "days.npy"), days)
+    np.save(os.path.join(staging, "offsets.npy"), offsets)
+    for index, name in enumerate(names):
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(rows[:, index]))
+    write_manifest(staging, {
+        "version": FORMAT_VERSION,
+        "ticker": ticker.lower(),
+        "resolution": resolution,
+        "kind": kind,
+        "columns": list(names),
+        "rows": int(len(time)),
+        "sources": {source.path: fingerprint(source.path) for source in sources},
+    })
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(staging, folder)
+    return folder
+
+
+def day_index(time):
+    """Return the distinct day numbers of sorted epoch-ms times and their row offsets."""
+    day_numbers = time // MILLISECONDS_PER_DAY
+    days = np.unique(day_numbers)
+    offsets = np.searchsorted(day_numbers, np.append(days, days[-1] + 1) if len(days) else days)
+    return days, offsets
+
+
+class ColumnarSeries:
+    """Memory-mapped view of one cached series."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.manifest = read_manifest(folder)
+        self.time = np.load(os.path.join(folder, "time.npy"), mmap_mode="r")
+        self.days = np.load(os.path.join(folder, "days.npy"))
+        self.offsets = np.load(os.path.join(folder, "offsets.npy"))
+        self.columns = {
+            name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+            for name in self.manifest["columns"]
+        }
+
+    @property
+    def kind(self):
+        return self.manifest["kind"]
+
+    def __len__(self):
+        return len(self.time)
+
+    def day_rows(self, date):
+        """Row slice of one trading day (empty when the day is missing)."""
+        day = np.datetime64(date, "D").astype(np.int64)
+        position = int(np.searchsorted(self.days, day))
+        if position == len(self.days) or self.days[position] != day:
+            return slice(0, 0)
+        return slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+
+    def range_rows(self, start=None, end=None):
+        """Row slice of bars with start <= time < end (datetime-like bounds)."""
+        first = 0 if start is None else int(np.searchsorted(self.time, _epoch_ms(start)))
+        last = len(self.time) if end is None else int(np.searchsorted(self.time, _epoch_ms(end)))
+        return slice(first, last)
+
+    def raw(self, rows):
+        """Zero-copy (time, {column: int64 array}) for a row slice."""
+        return self.time[rows], {name: values[rows] for name, values in self.columns.items()}
+
+    def bars(self, rows=slice(None)):
+        """Decode a row slice into Bars/QuoteBars with float prices."""
+        time, columns = self.raw(rows)
+        stacked = np.column_stack([columns[name] for name in column_names(self.kind)])
+        return to_bars(time, stacked, self.kind)
+
+
+def _epoch_ms(value):
+    return np.datetime64(value, "ms").astype(np.int64)
+
+
+def open_series(ticker, resolution="daily", kind="trade", data_folder=None, cache_folder=None):
+    """Return a ColumnarSeries, building or rebuilding the cache when stale."""
+    folder = series_folder(ticker, resolution, kind, cache_folder)
+    sources = list_sources(ticker, resolution, kind, data_folder)
+    if not sources:
+        return None
+    if not is_fresh(folder, sources):
+        build_series(ticker, resolution, kind, data_folder, cache_folder)
+    return ColumnarSeries(folder)
+
+
+def available_series(data_folder=None):
+    """Yield (ticker, resolution, kind) for every equity series in the data tree."""
+    root = os.path.join(data_folder or DATA_FOLDER, "equity", "usa")
+    for resolution in WHOLE_HISTORY_RESOLUTIONS:
+        folder = os.path.join(root, resolution)
+        if os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".zip"):
+                    yield name[:-4], resolution, "trade"
+    for resolution in ("minute", "second"):
+        folder = os.path.join(root, resolution)
+        if not os.path.isdir(folder):
+            continue
+        for ticker in sorted(os.listdir(folder)):
+            for kind in ("trade", "quote"):
+                if intraday_files(ticker, resolution, kind, data_folder):
+                    yield ticker, resolution, kind
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar cache of the equity data tree.")
+    parser.add_argument("tickers", nargs="*", help="tickers to build (default: every series)")
+    parser.add_argument("--resolution", default=None)
+    parser.add_argument("--kind", default=None, choices=("trade", "quote"))
+    parser.add_argument("--data-folder")
+    parser.add_argument("--cache-folder")
+    args = parser.parse_args()
+
+    wanted = {ticker.lower() for ticker in args.tickers}
+    for ticker, resolution, kind in available_series(args.data_folder):
+        if wanted and ticker not in wanted:
+            continue
+        if args.resolution and resolution != args.resolution:
+            continue
+        if args.kind and kind != args.kind:
+            continue
+        series = open_series(ticker, resolution, kind, args.data_folder, args.cache_folder)
+        print(f"{ticker} {resolution} {kind}: {len(series)} rows, {len(series.days)} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""SQLite catalog of archived backtest runs.
+
+Every ``backtests/<timestamp>/`` folder is ingested once: the code hash and the
+literal parameters of ``code/main.py``, the headline statistics, the
+configured and traded time range and the data-monitor request counts. A run
+is re-ingested only when the signature of its files changes, and runs whose
+folder disappeared are dropped, so ``ingest`` is cheap to call before every
+query.
+
+Statistics and parameters are stored one row per name with a numeric value
+column, so queries like "best Sharpe among runs with dca_threshold=0.05" are
+indexed lookups::
+
+    best_runs(connection, "Sharpe Ratio", {"dca_threshold": 0.05})
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+
+from offline.cache import CACHE_FOLDER
+from offline.results import ResultFile
+from offline.source import code_hash, extract_parameters
+
+BACKTESTS_FOLDER = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "backtests"))
+CATALOG_PATH = os.path.join(CACHE_FOLDER, "catalog.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_dir TEXT PRIMARY KEY,
+    run_id TEXT,
+    signature TEXT NOT NULL,
+    code_hash TEXT,
+    status TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    first_trade TEXT,
+    last_trade TEXT,
+    succeeded_requests INTEGER,
+    failed_requests INTEGER,
+    failed_requests_percentage REAL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_dir TEXT NOT NULL REFERENCES runs(run_dir) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_dir, name)
+);
+CREATE TABLE IF NOT EXISTS statistics (
+    run_dir TEXT NOT NULL REFERENCES runs(run_dir) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_dir, name)
+);
+CREATE TABLE IF NOT EXISTS failed_data_requests (
+    run_dir TEXT NOT NULL REFERENCES runs(run_dir) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_dir, path)
+);
+CREATE INDEX IF NOT EXISTS parameters_by_value ON parameters(name, value);
+CREATE INDEX IF NOT EXISTS statistics_by_value ON statistics(name, value);
+CREATE INDEX IF NOT EXISTS runs_by_code ON runs(code_hash);
+"""
+
+
+def connect(path=None):
+    """Open (and create if needed) the catalog database."""
+    path = path or CATALOG_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def parse_number(text):
+    """Turn Lean statistic strings ("2.316%", "$25.00", "0.69") into floats."""
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text)
+    if not isinstance(text, str):
+        return None
+    cleaned = text.strip().replace("$", "").replace(",", "")
+    scale = 1.0
+    if cleaned.endswith("%"):
+        cleaned = cleaned[:-1]
+        scale = 0.01
+    try:
+        return float(cleaned) * scale
+    except ValueError:
+        return None
+
+
+def folder_signature(run_dir):
+    """Hash of the names, sizes and mtimes of every file in a run folder."""
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(run_dir)):
+        for name in sorted(files):
+            if name.endswith(".index"):
+                continue
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f"{os.path.relpath(os.path.join(root, name), run_dir)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def _first(run_dir, pattern):
+    matches = sorted(glob.glob(os.path.join(run_dir, pattern)))
+    return matches[0] if matches else None
+
+
+def _result_paths(run_dir):
+    """(summary json, full result json) of a run, either may be None."""
+    summary = _first(run_dir, "*-summary.json")
+    results = [
+        path for path in glob.glob(os.path.join(run_dir, "*.json"))
+        if os.path.basename(path).split(".")[0].isdigit()
+    ]
+    return summary, (sorted(results)[0] if results else None)
+
+
+def read_run(run_dir):
+    """Collect the catalog fields of one run folder."""
+    summary_path, result_path = _result_paths(run_dir)
+    source = summary_path or result_path
+    statistics = {}
+    configuration = {}
+    state = {}
+    trade_statistics = {}
+    if source:
+        with ResultFile(source, use_index=False) as result:
+            statistics = result.section("statistics", {}) or {}
+            configuration = result.section("algorithmConfiguration", {}) or {}
+            state = result.section("state", {}) or {}
+            performance = result.section("totalPerformance", {}) or {}
+        trade_statistics = performance.get("tradeStatistics", {})
+        for group in ("tradeStatistics", "portfolioStatistics"):
+            for name, value in performance.get(group, {}).items():
+                statistics.setdefault(f"{group}.{name}", value)
+
+    parameters = {}
+    main_path = os.path.join(run_dir, "code", "main.py")
+    if os.path.exists(main_path):
+        with open(main_path) as handle:
+            try:
+                parameters = extract_parameters(handle.read())
+            except SyntaxError:
+                parameters = {}
+    parameters.update(configuration.get("parameters") or {})
+
+    monitor = {}
+    monitor_path = _first(run_dir, "data-monitor-report-*.json")
+    if monitor_path:
+        with open(monitor_path) as handle:
+            monitor = json.load(handle)
+
+    failed = {}
+    failed_path = _first(run_dir, "failed-data-requests-*.txt")
+    if failed_path:
+        with open(failed_path) as handle:
+            for line in handle:
+                if line.strip():
+                    failed[line.strip()] = failed.get(line.strip(), 0) + 1
+
+    code_folder = os.path.join(run_dir, "code")
+    return {
+        "run_id": os.path.basename(source).split("-")[0].split(".")[0] if source else None,
+        "code_hash": code_hash(code_folder) if os.path.isdir(code_folder) else None,
+        "status": state.get("Status"),
+        "start_date": configuration.get("startDate"),
+        "end_date": configuration.get("endDate"),
+        "first_trade": trade_statistics.get("startDateTime"),
+        "last_trade": trade_statistics.get("endDateTime"),
+        "succeeded_requests": monitor.get("succeeded-data-requests-count"),
+        "failed_requests": monitor.get("failed-data-requests-count"),
+        "failed_requests_percentage": monitor.get("failed-data-requests-percentage"),
+        "parameters": parameters,
+        "statistics": statistics,
+        "failed_paths": failed,
+    }
+
+
+def ingest(connection, backtests_folder=None):
+    """Bring the catalog up to date with the run folders; returns (added, updated, removed)."""
+    folder = backtests_folder or BACKTESTS_FOLDER
+    run_dirs = sorted(path for path in glob.glob(os.path.join(folder, "*")) if os.path.isdir(path))
+    known = dict(connection.execute("SELECT run_dir, signature FROM runs"))
+    added = updated = 0
+
+    with connection:
+        for run_dir in run_dirs:
+            name = os.path.basename(run_dir)
+            signature = folder_signature(run_dir)
+            if known.get(name) == signature:
+                continue
+            if name in known:
+                connection.execute("DELETE FROM runs WHERE run_dir = ?", (name,))
+                updated += 1
+            else:
+                added += 1
+            run = read_run(run_dir)
+            connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name, run["run_id"], signature, run["code_hash"], run["status"],
+                    run["start_date"], run["end_date"], run["first_trade"], run["last_trade"],
+                    run["succeeded_requests"], run["failed_requests"], run["failed_requests_percentage"],
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO parameters VALUES (?, ?, ?, ?)",
+                [(name, key, parse_number(value), str(value)) for key, value in run["parameters"].items()],
+            )
+            connection.executemany(
+                "INSERT INTO statistics VALUES (?, ?, ?, ?)",
+                [(name, key, parse_number(value), str(value)) for key, value in run["statistics"].items()],
+            )
+            connection.executemany(
+                "INSERT INTO failed_data_requests VALUES (?, ?, ?)",
+                [(name, path, count) for path, count in run["failed_paths"].items()],
+            )
+
+        present = {os.path.basename(path) for path in run_dirs}
+        removed = [name for name in known if name not in present]
+        connection.executemany("DELETE FROM runs WHERE run_dir = ?", [(name,) for name in removed])
+    return added, updated, len(removed)
+
+
+def best_runs(connection, metric="Sharpe Ratio", where=None, limit=10, descending=True):
+    """Runs ranked by a statistic, filtered on parameter values.
+
+    ``where`` maps parameter names to required values, e.g.
+    ``{"dca_threshold": 0.05}``; numbers are compared numerically.
+    """
+    query = [
+        "SELECT r.run_dir, r.run_id, s.value, r.start_date, r.end_date, r.failed_requests",
+        "FROM statistics s JOIN runs r ON r.run_dir = s.run_dir",
+        "WHERE s.name = ? AND s.value IS NOT NULL",
+    ]
+    arguments = [metric]
+    for name, value in (where or {}).items():
+        number = parse_number(value)
+        column, wanted = ("value", number) if number is not None else ("text", str(value))
+        query.append(f"AND EXISTS (SELECT 1 FROM parameters p WHERE p.run_dir = r.run_dir AND p.name = ? AND p.{column} = ?)")
+        arguments += [name, wanted]
+    query.append(f"ORDER BY s.value {'DESC' if descending else 'ASC'} LIMIT ?")
+    arguments.append(limit)
+    return connection.execute(" ".join(query), arguments).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog and query archived backtest runs.")
+    parser.add_argument("--database")
+    parser.add_argument("--backtests")
+    parser.add_argument("--metric", default="Sharpe Ratio")
+    parser.add_argument("--where", action="append", default=[], help="parameter=value filter, repeatable")
+    parser.add_argument("--ascending", action="store_true")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    connection = connect(args.database)
+    added, updated, removed = ingest(connection, args.backtests)
+    print(f"Catalog: {added} added, {updated} updated, {removed} removed")
+    where = dict(item.split("=", 1) for item in args.where)
+    for run_dir, run_id, value, start, end, failed in best_runs(connection, args.metric, where, args.limit, not args.ascending):
+        print(f"   {run_dir} ({run_id}): {args.metric} = {value:g}, {start} .. {end}, failed requests: {failed}")
+
+
+if __name__ == "__main__":
+    main()
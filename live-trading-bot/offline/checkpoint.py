@@ -0,0 +1,206 @@
+"""Versioned binary snapshots of strategy state, to resume instead of replaying.
+
+A snapshot is one file::
+
+    MAGIC | u16 format version | u32 header length | JSON header | array bytes
+
+The header holds the scalar state, the code hash of the modules that produced
+it, a CRC-32 of the array bytes and, per array, its dtype, shape and offset;
+the arrays follow back to back in C order. ``load`` rejects a file whose
+magic, version or checksum does not match.
+
+``CheckpointStore`` keeps snapshots in one folder per run key (a hash of
+everything that must match to continue a run, e.g. the strategy parameters
+without the end date) named by the trading day they were taken after.
+``latest`` returns the newest one at or before a day whose code hash is the
+current one and which the caller's check accepts; stale snapshots are skipped,
+never loaded into a run. ``offline.engine`` uses this to extend a replay to a
+later end date by simulating only the new days.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER
+
+MAGIC = b"QPTSNAP\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sHI")
+CHECKPOINT_FOLDER = os.path.join(CACHE_FOLDER, "checkpoints")
+SUFFIX = ".snap"
+
+Snapshot = namedtuple("Snapshot", "day code state arrays path")
+
+
+class CheckpointError(ValueError):
+    """A snapshot that cannot be read or does not belong to the current code."""
+
+
+def code_hash(paths):
+    """SHA-256 over the contents of source files, in order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as handle:
+            digest.update(os.path.basename(path).encode() + b"\0" + handle.read())
+    return digest.hexdigest()
+
+
+def run_key(values):
+    """Stable hash of a JSON-able description of a run."""
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def dumps(day, code, state, arrays):
+    """Serialize a snapshot taken after ``day``."""
+    layout = {}
+    blobs = []
+    offset = 0
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        if values.dtype.hasobject:
+            raise TypeError(f"Array {name!r} holds Python objects; intern them first")
+        layout[name] = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": offset}
+        blobs.append(values.tobytes())
+        offset += values.nbytes
+    payload = b"".join(blobs)
+    header = json.dumps({
+        "day": str(day),
+        "code": code,
+        "state": state,
+        "arrays": layout,
+        "crc32": zlib.crc32(payload),
+    }, separators=(",", ":")).encode()
+    return PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)) + header + payload
+
+
+def loads(data, path=None):
+    """Parse bytes written by ``dumps``; raises CheckpointError when they are damaged."""
+    if len(data) < PREAMBLE.size:
+        raise CheckpointError(f"{path or 'snapshot'}: truncated")
+    magic, version, header_length = PREAMBLE.unpack_from(data)
+    if magic != MAGIC:
+        raise CheckpointError(f"{path or 'snapshot'}: not a snapshot")
+    if version != FORMAT_VERSION:
+        raise CheckpointError(f"{path or 'snapshot'}: format version {version}, expected {FORMAT_VERSION}")
+    start = PREAMBLE.size + header_length
+    try:
+        header = json.loads(data[PREAMBLE.size:start])
+    except ValueError as error:
+        raise CheckpointError(f"{path or 'snapshot'}: unreadable header ({error})") from None
+    payload = memoryview(data)[start:]
+    if zlib.crc32(payload) != header["crc32"]:
+        raise CheckpointError(f"{path or 'snapshot'}: checksum mismatch")
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(payload, dtype, count, entry["offset"]).reshape(entry["shape"]).copy()
+    return Snapshot(np.datetime64(header["day"], "D"), header["code"], header["state"], arrays, path)
+
+
+def object_state(target, prefix=""):
+    """(scalars, arrays) of an object's attributes, recursing into nested objects.
+
+    Covers the indicator classes: NumPy arrays, numbers, bools, strings and
+    objects built from those.
+    """
+    scalars, arrays = {}, {}
+    for name, value in vars(target).items():
+        key = prefix + name
+        if isinstance(value, np.ndarray):
+            arrays[key] = value
+        elif isinstance(value, (bool, int, float, str, np.generic)) or value is None:
+            scalars[key] = value.item() if isinstance(value, np.generic) else value
+        elif isinstance(value, slice):
+            continue
+        elif hasattr(value, "__dict__"):
+            nested_scalars, nested_arrays = object_state(value, key + ".")
+            scalars.update(nested_scalars)
+            arrays.update(nested_arrays)
+    return scalars, arrays
+
+
+def restore_object(target, scalars, arrays, prefix=""):
+    """Put values captured by ``object_state`` back onto an object of the same shape."""
+    for name, value in vars(target).items():
+        key = prefix + name
+        if isinstance(value, np.ndarray):
+            setattr(target, name, arrays[key].copy())
+        elif key in scalars:
+            setattr(target, name, scalars[key])
+        elif hasattr(value, "__dict__") and not isinstance(value, slice):
+            restore_object(value, scalars, arrays, key + ".")
+
+
+class CheckpointStore:
+    """Snapshots on disk, one folder per run key."""
+
+    def __init__(self, folder=None):
+        self.folder = folder or CHECKPOINT_FOLDER
+
+    def path(self, key, day):
+        return os.path.join(self.folder, key, f"{np.datetime64(day, 'D')}{SUFFIX}")
+
+    def save(self, key, day, code, state, arrays):
+        path = self.path(key, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = path + ".tmp"
+        with open(staging, "wb") as handle:
+            handle.write(dumps(np.datetime64(day, "D"), code, state, arrays))
+        os.replace(staging, path)
+        return path
+
+    def days(self, key):
+        """Days of the stored snapshots of a run, oldest first."""
+        folder = os.path.join(self.folder, key)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(np.datetime64(name[: -len(SUFFIX)], "D") for name in os.listdir(folder) if name.endswith(SUFFIX))
+
+    def latest(self, key, code, before=None, accept=None):
+        """Newest snapshot on or before ``before`` written by ``code`` that ``accept`` (if given) approves."""
+        for day in reversed(self.days(key)):
+            if before is not None and day > np.datetime64(before, "D"):
+                continue
+            path = self.path(key, day)
+            try:
+                with open(path, "rb") as handle:
+                    snapshot = loads(handle.read(), path)
+            except (OSError, CheckpointError):
+                continue
+            if snapshot.code == code and (accept is None or accept(snapshot)):
+                return snapshot
+        return None
+
+    def prune(self, key, keep=3):
+        """Delete all but the newest ``keep`` snapshots of a run."""
+        for day in self.days(key)[:-keep]:
+            os.remove(self.path(key, day))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect snapshot files.")
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        try:
+            with open(path, "rb") as handle:
+                snapshot = loads(handle.read(), path)
+        except CheckpointError as error:
+            print(f"{path}: {error}")
+            continue
+        size = sum(values.nbytes for values in snapshot.arrays.values())
+        print(f"{path}: after {snapshot.day}, code {snapshot.code[:12]}, {len(snapshot.arrays)} arrays ({size} bytes)")
+        for name, value in sorted(snapshot.state.items()):
+            print(f"   {name} = {value}")
+
+
+if __name__ == "__main__":
+    main()
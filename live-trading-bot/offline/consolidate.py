@@ -0,0 +1,290 @@
+"""Streaming bar consolidation from tick, second or minute archives.
+
+A day file is decompressed in fixed-size byte chunks that are parsed straight
+into NumPy columns, filtered to the regular session from the compiled market
+hours, and reduced per period bucket with ``ufunc.reduceat``. The bucket
+still open at the end of a chunk is carried as a one-row partial aggregate
+and merged into the next chunk (or day), so memory stays bounded by the chunk
+size whatever the period, and no row ever becomes a Python object.
+
+Periods are fixed lengths aligned to midnight like LEAN's time consolidators
+("5min", "1h", ...), or "daily" for one bar per regular session stamped at
+midnight like the daily files. Bars are stamped with their start time.
+
+Trade bars take open/high/low/close/volume from ticks (open = high = low =
+close = price) or from finer bars. Quote bars keep the first, highest, lowest
+and last bid and ask and the last size of each side; a zero price marks a
+missing side. Suspicious ticks are dropped.
+"""
+import argparse
+import io
+import os
+import re
+import time as timer
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER
+from offline.data import (
+    EMPTY_FIELD,
+    MILLISECONDS_PER_DAY,
+    PRICE_SCALE,
+    QUOTE_COLUMNS,
+    TRADE_COLUMNS,
+    Bars,
+    QuoteBars,
+    intraday_files,
+    yyyymmdd_to_datetime64,
+)
+from offline.market_hours import MarketCalendar
+
+CHUNK_BYTES = 4 << 20
+SOURCES = ("tick", "second", "minute")
+PERIOD = re.compile(r"^(\d+)\s*(s|sec|second|m|min|minute|h|hour)s?$")
+UNIT_MS = {"s": 1000, "sec": 1000, "second": 1000, "m": 60000, "min": 60000, "minute": 60000, "h": 3600000, "hour": 3600000}
+
+TRADE_RULES = (("open", "first"), ("high", "max"), ("low", "min"), ("close", "last"), ("volume", "sum"))
+QUOTE_RULES = tuple(
+    (f"{side}_{field}", rule)
+    for side in ("bid", "ask")
+    for field, rule in (("open", "first"), ("high", "max"), ("low", "min"), ("close", "last"), ("size", "last"))
+)
+
+# Columns read from tick rows (the exchange and condition fields are skipped)
+TICK_TRADE_COLUMNS = (0, 1, 2, 5)
+TICK_QUOTE_COLUMNS = (0, 1, 2, 3, 4, 7)
+
+
+def parse_period(period):
+    """Period length in ms, or None for "daily" (one bar per regular session)."""
+    text = str(period).strip().lower()
+    if text in ("daily", "day", "1d", "session"):
+        return None
+    match = PERIOD.match(text)
+    if not match:
+        raise ValueError(f"Unrecognized period {period!r}; use e.g. '5min', '1h' or 'daily'")
+    return int(match.group(1)) * UNIT_MS[match.group(2)]
+
+
+def iter_text_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """Yield whole-line byte chunks of the first member of a zip."""
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(archive.namelist()[0]) as stream:
+            remainder = b""
+            while True:
+                block = stream.read(chunk_bytes)
+                if not block:
+                    break
+                block = remainder + block
+                cut = block.rfind(b"\n") + 1
+                remainder = block[cut:]
+                if cut:
+                    yield block[:cut]
+            if remainder.strip():
+                yield remainder
+
+
+def _parse(chunk, usecols):
+    if b",," in chunk or b",\n" in chunk or b",\r" in chunk:
+        chunk = EMPTY_FIELD.sub(b",0", chunk)
+    return np.loadtxt(io.BytesIO(chunk), delimiter=",", dtype=np.int64, usecols=usecols, ndmin=2)
+
+
+def _prices(values):
+    values = values / PRICE_SCALE
+    values[values == 0] = np.nan
+    return values
+
+
+def iter_rows(path, date, source, kind, chunk_bytes=CHUNK_BYTES):
+    """Yield (epoch ms, {column: float array}) per chunk of one day file."""
+    midnight = int(yyyymmdd_to_datetime64([int(date)]).astype(np.int64)[0]) * MILLISECONDS_PER_DAY
+    for chunk in iter_text_chunks(path, chunk_bytes):
+        if source == "tick" and kind == "trade":
+            rows = _parse(chunk, TICK_TRADE_COLUMNS)
+            rows = rows[rows[:, 3] == 0]
+            price = rows[:, 1] / PRICE_SCALE
+            columns = {"open": price, "high": price, "low": price, "close": price, "volume": rows[:, 2].astype(np.float64)}
+        elif source == "tick":
+            rows = _parse(chunk, TICK_QUOTE_COLUMNS)
+            rows = rows[rows[:, 5] == 0]
+            bid = _prices(rows[:, 1])
+            ask = _prices(rows[:, 3])
+            columns = {
+                "bid_size": np.where(np.isnan(bid), np.nan, rows[:, 2]),
+                "ask_size": np.where(np.isnan(ask), np.nan, rows[:, 4]),
+            }
+            for field in ("open", "high", "low", "close"):
+                columns[f"bid_{field}"] = bid
+                columns[f"ask_{field}"] = ask
+        else:
+            names = TRADE_COLUMNS if kind == "trade" else QUOTE_COLUMNS
+            rows = _parse(chunk, tuple(range(len(names) + 1)))
+            columns = {}
+            for index, name in enumerate(names, start=1):
+                if name.endswith("size") or name == "volume":
+                    columns[name] = rows[:, index].astype(np.float64)
+                else:
+                    columns[name] = _prices(rows[:, index]) if kind == "quote" else rows[:, index] / PRICE_SCALE
+            if kind == "quote":
+                for side in ("bid", "ask"):
+                    columns[f"{side}_size"][np.isnan(columns[f"{side}_close"])] = np.nan
+        yield rows[:, 0] + midnight, columns
+
+
+def reduce_buckets(keys, columns, rules):
+    """Aggregate consecutive rows sharing a key; returns (bucket keys, {column: values})."""
+    count = len(keys)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    positions = np.arange(count)
+    reduced = {}
+    for name, rule in rules:
+        values = columns[name]
+        if rule == "sum":
+            reduced[name] = np.add.reduceat(np.nan_to_num(values), starts)
+        elif rule == "max":
+            reduced[name] = np.fmax.reduceat(values, starts)
+        elif rule == "min":
+            reduced[name] = np.fmin.reduceat(values, starts)
+        else:
+            valid = ~np.isnan(values)
+            if rule == "first":
+                chosen = np.minimum.reduceat(np.where(valid, positions, count), starts)
+            else:
+                chosen = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+            found = (chosen >= 0) & (chosen < count)
+            reduced[name] = np.where(found, values[np.clip(chosen, 0, count - 1)], np.nan)
+    return keys[starts], reduced
+
+
+def _merge(partial, following, rules):
+    """Combine a carried one-row aggregate with the first row of the next chunk."""
+    merged = {}
+    for name, rule in rules:
+        before, after = partial[name][0], following[name][0]
+        if rule == "sum":
+            merged[name] = before + after
+        elif rule == "max":
+            merged[name] = np.fmax(before, after)
+        elif rule == "min":
+            merged[name] = np.fmin(before, after)
+        elif rule == "first":
+            merged[name] = before if not np.isnan(before) else after
+        else:
+            merged[name] = after if not np.isnan(after) else before
+    return merged
+
+
+def iter_consolidated(ticker, period="daily", source="minute", kind="trade", start=None, end=None,
+                      extended_hours=False, data_folder=None, chunk_bytes=CHUNK_BYTES):
+    """Yield (bucket start epoch ms, {column: values}) batches of completed bars."""
+    rules = TRADE_RULES if kind == "trade" else QUOTE_RULES
+    period_ms = parse_period(period)
+    calendar = MarketCalendar.load()
+    pending = None
+    for date, path in intraday_files(ticker, source, kind, data_folder):
+        day = np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:]}", "D")
+        if (start and day < np.datetime64(start, "D")) or (end and day > np.datetime64(end, "D")):
+            continue
+        if not calendar.is_trading_day([day])[0] and not extended_hours:
+            continue
+        if not extended_hours:
+            session_open, session_close = (
+                value.astype("datetime64[ms]").astype(np.int64)
+                for value in (calendar.session_open([day])[0], calendar.session_close([day])[0])
+            )
+        for time, columns in iter_rows(path, date, source, kind, chunk_bytes):
+            if not extended_hours:
+                keep = (time >= session_open) & (time < session_close)
+                time = time[keep]
+                columns = {name: values[keep] for name, values in columns.items()}
+            if len(time) == 0:
+                continue
+            keys = time // (period_ms or MILLISECONDS_PER_DAY)
+            keys, reduced = reduce_buckets(keys, columns, rules)
+            if pending is not None:
+                if pending[0][0] == keys[0]:
+                    merged = _merge(pending[1], reduced, rules)
+                    for name in merged:
+                        reduced[name][0] = merged[name]
+                else:
+                    yield pending[0] * (period_ms or MILLISECONDS_PER_DAY), pending[1]
+            if len(keys) > 1:
+                yield keys[:-1] * (period_ms or MILLISECONDS_PER_DAY), {name: values[:-1] for name, values in reduced.items()}
+            pending = (keys[-1:], {name: values[-1:] for name, values in reduced.items()})
+    if pending is not None:
+        yield pending[0] * (period_ms or MILLISECONDS_PER_DAY), pending[1]
+
+
+def consolidate(ticker, period="daily", source="minute", kind="trade", start=None, end=None,
+                extended_hours=False, data_folder=None):
+    """Consolidated Bars/QuoteBars of a ticker, or None without source files."""
+    names = TRADE_COLUMNS if kind == "trade" else QUOTE_COLUMNS
+    times = []
+    batches = {name: [] for name in names}
+    for time, columns in iter_consolidated(ticker, period, source, kind, start, end, extended_hours, data_folder):
+        times.append(time)
+        for name in names:
+            batches[name].append(columns[name])
+    if not times:
+        return None
+    container = Bars if kind == "trade" else QuoteBars
+    return container(np.concatenate(times).astype("datetime64[ms]"), *(np.concatenate(batches[name]) for name in names))
+
+
+def _consolidate_job(job):
+    ticker, arguments = job
+    return ticker, consolidate(ticker, **arguments)
+
+
+def consolidate_many(tickers, period="daily", source="minute", kind="trade", workers=None, **arguments):
+    """Consolidate several tickers in parallel; returns {ticker: bars or None}."""
+    arguments.update(period=period, source=source, kind=kind)
+    jobs = [(ticker, arguments) for ticker in tickers]
+    if workers == 1 or len(jobs) < 2:
+        return dict(map(_consolidate_job, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_consolidate_job, jobs))
+
+
+def output_path(ticker, period, source, kind, cache_folder=None):
+    folder = os.path.join(cache_folder or CACHE_FOLDER, "consolidated", ticker.lower())
+    return os.path.join(folder, f"{source}_{str(period).replace(' ', '')}_{kind}.npz")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate tick/second/minute archives into coarser bars.")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--period", default="daily", help="e.g. 5min, 1h, daily")
+    parser.add_argument("--source", default="minute", choices=SOURCES)
+    parser.add_argument("--kind", default="trade", choices=("trade", "quote"))
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--extended-hours", action="store_true")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--save", action="store_true", help="write each result as .npz under the cache folder")
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    started = timer.perf_counter()
+    results = consolidate_many(
+        args.tickers, args.period, args.source, args.kind, args.workers,
+        start=args.start, end=args.end, extended_hours=args.extended_hours, data_folder=args.data_folder,
+    )
+    elapsed = timer.perf_counter() - started
+    for ticker, bars in results.items():
+        if bars is None:
+            print(f"{ticker}: no {args.source} {args.kind} files")
+            continue
+        print(f"{ticker}: {len(bars.time)} {args.period} bars from {bars.time[0]} to {bars.time[-1]}")
+        if args.save:
+            path = output_path(ticker, args.period, args.source, args.kind)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.savez(path, **bars._asdict())
+    print(f"Consolidated {len(results)} tickers in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Readers for the LEAN zip/CSV data tree under data/."""
+import io
+import os
+import re
+import zipfile
+from collections import namedtuple
+
+import numpy as np
+
+DATA_FOLDER = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "data"))
+
+# LEAN stores equity prices as integers in deci-cents
+PRICE_SCALE = 10000
+
+TRADE_COLUMNS = ("open", "high", "low", "close", "volume")
+QUOTE_COLUMNS = (
+    "bid_open", "bid_high", "bid_low", "bid_close", "bid_size",
+    "ask_open", "ask_high", "ask_low", "ask_close", "ask_size",
+)
+# Columns holding prices (the rest are volumes/sizes)
+PRICE_COLUMNS = frozenset(TRADE_COLUMNS[:4] + QUOTE_COLUMNS[:4] + QUOTE_COLUMNS[5:9])
+
+# Daily and hour bars live in one zip per ticker; finer resolutions in one zip per day
+WHOLE_HISTORY_RESOLUTIONS = ("daily", "hour")
+
+MILLISECONDS_PER_DAY = 86400000
+
+EMPTY_FIELD = re.compile(rb",(?=,|\r|\n|$)")
+
+Bars = namedtuple("Bars", ("time",) + TRADE_COLUMNS)
+QuoteBars = namedtuple("QuoteBars", ("time",) + QUOTE_COLUMNS)
+FactorRows = namedtuple("FactorRows", "date price_factor split_factor reference_price")
+
+
+def equity_path(ticker, resolution="daily", data_folder=None):
+    """Return the path of a daily/hour zip for an equity ticker."""
+    folder = data_folder or DATA_FOLDER
+    return os.path.join(folder, "equity", "usa", resolution, f"{ticker.lower()}.zip")
+
+
+def intraday_folder(ticker, resolution="minute", data_folder=None):
+    """Return the folder holding the per-day zips of an equity ticker."""
+    folder = data_folder or DATA_FOLDER
+    return os.path.join(folder, "equity", "usa", resolution, ticker.lower())
+
+
+def intraday_files(ticker, resolution="minute", kind="trade", data_folder=None):
+    """List (YYYYMMDD, path) pairs of the per-day zips of a ticker, oldest first."""
+    folder = intraday_folder(ticker, resolution, data_folder)
+    if not os.path.isdir(folder):
+        return []
+    suffix = f"_{kind}.zip"
+    return sorted(
+        (name[:8], os.path.join(folder, name))
+        for name in os.listdir(folder)
+        if name.endswith(suffix)
+    )
+
+
+def factor_file_path(ticker, data_folder=None):
+    """Return the path of the factor file for an equity ticker."""
+    folder = data_folder or DATA_FOLDER
+    return os.path.join(folder, "equity", "usa", "factor_files", f"{ticker.lower()}.csv")
+
+
+def read_zip_member(path, member=None):
+    """Return the raw bytes of one member of a zip (the first one by default)."""
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(member or archive.namelist()[0])
+
+
+def parse_int_csv(raw, columns):
+    """Parse comma separated integer rows into an (n, columns) int64 array.
+
+    Empty fields (a missing bid or ask side in quote files) are read as 0.
+    """
+    if not raw.strip():
+        return np.empty((0, columns), dtype=np.int64)
+    if b",," in raw or b",\n" in raw or b",\r" in raw or raw.rstrip(b"\r\n").endswith(b","):
+        raw = EMPTY_FIELD.sub(b",0", raw)
+    return np.loadtxt(io.BytesIO(raw), delimiter=",", dtype=np.int64, ndmin=2)
+
+
+def yyyymmdd_to_datetime64(values):
+    """Convert an array of YYYYMMDD integers into datetime64[D]."""
+    values = np.asarray(values, dtype=np.int64)
+    years = values // 10000 - 1970
+    months = values // 100 % 100 - 1
+    days = values % 100 - 1
+    first = years.astype("datetime64[Y]").astype("datetime64[M]") + months
+    return first.astype("datetime64[D]") + days
+
+
+def read_history_rows(path, columns):
+    """Parse a daily/hour zip into (epoch milliseconds, int64 columns).
+
+    Rows start with "YYYYMMDD HH:MM"; the date and time parts are split into
+    their own integer fields before parsing.
+    """
+    raw = read_zip_member(path).replace(b" ", b",").replace(b":", b",")
+    rows = parse_int_csv(raw, columns + 3)
+    days = yyyymmdd_to_datetime64(rows[:, 0]).astype(np.int64)
+    time = days * MILLISECONDS_PER_DAY + rows[:, 1] * 3600000 + rows[:, 2] * 60000
+    return time, rows[:, 3:]
+
+
+def read_day_rows(path, date, columns):
+    """Parse a per-day zip whose first field is milliseconds since midnight."""
+    rows = parse_int_csv(read_zip_member(path), columns + 1)
+    midnight = yyyymmdd_to_datetime64([int(date)]).astype(np.int64)[0] * MILLISECONDS_PER_DAY
+    return rows[:, 0] + midnight, rows[:, 1:]
+
+
+def to_bars(time, rows, kind="trade"):
+    """Build Bars/QuoteBars with float prices from epoch times and int64 columns.
+
+    A zero quote price marks a missing bid or ask side and becomes NaN.
+    """
+    names = TRADE_COLUMNS if kind == "trade" else QUOTE_COLUMNS
+    values = []
+    for index, name in enumerate(names):
+        column = rows[:, index]
+        if name not in PRICE_COLUMNS:
+            values.append(column.astype(np.float64))
+        elif kind == "trade":
+            values.append(column / PRICE_SCALE)
+        else:
+            values.append(np.where(column == 0, np.nan, column / PRICE_SCALE))
+    container = Bars if kind == "trade" else QuoteBars
+    return container(np.asarray(time).astype("datetime64[ms]"), *values)
+
+
+def read_daily_bars(ticker, data_folder=None):
+    """Load raw daily trade bars for a ticker, or None when the zip is missing."""
+    path = equity_path(ticker, "daily", data_folder)
+    if not os.path.exists(path):
+        return None
+    return to_bars(*read_history_rows(path, len(TRADE_COLUMNS)))
+
+
+def read_intraday_bars(ticker, date, resolution="minute", kind="trade", data_folder=None):
+    """Load one day of minute/second trade or quote bars, or None when missing."""
+    path = os.path.join(intraday_folder(ticker, resolution, data_folder), f"{date}_{kind}.zip")
+    if not os.path.exists(path):
+        return None
+    columns = TRADE_COLUMNS if kind == "trade" else QUOTE_COLUMNS
+    return to_bars(*read_day_rows(path, date, len(columns)), kind)
+
+
+def read_factor_file(ticker, data_folder=None):
+    """Load the factor file rows for a ticker, or None when it is missing."""
+    path = factor_file_path(ticker, data_folder)
+    if not os.path.exists(path):
+        return None
+    rows = np.loadtxt(path, delimiter=",", dtype=np.float64, ndmin=2)
+    return FactorRows(
+        yyyymmdd_to_datetime64(rows[:, 0].astype(np.int64)),
+        rows[:, 1],
+        rows[:, 2],
+        rows[:, 3],
+    )
+
+
+def corporate_actions(factors, trading_days):
+    """Map factor file rows onto trading days as (dividend, split) arrays.
+
+    A change between consecutive factor rows takes effect on the first trading
+    day after the earlier row's date: a price factor change is a dividend of
+    ``reference_price * (1 - p[i] / p[i + 1])`` and a split factor change a split
+    of ratio ``s[i] / s[i + 1]`` (0.25 for a 4-for-1 split).
+    """
+    dividends = np.zeros(len(trading_days))
+    splits = np.ones(len(trading_days))
+    if factors is None or len(factors.date) < 2:
+        return dividends, splits
+
+    days = np.asarray(trading_days).astype("datetime64[D]")
+    price_ratio = factors.price_factor[:-1] / factors.price_factor[1:]
+    split_ratio = factors.split_factor[:-1] / factors.split_factor[1:]
+    positions = np.searchsorted(days, factors.date[:-1], side="right")
+    # Changes dated before the first loaded day happened outside the window
+    valid = (positions > 0) & (positions < len(days))
+
+    dividend_mask = valid & (price_ratio != 1)
+    dividends[positions[dividend_mask]] = factors.reference_price[:-1][dividend_mask] * (1 - price_ratio[dividend_mask])
+    split_mask = valid & (split_ratio != 1)
+    splits[positions[split_mask]] = split_ratio[split_mask]
+    return dividends, splits
@@ -0,0 +1,566 @@
+"""Vectorized daily replay of BuffettStrategy on the local data tree.
+
+The replay follows the event order Lean produces for the algorithm in main.py
+with daily bars in raw normalization mode:
+
+* 09:31 ``InitialAllocate`` and the 10:00 month-start ``RebalancePortfolio``
+  fill immediately at the previous close (the stale TradeBar fill Lean warns
+  about in the order events). Their times come from the same DateRules /
+  TimeRules as main.py, evaluated by ``offline.scheduler`` on the exchange
+  calendar.
+* At 16:00 the day's bar arrives: orders placed by ``OnData`` the day before
+  fill at its open (Lean turns market orders sent on daily data into
+  MarketOnOpen orders), dividends are credited, and the DRIP / DCA /
+  covered-call / protective-put checks of ``offline.signals`` run against the
+  new close.
+* Splits rescale holdings at the start of their ex-date.
+
+With a ``checkpoint.CheckpointStore`` the replay state is snapshotted every
+``checkpoint_every`` trading days and at the end; a later run with a further
+end date resumes from the newest snapshot whose code hash and market data up
+to its day still match, and simulates only the days after it.
+
+With a ``fills.FillModel`` the same orders fill from minute quote bars instead
+(buys at the ask, sells at the bid, plus slippage): the 09:31 / 10:00 orders at
+their own time and the MarketOnOpen orders at the opening 09:31 quote.
+
+Prices, dividends and splits are aligned into (days, symbols) matrices once,
+so each simulated day is a handful of array operations across all symbols.
+"""
+import argparse
+import hashlib
+import os
+import time as timer
+from collections import namedtuple
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from offline import preflight
+from offline.adjustments import AdjustmentIndex
+from offline.cache import open_series
+from offline.checkpoint import CheckpointStore, code_hash, object_state, restore_object, run_key
+from offline.consolidate import consolidate
+from offline.data import corporate_actions, read_daily_bars, read_factor_file
+from offline.fills import FillModel, QuoteBook, order_fees, parse_slippage
+from offline.indicators import RollingStandardDeviation, volatility_thresholds
+from offline.rebalance import plan_rebalance
+from offline.market_hours import MarketCalendar
+from offline.results import iter_order_events
+from offline.scheduler import Scheduler, after_market_open, at, every_day, month_start
+from offline.signals import evaluate
+from offline.symbol_properties import SymbolPropertiesTable
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+
+MARKET_CLOSE_TIME = np.timedelta64(16 * 60, "m")
+# Quote time a MarketOnOpen order fills at with a fill model: the close of the first minute bar
+OPENING_QUOTE_TIME = np.timedelta64(9 * 60 + 31, "m")
+
+Market = namedtuple("Market", "symbols days open close has_bar dividends splits")
+Order = namedtuple("Order", "time symbol quantity price fee tag")
+Signal = namedtuple("Signal", "time symbol kind price")
+BacktestResult = namedtuple("BacktestResult", "params days equity cash holdings orders signals")
+
+# Modules whose changes invalidate a replay snapshot
+CHECKPOINT_MODULES = (
+    "engine.py", "signals.py", "indicators.py", "fills.py", "rebalance.py", "symbol_properties.py", "checkpoint.py",
+    "scheduler.py", "market_hours.py",
+)
+
+
+@dataclass
+class StrategyParams:
+    """Inputs of BuffettStrategy.Initialize, with the same defaults as main.py."""
+
+    start: str = "2020-01-01"
+    end: str = None
+    cash: float = 100000.0
+    symbols: tuple = ("AAPL", "MSFT", "XOM", "GOLD", "NEE")
+    target_allocation: dict = field(default_factory=lambda: {
+        "AAPL": 0.20,
+        "MSFT": 0.20,
+        "XOM": 0.15,
+        "GOLD": 0.15,
+        "NEE": 0.10
+    })
+    dca_threshold: float = 0.05
+    call_threshold: float = 0.10
+    put_threshold: float = 0.10
+    dca_fraction: float = 0.10
+    warmup_days: int = 5
+    # > 0 replaces the fixed DCA / put thresholds by this many rolling standard
+    # deviations of the close (as a fraction of price) once the window is full
+    volatility_scale: float = 0.0
+    volatility_period: int = 20
+    # Rebalances skip names whose weight is within this distance of the target
+    rebalance_band: float = 0.0
+
+
+def _daily_bars(ticker, data_folder, use_cache):
+    if use_cache:
+        series = open_series(ticker, "daily", "trade", data_folder)
+        return series.bars() if series else None
+    return read_daily_bars(ticker, data_folder)
+
+
+def _fill_gaps(bars, stand_in):
+    """Daily bars with the days missing from ``bars`` taken from a stand-in series."""
+    if stand_in is None or bars is None:
+        return stand_in if bars is None else bars
+    extra = ~np.isin(stand_in.time.astype("datetime64[D]"), bars.time.astype("datetime64[D]"))
+    merged = bars._make(np.concatenate([mine, theirs[extra]]) for mine, theirs in zip(bars, stand_in))
+    order = np.argsort(merged.time, kind="stable")
+    return merged._make(values[order] for values in merged)
+
+
+def load_market(symbols, start, end=None, warmup_days=5, data_folder=None, use_cache=False, stand_ins=None):
+    """Align daily opens, closes, dividends and splits of the symbols on common days.
+
+    With ``use_cache`` the bars come from the columnar cache and the dividends
+    and splits from the compiled adjustment index instead of the raw files.
+    ``stand_ins`` maps a ticker to an ``offline.preflight.StandIn`` whose daily
+    bars (consolidated when it is a finer resolution) fill the days the
+    ticker's own daily file lacks; dividends and splits stay the ticker's own.
+    """
+    start_day = np.datetime64(start, "D") - np.timedelta64(warmup_days, "D")
+    end_day = np.datetime64(end, "D") if end else None
+
+    loaded = []
+    for ticker in symbols:
+        bars = _daily_bars(ticker, data_folder, use_cache)
+        stand_in = (stand_ins or {}).get(ticker)
+        if stand_in is not None:
+            if stand_in.resolution == "daily":
+                source = _daily_bars(stand_in.ticker, data_folder, use_cache)
+            else:
+                source = consolidate(stand_in.ticker, "daily", stand_in.resolution, start=start_day, end=end_day,
+                                     data_folder=data_folder)
+            bars = _fill_gaps(bars, source)
+        if bars is not None:
+            days = bars.time.astype("datetime64[D]")
+            keep = days >= start_day
+            if end_day is not None:
+                keep &= days <= end_day
+            bars = bars._replace(time=days[keep], open=bars.open[keep], close=bars.close[keep])
+        loaded.append(bars)
+
+    present = [bars.time for bars in loaded if bars is not None]
+    days = np.unique(np.concatenate(present)) if present else np.empty(0, dtype="datetime64[D]")
+
+    opens = np.full((len(days), len(symbols)), np.nan)
+    close = np.full_like(opens, np.nan)
+    dividends = np.zeros_like(close)
+    splits = np.ones_like(close)
+    adjustments = AdjustmentIndex.load(data_folder) if use_cache else None
+    for column, (ticker, bars) in enumerate(zip(symbols, loaded)):
+        if bars is None:
+            continue
+        rows = np.searchsorted(days, bars.time)
+        opens[rows, column] = bars.open
+        close[rows, column] = bars.close
+        if adjustments:
+            dividends[:, column], splits[:, column] = adjustments.corporate_actions(ticker, days)
+        else:
+            dividends[:, column], splits[:, column] = corporate_actions(read_factor_file(ticker, data_folder), days)
+
+    return Market(tuple(symbols), days, opens, close, ~np.isnan(close), dividends, splits)
+
+
+@lru_cache(maxsize=1)
+def symbol_properties():
+    """The memory-mapped symbol-properties table, opened once per process."""
+    return SymbolPropertiesTable.load()
+
+
+def forward_fill(values):
+    """Carry the last non-NaN value of each column forward in time."""
+    index = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = values[index, np.arange(values.shape[1])]
+    return filled
+
+
+@lru_cache(maxsize=1)
+def exchange_calendar():
+    """The US equity calendar, opened once per process."""
+    return MarketCalendar.load()
+
+
+def strategy_schedule(start, end, calendar=None):
+    """The Schedule.On rules of main.py that trade, from start to end."""
+    calendar = calendar or exchange_calendar()
+    scheduler = Scheduler(start, end)
+    scheduler.on(every_day(), after_market_open(calendar, 1), name="InitialAllocate")
+    scheduler.on(month_start(calendar), at(10, 0), name="RebalancePortfolio")
+    return scheduler
+
+
+class _Replay:
+    """Mutable portfolio state stepped through the market one day at a time."""
+
+    def __init__(self, params, market, fill_model=None):
+        self.params = params
+        self.fill_model = fill_model
+        self.market = market
+        self.symbols = market.symbols
+        self.weights = np.array([params.target_allocation.get(ticker, 0.0) for ticker in self.symbols])
+        self.allocated = np.array([ticker in params.target_allocation for ticker in self.symbols])
+        self.cash = float(params.cash)
+        self.quantity = np.zeros(len(self.symbols))
+        self.pending = np.zeros(len(self.symbols))
+        self.pending_tag = np.full(len(self.symbols), "", dtype=object)
+        self.last_purchase_price = np.full(len(self.symbols), np.nan)
+        self.properties = symbol_properties()
+        self.property_rows = self.properties.lookup("usa", self.symbols, "equity")
+        self.lots = self.properties.column("lot_size", self.property_rows)
+        self.dca_threshold = params.dca_threshold
+        self.put_threshold = params.put_threshold
+        self.dividend_days = market.dividends.any(axis=1)
+        self.no_dividends = np.zeros(len(self.symbols))
+        self.orders = []
+        self.signals = []
+
+    def execute(self, when, columns, quantities, prices, tags, quote_time=None):
+        """Fill orders at ``prices``, or from quotes at ``quote_time`` (default ``when``) with a fill model."""
+        if self.fill_model is not None and len(columns):
+            fills = self.fill_model.fill(columns, when if quote_time is None else quote_time, quantities, prices)
+            prices, fees = fills.price, fills.fee
+        else:
+            fees = order_fees(quantities, prices)
+        self.cash -= float(np.sum(quantities * prices) + np.sum(fees))
+        self.quantity[columns] += quantities
+        tags = np.broadcast_to(np.asarray(tags, dtype=object), len(columns))
+        for column, quantity, price, fee, tag in zip(columns, quantities, prices, fees, tags):
+            self.orders.append(Order(when, self.symbols[column], float(quantity), float(price), float(fee), tag))
+
+    def set_holdings(self, when, marks, tag):
+        """Rebalance every allocated symbol that has a price to its target weight in one batch."""
+        has_data = self.allocated & ~np.isnan(marks)
+        prices = np.where(has_data, marks, 0.0)
+        # Like Lean, targets net out open orders (the queued OnData orders) and weights apply to
+        # the whole portfolio: cash plus every marked holding, allocated or not
+        total_value = self.cash + float(self.quantity @ np.nan_to_num(marks))
+        plan = plan_rebalance(
+            self.quantity, prices, self.weights, self.cash, self.lots, self.params.rebalance_band, self.pending,
+            total_value=total_value,
+        )
+        self.execute(when, plan.columns, plan.quantity, prices[plan.columns], tag)
+        self.last_purchase_price[has_data] = prices[has_data]
+
+    def on_bar(self, when, day):
+        """Fill yesterday's OnData orders, then run DRIP / DCA / signal checks."""
+        market = self.market
+        params = self.params
+        close = market.close[day]
+        has_bar = market.has_bar[day]
+
+        if self.pending.any():
+            columns = np.nonzero(has_bar & (self.pending != 0))[0]
+            opening = market.days[day].astype("datetime64[m]") + OPENING_QUOTE_TIME
+            self.execute(when, columns, self.pending[columns], market.open[day, columns], self.pending_tag[columns], opening)
+            self.pending[columns] = 0
+
+        dividends = np.where(has_bar, market.dividends[day], 0.0) if self.dividend_days[day] else self.no_dividends
+        intents = evaluate(
+            close, has_bar, self.last_purchase_price, self.quantity, dividends,
+            self.dca_threshold, params.call_threshold, self.put_threshold, params.dca_fraction,
+        )
+        self.cash += float(np.sum(intents.dividend_cash))
+        self.queue(intents.drip > 0, intents.drip, "DRIP")
+        self.queue(intents.dca > 0, intents.dca, "DCA")
+        self.last_purchase_price = intents.last_purchase_price
+
+        for kind, flags in (("covered_call", intents.covered_call), ("protective_put", intents.protective_put)):
+            if flags.any():
+                for column in np.nonzero(flags)[0]:
+                    self.signals.append(Signal(when, self.symbols[column], kind, float(close[column])))
+
+    def queue(self, flags, quantities, tag):
+        self.pending[flags] += quantities[flags]
+        self.pending_tag[flags] = tag
+
+    def snapshot(self):
+        """(scalars, arrays) of the portfolio, the queued orders and the orders and signals so far."""
+        tags = sorted(set(self.pending_tag) | {order.tag for order in self.orders})
+        kinds = sorted({signal.kind for signal in self.signals})
+        columns = {ticker: column for column, ticker in enumerate(self.symbols)}
+        scalars = {"cash": self.cash, "tags": tags, "kinds": kinds}
+        arrays = {
+            "quantity": self.quantity,
+            "pending": self.pending,
+            "pending_tag": np.array([tags.index(tag) for tag in self.pending_tag], dtype=np.int32),
+            "last_purchase_price": self.last_purchase_price,
+            "dca_threshold": np.asarray(self.dca_threshold, dtype=np.float64),
+            "put_threshold": np.asarray(self.put_threshold, dtype=np.float64),
+            "order_time": np.array([order.time for order in self.orders], dtype="datetime64[m]"),
+            "order_symbol": np.array([columns[order.symbol] for order in self.orders], dtype=np.int32),
+            "order_values": np.array([[order.quantity, order.price, order.fee] for order in self.orders]).reshape(-1, 3),
+            "order_tag": np.array([tags.index(order.tag) for order in self.orders], dtype=np.int32),
+            "signal_time": np.array([signal.time for signal in self.signals], dtype="datetime64[m]"),
+            "signal_symbol": np.array([columns[signal.symbol] for signal in self.signals], dtype=np.int32),
+            "signal_kind": np.array([kinds.index(signal.kind) for signal in self.signals], dtype=np.int32),
+            "signal_price": np.array([signal.price for signal in self.signals], dtype=np.float64),
+        }
+        return scalars, arrays
+
+    def restore(self, scalars, arrays):
+        tags, kinds = scalars["tags"], scalars["kinds"]
+        self.cash = scalars["cash"]
+        self.quantity = arrays["quantity"]
+        self.pending = arrays["pending"]
+        self.pending_tag = np.array([tags[index] for index in arrays["pending_tag"]], dtype=object)
+        self.last_purchase_price = arrays["last_purchase_price"]
+        self.dca_threshold, self.put_threshold = (
+            float(arrays[name]) if arrays[name].ndim == 0 else arrays[name] for name in ("dca_threshold", "put_threshold")
+        )
+        self.orders = [
+            Order(time, self.symbols[column], float(quantity), float(price), float(fee), tags[tag])
+            for time, column, (quantity, price, fee), tag in zip(
+                arrays["order_time"], arrays["order_symbol"], arrays["order_values"], arrays["order_tag"]
+            )
+        ]
+        self.signals = [
+            Signal(time, self.symbols[column], kinds[kind], float(price))
+            for time, column, kind, price in zip(
+                arrays["signal_time"], arrays["signal_symbol"], arrays["signal_kind"], arrays["signal_price"]
+            )
+        ]
+
+
+def checkpoint_code():
+    folder = os.path.dirname(__file__)
+    return code_hash([os.path.join(folder, name) for name in CHECKPOINT_MODULES])
+
+
+def market_hash(market, last):
+    """Hash of the market arrays up to and including row ``last``."""
+    digest = hashlib.sha256(",".join(market.symbols).encode())
+    for values in (market.days, market.open, market.close, market.dividends, market.splits):
+        digest.update(np.ascontiguousarray(values[:last + 1]).tobytes())
+    return digest.hexdigest()
+
+
+def checkpoint_key(params, fill_model=None):
+    """Run key of a replay: its parameters without the end date, and the fill model."""
+    values = {name: value for name, value in asdict(params).items() if name != "end"}
+    if fill_model is not None:
+        slippage = fill_model.slippage
+        values["fills"] = [fill_model.max_age, type(slippage).__name__, vars(slippage) if slippage is not None else None]
+    return run_key(values)
+
+
+def run_backtest(params=None, market=None, data_folder=None, fill_model=None, checkpoints=None, checkpoint_every=21):
+    """Replay BuffettStrategy over daily bars and return its equity curve and orders.
+
+    Without ``fill_model`` orders fill at bar prices like the archived Lean runs.
+    With a CheckpointStore the replay resumes from the newest compatible
+    snapshot and saves new ones every ``checkpoint_every`` days and at the end,
+    keeping the newest three.
+    """
+    params = params or StrategyParams()
+    if market is None:
+        market = load_market(params.symbols, params.start, params.end, params.warmup_days, data_folder)
+
+    replay = _Replay(params, market, fill_model)
+    deviation = RollingStandardDeviation(int(params.volatility_period), len(market.symbols)) if params.volatility_scale > 0 else None
+    marks = forward_fill(market.close)
+    values = np.nan_to_num(marks)
+    split_days = (market.splits != 1).any(axis=1)
+    first = int(np.searchsorted(market.days, np.datetime64(params.start, "D")))
+    last = len(market.days)
+    if params.end:
+        last = int(np.searchsorted(market.days, np.datetime64(params.end, "D"), side="right"))
+
+    steps = max(last - first, 0)
+    equity = np.empty(steps)
+    cash = np.empty(steps)
+    holdings = np.empty((steps, len(market.symbols)))
+    initial_alloc_done = False
+
+    resume = first
+    if checkpoints is not None:
+        key = checkpoint_key(params, fill_model)
+        code = checkpoint_code()
+        snapshot = None
+        if last > first:
+            snapshot = checkpoints.latest(key, code, market.days[last - 1], lambda snapshot: _compatible(snapshot, market, first))
+        if snapshot is not None:
+            state, arrays = snapshot.state, snapshot.arrays
+            resume = int(np.searchsorted(market.days, snapshot.day)) + 1
+            done = resume - first
+            equity[:done], cash[:done], holdings[:done] = arrays["equity"], arrays["cash_curve"], arrays["holdings"]
+            replay.restore(state["replay"], _unprefix(arrays, "replay."))
+            initial_alloc_done = state["initial_alloc_done"]
+            if deviation is not None:
+                restore_object(deviation, state["deviation"], _unprefix(arrays, "deviation."))
+
+    def save(day, done):
+        scalars, arrays = replay.snapshot()
+        state = {"replay": scalars, "initial_alloc_done": initial_alloc_done, "market": market_hash(market, day)}
+        arrays = {f"replay.{name}": array for name, array in arrays.items()}
+        if deviation is not None:
+            state["deviation"], indicator = object_state(deviation)
+            arrays.update({f"deviation.{name}": array for name, array in indicator.items()})
+        arrays.update(equity=equity[:done], cash_curve=cash[:done], holdings=holdings[:done])
+        checkpoints.save(key, market.days[day], code, state, arrays)
+        checkpoints.prune(key)
+
+    if resume < last:
+        # Events after the last simulated (or snapshotted) day fire with the next day's bar
+        schedule = strategy_schedule(
+            market.days[resume - 1] + 1 if resume > first else np.datetime64(params.start, "D"), market.days[last - 1]
+        )
+    for step, day in enumerate(range(resume, last), resume - first):
+        midnight = market.days[day].astype("datetime64[m]")
+        if split_days[day]:
+            split = market.splits[day]
+            replay.quantity = np.round(replay.quantity / split)
+            replay.pending = np.round(replay.pending / split)
+
+        previous = marks[day - 1] if day > 0 else np.full(len(market.symbols), np.nan)
+        for event in schedule.due(midnight + MARKET_CLOSE_TIME):
+            if event.name == "InitialAllocate":
+                if initial_alloc_done:
+                    continue
+                initial_alloc_done = True
+            replay.set_holdings(event.time.astype("datetime64[m]"), previous, event.name)
+
+        if deviation is not None:
+            close = market.close[day]
+            deviation.update(close, market.has_bar[day])
+            replay.dca_threshold = volatility_thresholds(
+                deviation.value, close, params.volatility_scale, params.dca_threshold, deviation.ready
+            )
+            replay.put_threshold = volatility_thresholds(
+                deviation.value, close, params.volatility_scale, params.put_threshold, deviation.ready
+            )
+        replay.on_bar(midnight + MARKET_CLOSE_TIME, day)
+
+        equity[step] = replay.cash + float(replay.quantity @ values[day])
+        cash[step] = replay.cash
+        holdings[step] = replay.quantity
+        if checkpoints is not None and (day == last - 1 or (step + 1) % checkpoint_every == 0):
+            save(day, step + 1)
+
+    return BacktestResult(params, market.days[first:last], equity, cash, holdings, replay.orders, replay.signals)
+
+
+def _unprefix(arrays, prefix):
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+def _compatible(snapshot, market, first):
+    """Whether a snapshot was taken on this market's data, inside this run."""
+    day = int(np.searchsorted(market.days, snapshot.day))
+    return (
+        first <= day < len(market.days) and market.days[day] == snapshot.day
+        and snapshot.state["market"] == market_hash(market, day)
+        and len(snapshot.arrays["equity"]) == day + 1 - first
+    )
+
+
+def load_order_fills(path):
+    """Read the filled events of an archived ``-order-events.json`` as Orders."""
+    fills = []
+    for event in iter_order_events(path):
+        if event["status"] != "filled":
+            continue
+        local = datetime.fromtimestamp(event["time"], EXCHANGE_TZ).replace(tzinfo=None)
+        fills.append(Order(
+            np.datetime64(local, "m"),
+            event["symbolValue"],
+            event["fillQuantity"],
+            event["fillPrice"],
+            event.get("orderFeeAmount", 0.0),
+            "",
+        ))
+    return fills
+
+
+def compare_orders(orders, fills, price_tolerance=0.005):
+    """List (expected, actual) pairs where replayed orders differ from archived fills.
+
+    Orders are matched by fill day and symbol; either side is None when an
+    order exists only in one of the two lists.
+    """
+    def by_key(items):
+        keyed = {}
+        for item in items:
+            keyed.setdefault((item.time.astype("datetime64[D]"), item.symbol), []).append(item)
+        return keyed
+
+    replayed = by_key(orders)
+    archived = by_key(fills)
+    mismatches = []
+    for key in sorted(set(replayed) | set(archived)):
+        ours = replayed.get(key, [])
+        theirs = archived.get(key, [])
+        for index in range(max(len(ours), len(theirs))):
+            mine = ours[index] if index < len(ours) else None
+            lean = theirs[index] if index < len(theirs) else None
+            if mine and lean and mine.quantity == lean.quantity and abs(mine.price - lean.price) <= price_tolerance:
+                continue
+            mismatches.append((lean, mine))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay BuffettStrategy on local daily data.")
+    parser.add_argument("--start", default=StrategyParams.start)
+    parser.add_argument("--end")
+    parser.add_argument("--cash", type=float, default=StrategyParams.cash)
+    parser.add_argument("--data-folder")
+    parser.add_argument("--use-cache", action="store_true", help="read bars from the columnar cache")
+    parser.add_argument("--compare", help="archived -order-events.json to compare fills against")
+    parser.add_argument("--preflight", action="store_true", help="check data coverage first and use local stand-ins")
+    parser.add_argument("--substitute", action="append", metavar="TICKER=STAND_IN", help="stand-in ticker for --preflight")
+    parser.add_argument("--strict", action="store_true", help="with --preflight, refuse to run while data has gaps")
+    parser.add_argument("--checkpoint", action="store_true", help="resume from and save replay snapshots")
+    parser.add_argument("--checkpoint-every", type=int, default=21, help="trading days between snapshots")
+    parser.add_argument("--quotes", action="store_true", help="fill from minute quote bars where they exist")
+    parser.add_argument("--slippage", default="none", help="with --quotes: none, constant=<fraction> or volume=<limit>,<impact>")
+    args = parser.parse_args()
+
+    params = StrategyParams(start=args.start, end=args.end, cash=args.cash)
+    stand_ins = None
+    if args.preflight:
+        end = params.end or datetime.now().strftime("%Y-%m-%d")
+        first = np.datetime64(params.start, "D") - np.timedelta64(params.warmup_days, "D")
+        requests = [preflight.DataRequest("bars", ticker, "daily", first, np.datetime64(end, "D"), True) for ticker in params.symbols]
+        gaps = preflight.check(requests, preflight.DataIndex(args.data_folder),
+                               substitutes=preflight.parse_substitutes(args.substitute))
+        print(preflight.format_report(gaps))
+        if args.strict and preflight.blocking(gaps):
+            raise SystemExit("Refusing to run: required daily data has gaps")
+        stand_ins = preflight.stand_ins(gaps)
+    started = timer.perf_counter()
+    market = load_market(
+        params.symbols, params.start, params.end, params.warmup_days, args.data_folder, args.use_cache, stand_ins
+    )
+    fill_model = None
+    if args.quotes:
+        book = QuoteBook.load(market.symbols, market.days[0], market.days[-1] + 1, data_folder=args.data_folder)
+        fill_model = FillModel(book, parse_slippage(args.slippage))
+        print(f"{len(book)} minute quote bars for {len(market.symbols)} symbols")
+    checkpoints = CheckpointStore() if args.checkpoint else None
+    result = run_backtest(params, market, fill_model=fill_model, checkpoints=checkpoints,
+                          checkpoint_every=args.checkpoint_every)
+    elapsed = timer.perf_counter() - started
+
+    print(f"{len(result.days)} days, {len(result.orders)} orders, {len(result.signals)} signals in {elapsed * 1000:.1f} ms")
+    if len(result.equity):
+        print(f"End equity: ${result.equity[-1]:.2f}, Cash: ${result.cash[-1]:.2f}")
+    if args.compare:
+        fills = load_order_fills(args.compare)
+        mismatches = compare_orders(result.orders, fills)
+        print(f"{len(fills) - sum(1 for lean, _ in mismatches if lean)} of {len(fills)} archived fills matched")
+        for lean, mine in mismatches:
+            print(f"   Lean: {lean}\n   Replay: {mine}")
+
+
+if __name__ == "__main__":
+    main()
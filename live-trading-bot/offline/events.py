@@ -0,0 +1,123 @@
+"""Structured, rate-limited event log for the algorithm.
+
+``EventLog.emit`` records an event as (category, time, template, fields)
+without formatting anything. Each category can be sampled (keep a fixed share
+of its events) and rate limited (at most ``count`` events per ``key`` within
+a window of algorithm time). Only kept events are formatted for the human log
+(``self.Log`` in Lean), and they are appended to a batch that a background
+thread writes as compact JSON lines, so file I/O never runs on the
+algorithm's thread. Nothing is sampled or rate limited unless configured.
+Log lines start with ``"{time} >> "`` except for the ``untimed`` categories
+(continuation lines such as per-holding summaries). A write error stops the
+writer; ``close`` raises it::
+
+    events = EventLog(self.Log, path="events.jsonl", rate_limits={"signal": (1, timedelta(days=5))})
+    events.emit("dca", self.Time, "DCA: Bought {shares} shares of {ticker}", key=ticker, ticker=ticker, shares=10)
+    ...
+    events.close()
+"""
+import json
+import queue
+import threading
+from collections import deque
+
+_STOP = object()
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class EventLog:
+    """Lazy structured log with per-category sampling, rate limits and a JSON-lines writer."""
+
+    def __init__(self, log=None, path=None, sampling=None, rate_limits=None, batch_size=256, untimed=()):
+        self.log = log
+        self.path = path
+        self.sampling = dict(sampling or {})
+        self.rate_limits = dict(rate_limits or {})
+        self.batch_size = batch_size
+        self.untimed = frozenset(untimed)
+        self.error = None
+        self.emitted = {}
+        self.kept = {}
+        self._recent = {}
+        self._batch = []
+        self._queue = None
+        self._writer = None
+        if path:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_batches, name="event-log-writer", daemon=True)
+            self._writer.start()
+
+    def _keep(self, category, time, key):
+        seen = self.emitted.get(category, 0) + 1
+        self.emitted[category] = seen
+        share = self.sampling.get(category)
+        # Deterministic sampling: keep an event whenever the running share crosses an integer
+        if share is not None and int(seen * share) == int((seen - 1) * share):
+            return False
+        limit = self.rate_limits.get(category)
+        if limit is not None:
+            count, window = limit
+            recent = self._recent.setdefault((category, key), deque())
+            while recent and time - recent[0] >= window:
+                recent.popleft()
+            if len(recent) >= count:
+                return False
+            recent.append(time)
+        self.kept[category] = self.kept.get(category, 0) + 1
+        return True
+
+    def emit(self, category, time, template, key=None, **fields):
+        """Record one event; returns whether it was kept."""
+        if not self._keep(category, time, key):
+            return False
+        if self.log is not None:
+            message = template.format(**fields)
+            self.log(message if category in self.untimed else f"{time} >> {message}")
+        if self._queue is not None and self.error is None:
+            self._batch.append((time, category, fields))
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+        return True
+
+    def dropped(self):
+        """Events dropped by sampling or rate limits, per category."""
+        return {category: count - self.kept.get(category, 0) for category, count in self.emitted.items()}
+
+    def flush(self):
+        """Hand the pending batch to the writer thread."""
+        if self._queue is not None and self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self):
+        """Flush, wait for the writer thread to finish and raise the error that stopped it, if any."""
+        if self._writer is not None:
+            self.flush()
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+            self._queue = None
+        if self.error is not None:
+            raise self.error
+
+    def _write_batches(self):
+        try:
+            with open(self.path, "a") as handle:
+                while True:
+                    batch = self._queue.get()
+                    if batch is _STOP:
+                        return
+                    lines = [
+                        json.dumps({"time": str(time), "category": category, **fields}, separators=(",", ":"), default=_json_default)
+                        for time, category, fields in batch
+                    ]
+                    handle.write("\n".join(lines) + "\n")
+                    handle.flush()
+        except (OSError, TypeError, ValueError) as error:
+            # emit stops queueing once this is set; close raises it
+            self.error = error
@@ -0,0 +1,184 @@
+"""History service with an in-memory LRU tier over the columnar cache.
+
+``HistoryService.history`` answers QuantBook-style requests for
+(ticker, resolution, kind, normalization mode) over a time range. Two tiers
+sit between a request and the zipped source files:
+
+* memory: decoded, normalized Bars per series covering the widest range
+  requested so far, in an LRU bounded by ``max_bytes``. A request inside
+  that range is a ``searchsorted`` slice; a wider one re-reads only from the
+  disk tier and replaces the entry.
+* disk: the memory-mapped columnar cache (``offline.cache``), built once per
+  series and shared across sessions, so an evicted entry or a new notebook
+  kernel reloads without touching the zips.
+
+``stats()`` reports hits, misses, range extensions, evictions and the bytes
+currently held.
+"""
+import argparse
+import time as timer
+from collections import OrderedDict
+
+import numpy as np
+
+from offline.adjustments import AdjustmentIndex, NORMALIZATION_MODES
+from offline.cache import open_series
+from offline.data import MILLISECONDS_PER_DAY
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+BARS_PER_DAY = {"daily": 1, "hour": 7, "minute": 390, "second": 23400}
+MAXIMUM_LOOKBACK_DAYS = 365 * 50
+QUOTE_PRICE_FIELDS = ("bid_open", "bid_high", "bid_low", "bid_close", "ask_open", "ask_high", "ask_low", "ask_close")
+
+
+def _epoch_ms(value):
+    return np.datetime64(value, "ms").astype(np.int64)
+
+
+def _nbytes(bars):
+    return sum(getattr(values, "nbytes", 0) for values in bars)
+
+
+def _slice(bars, start, end):
+    # A view, not a copy: a hit costs two binary searches however much is cached
+    time = bars.time.astype("datetime64[ms]", copy=False).view(np.int64)
+    first = int(np.searchsorted(time, start))
+    last = int(np.searchsorted(time, end))
+    return bars._make(values[first:last] for values in bars)
+
+
+class HistoryService:
+    """Bounded LRU of decoded bar arrays in front of the columnar cache."""
+
+    def __init__(self, max_bytes=256 << 20, data_folder=None, cache_folder=None):
+        self.max_bytes = max_bytes
+        self.data_folder = data_folder
+        self.cache_folder = cache_folder
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+        self._series = {}
+        self._adjustments = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "extensions": self.extensions,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def history(self, ticker, start=None, end=None, resolution="daily", kind="trade", normalization="raw"):
+        """Bars with start <= time < end; None when the series does not exist."""
+        if normalization not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode {normalization!r}; expected one of {NORMALIZATION_MODES}")
+        key = (ticker.lower(), resolution, kind, normalization)
+        first = np.iinfo(np.int64).min if start is None else _epoch_ms(start)
+        last = np.iinfo(np.int64).max if end is None else _epoch_ms(end)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= first and last <= entry[1]:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return _slice(entry[2], first, last)
+
+        covered = (first, last)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.extensions += 1
+            covered = (min(first, entry[0]), max(last, entry[1]))
+            self._drop(key)
+        bars = self._load(ticker, resolution, kind, normalization, *covered)
+        if bars is None:
+            return None
+        self._store(key, covered + (bars,))
+        return _slice(bars, first, last)
+
+    def history_bars(self, ticker, count, end=None, resolution="daily", kind="trade", normalization="raw"):
+        """The last ``count`` bars before ``end`` (QuantBook's bar-count form)."""
+        if end is None:
+            bars = self.history(ticker, None, None, resolution, kind, normalization)
+            return None if bars is None else bars._make(values[-count:] for values in bars)
+        # Start from a calendar window that usually holds enough bars and double it until it does
+        days = count // BARS_PER_DAY.get(resolution, 1) * 7 // 5 + 5
+        while True:
+            start = np.datetime64(end, "ms") - np.timedelta64(days * MILLISECONDS_PER_DAY, "ms")
+            bars = self.history(ticker, start, end, resolution, kind, normalization)
+            if bars is None or len(bars.time) >= count or days > MAXIMUM_LOOKBACK_DAYS:
+                return None if bars is None else bars._make(values[-count:] for values in bars)
+            days *= 2
+
+    def _load(self, ticker, resolution, kind, normalization, first, last):
+        key = (ticker.lower(), resolution, kind)
+        series = self._series.get(key)
+        if series is None:
+            series = open_series(ticker, resolution, kind, self.data_folder, self.cache_folder)
+            if series is None:
+                return None
+            self._series[key] = series
+        time = np.asarray(series.time)
+        rows = slice(int(np.searchsorted(time, first)), int(np.searchsorted(time, last)))
+        bars = series.bars(rows)
+        if normalization == "raw":
+            return bars
+        if self._adjustments is None:
+            self._adjustments = AdjustmentIndex.load(self.data_folder, self.cache_folder)
+        dates = bars.time.astype("datetime64[D]")
+        fields = PRICE_FIELDS if kind == "trade" else QUOTE_PRICE_FIELDS
+        adjusted = {name: self._adjustments.adjust(ticker, dates, getattr(bars, name), normalization) for name in fields}
+        if kind == "trade":
+            split = self._adjustments.factors(ticker, dates).split_factor
+            adjusted["volume"] = bars.volume / split
+        return bars._replace(**adjusted)
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        self.bytes += _nbytes(entry[2])
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= _nbytes(entry[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold and warm history requests through the cache tiers.")
+    parser.add_argument("ticker")
+    parser.add_argument("--resolution", default="minute")
+    parser.add_argument("--kind", default="trade", choices=("trade", "quote"))
+    parser.add_argument("--normalization", default="raw", choices=NORMALIZATION_MODES)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    service = HistoryService()
+    started = timer.perf_counter()
+    bars = service.history(args.ticker, args.start, args.end, args.resolution, args.kind, args.normalization)
+    if bars is None:
+        raise SystemExit(f"No {args.resolution} {args.kind} data for {args.ticker}")
+    cold = timer.perf_counter() - started
+    middle = bars.time[len(bars.time) // 2] if len(bars.time) else None
+    started = timer.perf_counter()
+    for _ in range(args.repeat):
+        service.history(args.ticker, middle, args.end, args.resolution, args.kind, args.normalization)
+    warm = (timer.perf_counter() - started) / args.repeat
+    print(f"{len(bars.time)} bars: first request {cold * 1000:.1f} ms, overlapping request {warm * 1e6:.0f} us")
+    print(f"   {service.stats()}")
+
+
+if __name__ == "__main__":
+    main()
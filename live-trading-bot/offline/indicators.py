@@ -0,0 +1,294 @@
+"""Incremental rolling indicators over many symbols at once.
+
+Every indicator keeps the state of N symbols in contiguous arrays and takes
+one price vector per timestep; an update is a fixed number of array
+operations, independent of the period. Windowed indicators share a
+``RollingWindow`` ring buffer of shape (period, N) with a per-symbol sample
+count, so a ``mask`` can skip symbols without a bar on a given step.
+
+Definitions follow LEAN's defaults: the standard deviation is the population
+one, EMA and ATR are seeded with the simple average of their first
+``period`` samples, and ATR uses Wilder smoothing. Values are NaN until an
+indicator has seen its first sample; ``ready`` flags symbols with a full
+window.
+"""
+import argparse
+import time as timer
+
+import numpy as np
+
+
+class RollingWindow:
+    """Ring buffer of the last ``period`` values of N symbols."""
+
+    def __init__(self, period, size):
+        self.period = period
+        self.values = np.zeros((period, size))
+        self.count = np.zeros(size, dtype=np.int64)
+        self.columns = np.arange(size)
+        # While every push covers all symbols they share one ring slot
+        self.uniform = True
+        self.steps = 0
+
+    def push(self, values, mask=None):
+        """Store one value per (masked) symbol; returns (columns, dropped values, was full).
+
+        Columns are ``slice(None)`` and "was full" a single bool while every
+        push has covered all symbols.
+        """
+        if mask is None and self.uniform:
+            slot = self.steps % self.period
+            dropped = self.values[slot].copy()
+            full = self.steps >= self.period
+            self.values[slot] = values
+            self.steps += 1
+            self.count += 1
+            return slice(None), dropped, full
+        self.uniform = False
+        index = self.columns if mask is None else np.flatnonzero(mask)
+        slot = self.count[index] % self.period
+        dropped = self.values[slot, index]
+        full = self.count[index] >= self.period
+        self.values[slot, index] = values[index]
+        self.count[index] += 1
+        return index, dropped, full
+
+
+class _Indicator:
+    def __init__(self, period, size):
+        self.period = period
+        self.size = size
+        self.count = np.zeros(size, dtype=np.int64)
+        self.value = np.full(size, np.nan)
+        self.seeded = False
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def _all_seeded(self):
+        """Whether every symbol is past its seeding period (checked until it is)."""
+        if not self.seeded and self.count.min() > self.period:
+            self.seeded = True
+        return self.seeded
+
+    @staticmethod
+    def _columns(mask):
+        return slice(None) if mask is None else np.flatnonzero(mask)
+
+
+class SimpleMovingAverage(_Indicator):
+    def __init__(self, period, size):
+        super().__init__(period, size)
+        self.window = RollingWindow(period, size)
+        self.total = np.zeros(size)
+
+    def update(self, values, mask=None):
+        index, dropped, full = self.window.push(values, mask)
+        self.total[index] += values[index] - (dropped if full is True else np.where(full, dropped, 0.0))
+        self.count[index] += 1
+        self.value[index] = self.total[index] / np.minimum(self.count[index], self.period)
+        return self.value
+
+
+class ExponentialMovingAverage(_Indicator):
+    def __init__(self, period, size, smoothing=None):
+        super().__init__(period, size)
+        self.smoothing = 2.0 / (period + 1) if smoothing is None else smoothing
+        self.total = np.zeros(size)
+
+    def update(self, values, mask=None):
+        if mask is None and self._all_seeded():
+            self.count += 1
+            self.value += self.smoothing * (values - self.value)
+            return self.value
+        columns = self._columns(mask)
+        values = values[columns]
+        count = self.count[columns] + 1
+        self.count[columns] = count
+        warming = count <= self.period
+        self.total[columns] += np.where(warming, values, 0.0)
+        current = self.value[columns]
+        self.value[columns] = np.where(
+            warming, self.total[columns] / np.minimum(count, self.period), current + self.smoothing * (values - current)
+        )
+        return self.value
+
+
+class RollingStandardDeviation(_Indicator):
+    """Population standard deviation with a windowed Welford update."""
+
+    def __init__(self, period, size):
+        super().__init__(period, size)
+        self.window = RollingWindow(period, size)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def update(self, values, mask=None):
+        index, dropped, full = self.window.push(values, mask)
+        if full is True:
+            mean = self.mean
+            updated = mean + (values - dropped) / self.period
+            self.m2 += (values - dropped) * (values - updated + dropped - mean)
+            self.mean = updated
+            self.count += 1
+            self.value = np.sqrt(np.maximum(self.m2, 0.0) / self.period)
+            return self.value
+        values = values[index]
+        count = np.minimum(self.count[index] + 1, self.period)
+        self.count[index] += 1
+        mean = self.mean[index]
+        # A full window replaces its oldest sample; otherwise the sample is appended
+        removed = np.where(full, dropped, mean)
+        updated = mean + (values - removed) / count
+        self.m2[index] += np.where(
+            full, (values - dropped) * (values - updated + dropped - mean), (values - mean) * (values - updated)
+        )
+        self.mean[index] = updated
+        self.value[index] = np.sqrt(np.maximum(self.m2[index], 0.0) / count)
+        return self.value
+
+
+class BollingerBands(_Indicator):
+    def __init__(self, period, size, k=2.0):
+        super().__init__(period, size)
+        self.k = k
+        self.std = RollingStandardDeviation(period, size)
+        self.upper = np.full(size, np.nan)
+        self.lower = np.full(size, np.nan)
+
+    @property
+    def ready(self):
+        return self.std.ready
+
+    def update(self, values, mask=None):
+        deviation = self.std.update(values, mask)
+        self.value = self.std.mean.copy()
+        self.value[self.std.count == 0] = np.nan
+        self.upper = self.value + self.k * deviation
+        self.lower = self.value - self.k * deviation
+        return self.value
+
+
+class Drawdown(_Indicator):
+    """Fractional decline from the running peak since the first sample."""
+
+    def __init__(self, size):
+        super().__init__(1, size)
+        self.peak = np.full(size, -np.inf)
+
+    def update(self, values, mask=None):
+        columns = self._columns(mask)
+        self.count[columns] += 1
+        self.peak[columns] = np.maximum(self.peak[columns], values[columns])
+        self.value[columns] = 1 - values[columns] / self.peak[columns]
+        return self.value
+
+
+class AverageTrueRange(_Indicator):
+    """Wilder-smoothed average true range."""
+
+    def __init__(self, period, size):
+        super().__init__(period, size)
+        self.previous_close = np.full(size, np.nan)
+        self.total = np.zeros(size)
+
+    def update(self, close, high=None, low=None, mask=None):
+        columns = self._columns(mask)
+        close = close[columns]
+        high = close if high is None else high[columns]
+        low = close if low is None else low[columns]
+        previous = self.previous_close[columns]
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        if mask is None and self._all_seeded():
+            self.count += 1
+            self.value += (true_range - self.value) / self.period
+            self.previous_close = close.copy()
+            return self.value
+        count = self.count[columns] + 1
+        self.count[columns] = count
+        warming = count <= self.period
+        self.total[columns] += np.where(warming, true_range, 0.0)
+        current = self.value[columns]
+        self.value[columns] = np.where(
+            warming, self.total[columns] / np.minimum(count, self.period), current + (true_range - current) / self.period
+        )
+        self.previous_close[columns] = close
+        return self.value
+
+
+class IndicatorSet:
+    """Named indicators updated together from one bar vector per timestep."""
+
+    def __init__(self, size, **indicators):
+        self.size = size
+        self.indicators = dict(indicators)
+
+    def __getitem__(self, name):
+        return self.indicators[name]
+
+    def add(self, name, indicator):
+        self.indicators[name] = indicator
+        return indicator
+
+    def update(self, close, high=None, low=None, mask=None):
+        close = np.asarray(close, dtype=np.float64)
+        for indicator in self.indicators.values():
+            if isinstance(indicator, AverageTrueRange):
+                indicator.update(close, high, low, mask)
+            else:
+                indicator.update(close, mask)
+
+
+def volatility_thresholds(deviation, prices, scale, fallback, ready=None):
+    """Per-symbol fractional thresholds of ``scale`` standard deviations.
+
+    Symbols whose deviation is not ready (or whose price is missing) keep the
+    fixed ``fallback`` threshold.
+    """
+    ready = np.ones(len(prices), dtype=bool) if ready is None else ready
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = scale * deviation / prices
+    return np.where(ready & (prices > 0) & np.isfinite(scaled), scaled, fallback)
+
+
+def default_set(size):
+    """Twenty indicators: the benchmark mix of SMAs, EMAs, deviations, bands, ATRs and drawdown."""
+    indicators = {}
+    for period in (10, 20, 50, 100, 200):
+        indicators[f"sma{period}"] = SimpleMovingAverage(period, size)
+        indicators[f"ema{period}"] = ExponentialMovingAverage(period, size)
+    for period in (20, 50, 100, 200):
+        indicators[f"std{period}"] = RollingStandardDeviation(period, size)
+    for period in (20, 30, 50):
+        indicators[f"bb{period}"] = BollingerBands(period, size)
+    indicators["atr14"] = AverageTrueRange(14, size)
+    indicators["atr20"] = AverageTrueRange(20, size)
+    indicators["drawdown"] = Drawdown(size)
+    return IndicatorSet(size, **indicators)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time incremental indicator updates over many symbols.")
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--bars", type=int, default=390, help="timesteps (390 = one day of minute bars)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(args.seed)
+    close = 100 * np.exp(np.cumsum(generator.normal(0, 0.001, (args.bars, args.symbols)), axis=0))
+    spread = np.abs(generator.normal(0, 0.0005, (args.bars, args.symbols))) * close
+    indicators = default_set(args.symbols)
+
+    started = timer.perf_counter()
+    for step in range(args.bars):
+        indicators.update(close[step], close[step] + spread[step], close[step] - spread[step])
+    elapsed = timer.perf_counter() - started
+    print(
+        f"{len(indicators.indicators)} indicators x {args.symbols} symbols: "
+        f"{elapsed / args.bars * 1e6:.1f} us per bar over {args.bars} bars"
+    )
+
+
+if __name__ == "__main__":
+    main()
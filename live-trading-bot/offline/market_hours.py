@@ -0,0 +1,227 @@
+"""Compact exchange calendars compiled from market-hours-database.json.
+
+The first request for an entry such as ``Equity-usa-[*]`` parses the JSON
+once and compiles the entry into a few-KB ``.npz`` under the cache folder:
+per-day regular session open/close minutes (int16, -1 on closed days) and
+packed holiday / early-close / late-open bitsets over a fixed date range.
+Later loads map those few arrays instead of the 3.8 MB JSON, and schedule
+queries (``trading_days``, ``month_starts``, ``after_market_open``, ...) are
+binary searches over the trading-day array.
+
+Times are exchange-local and naive, like LEAN's data files. For sessions that
+cross midnight (futures) each calendar day keeps its first regular-market
+start and last regular-market end.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER, FORMAT_VERSION, Source, fingerprint, is_fresh, write_manifest
+from offline.data import DATA_FOLDER
+
+DATABASE_PATH = os.path.join(DATA_FOLDER, "market-hours", "market-hours-database.json")
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+FIRST_DAY = "1998-01-01"
+LAST_DAY = "2030-12-31"
+
+_database = None
+
+
+def _load_database(path):
+    global _database
+    if _database is None or _database[0] != path:
+        with open(path) as handle:
+            _database = (path, json.load(handle)["entries"])
+    return _database[1]
+
+
+def _minutes(text):
+    """Minutes of day for "hh:mm:ss", "d.hh:mm:ss" or "d:hh:mm:ss" values."""
+    parts = [int(part) for part in text.replace(".", ":").split(":")]
+    if len(parts) == 4:
+        return parts[0] * 1440 + parts[1] * 60 + parts[2]
+    return parts[0] * 60 + parts[1]
+
+
+def _day_number(text):
+    return (datetime.strptime(text, "%m/%d/%Y").date() - datetime(1970, 1, 1).date()).days
+
+
+def entry_key(security_type="Equity", market="usa", symbol=None, path=None):
+    """Return the database key for a symbol, falling back to the market wildcard."""
+    entries = _load_database(path or DATABASE_PATH)
+    specific = f"{security_type}-{market}-{symbol}"
+    if symbol and specific in entries:
+        return specific
+    return f"{security_type}-{market}-[*]"
+
+
+def compile_entry(key, path=None, cache_folder=None, first_day=FIRST_DAY, last_day=LAST_DAY):
+    """Compile one database entry into its cached calendar file."""
+    path = path or DATABASE_PATH
+    entry = _load_database(path)[key]
+    first = np.datetime64(first_day, "D").astype(np.int64)
+    days = np.arange(first, np.datetime64(last_day, "D").astype(np.int64) + 1)
+    # 1970-01-01 was a Thursday
+    weekdays = (days + 3) % 7
+
+    template = np.full((7, 2), -1, dtype=np.int16)
+    for index, name in enumerate(WEEKDAYS):
+        segments = [segment for segment in entry.get(name, []) if segment["state"] == "market"]
+        if segments:
+            template[index] = (min(_minutes(s["start"]) for s in segments), max(_minutes(s["end"]) for s in segments))
+    opens = template[weekdays, 0].copy()
+    closes = template[weekdays, 1].copy()
+
+    def flags(dates):
+        mask = np.zeros(len(days), dtype=bool)
+        positions = np.array([_day_number(date) for date in dates], dtype=np.int64) - first
+        mask[positions[(positions >= 0) & (positions < len(days))]] = True
+        return mask
+
+    holidays = flags(entry.get("holidays", []))
+    early = flags(entry.get("earlyCloses", {}))
+    late = flags(entry.get("lateOpens", {}))
+    for date, value in entry.get("earlyCloses", {}).items():
+        position = _day_number(date) - first
+        if 0 <= position < len(days) and opens[position] >= 0:
+            closes[position] = min(closes[position], _minutes(value))
+    for date, value in entry.get("lateOpens", {}).items():
+        position = _day_number(date) - first
+        if 0 <= position < len(days) and opens[position] >= 0:
+            opens[position] = max(opens[position], _minutes(value))
+    opens[holidays] = -1
+    closes[holidays] = -1
+
+    folder = os.path.join(cache_folder or CACHE_FOLDER, "market-hours", key)
+    os.makedirs(folder, exist_ok=True)
+    np.savez_compressed(
+        os.path.join(folder, "calendar.npz"),
+        first_day=np.int64(first),
+        open_minutes=opens,
+        close_minutes=closes,
+        holidays=np.packbits(holidays),
+        early_closes=np.packbits(early),
+        late_opens=np.packbits(late),
+        time_zone=np.array(entry["exchangeTimeZone"]),
+    )
+    write_manifest(folder, {"version": FORMAT_VERSION, "sources": {path: fingerprint(path)}})
+    return folder
+
+
+class MarketCalendar:
+    """Session times of one exchange/security type backed by compiled arrays."""
+
+    def __init__(self, folder):
+        with np.load(os.path.join(folder, "calendar.npz")) as arrays:
+            self.first_day = int(arrays["first_day"])
+            self.open_minutes = arrays["open_minutes"]
+            self.close_minutes = arrays["close_minutes"]
+            size = len(self.open_minutes)
+            self.holidays = np.unpackbits(arrays["holidays"])[:size].astype(bool)
+            self.early_closes = np.unpackbits(arrays["early_closes"])[:size].astype(bool)
+            self.late_opens = np.unpackbits(arrays["late_opens"])[:size].astype(bool)
+            self.time_zone = str(arrays["time_zone"])
+        open_days = np.nonzero(self.open_minutes >= 0)[0]
+        self.days = (open_days + self.first_day).astype("datetime64[D]")
+        self._open = self.open_minutes[open_days].astype(np.int64)
+        self._close = self.close_minutes[open_days].astype(np.int64)
+
+    @classmethod
+    def load(cls, security_type="Equity", market="usa", symbol=None, path=None, cache_folder=None):
+        """Open a compiled calendar, compiling it when missing or stale."""
+        path = path or DATABASE_PATH
+        # Resolving symbol-specific overrides needs the JSON; the wildcard key does not
+        key = entry_key(security_type, market, symbol, path) if symbol else f"{security_type}-{market}-[*]"
+        folder = os.path.join(cache_folder or CACHE_FOLDER, "market-hours", key)
+        if not is_fresh(folder, [Source(None, path)]):
+            compile_entry(key, path, cache_folder)
+        return cls(folder)
+
+    def _positions(self, dates):
+        return np.searchsorted(self.days, np.asarray(dates, dtype="datetime64[D]"))
+
+    def is_trading_day(self, dates):
+        """Whether each date has a regular session."""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        positions = np.minimum(self._positions(dates), len(self.days) - 1)
+        return self.days[positions] == dates
+
+    def trading_days(self, start, end):
+        """Trading days between start and end inclusive."""
+        first, last = self._positions([start, np.datetime64(end, "D") + 1])
+        return self.days[first:last]
+
+    def month_starts(self, start, end, days_offset=0):
+        """First (plus ``days_offset``) trading day of each month between start and end (DateRules.MonthStart)."""
+        # Whole months, so an offset near the end of the range lands where it would in a longer one
+        end = np.datetime64(end, "D")
+        days = self.trading_days(np.datetime64(start, "M"), (end.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1)
+        months = days.astype("datetime64[M]")
+        keep = np.ones(len(days), dtype=bool)
+        keep[1:] = months[1:] != months[:-1]
+        first = np.flatnonzero(keep)
+        # Like Lean, an offset past the month's last trading day falls back to that day
+        month_end = np.append(first[1:], len(days)) - 1
+        days = days[np.minimum(first + days_offset, month_end)]
+        return days[(days >= np.datetime64(start, "D")) & (days <= end)]
+
+    def _session(self, minutes, dates):
+        # Dates without a session (holidays, weekends, outside the table) get NaT
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        positions = self._positions(dates)
+        inside = positions < len(self.days)
+        positions = np.minimum(positions, len(self.days) - 1)
+        trading = inside & (self.days[positions] == dates)
+        times = dates.astype("datetime64[m]") + minutes[positions].astype("timedelta64[m]")
+        return np.where(trading, times, np.datetime64("NaT", "m"))
+
+    def session_open(self, dates):
+        """Regular session open of each date as datetime64[m], NaT on days without one."""
+        return self._session(self._open, dates)
+
+    def session_close(self, dates):
+        """Regular session close of each date as datetime64[m], NaT on days without one."""
+        return self._session(self._close, dates)
+
+    def after_market_open(self, dates, minutes=0):
+        """TimeRules.AfterMarketOpen for each trading day."""
+        return self.session_open(dates) + np.timedelta64(minutes, "m")
+
+    def before_market_close(self, dates, minutes=0):
+        """TimeRules.BeforeMarketClose for each trading day."""
+        return self.session_close(dates) - np.timedelta64(minutes, "m")
+
+    def is_open(self, times):
+        """Whether each exchange-local time falls inside a regular session."""
+        times = np.asarray(times, dtype="datetime64[m]")
+        dates = times.astype("datetime64[D]")
+        trading = self.is_trading_day(dates)
+        positions = np.minimum(self._positions(dates), len(self.days) - 1)
+        minute = (times - dates.astype("datetime64[m]")).astype(np.int64)
+        return trading & (minute >= self._open[positions]) & (minute < self._close[positions])
+
+    def next_open(self, time):
+        """Next regular session open at or after an exchange-local time."""
+        time = np.datetime64(time, "m")
+        position = int(self._positions([time.astype("datetime64[D]")])[0])
+        while position < len(self.days):
+            opened = self.days[position].astype("datetime64[m]") + np.timedelta64(int(self._open[position]), "m")
+            if opened >= time:
+                return opened
+            position += 1
+        return None
+
+    def _flag(self, flags, dates):
+        # Dates outside the compiled table are neither holidays nor early closes
+        offsets = np.asarray(dates, dtype="datetime64[D]").astype(np.int64) - self.first_day
+        inside = (offsets >= 0) & (offsets < len(flags))
+        return inside & flags[np.clip(offsets, 0, len(flags) - 1)]
+
+    def is_early_close(self, dates):
+        return self._flag(self.early_closes, dates)
+
+    def is_holiday(self, dates):
+        return self._flag(self.holidays, dates)
@@ -0,0 +1,65 @@
+"""Headline statistics for offline replay results."""
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def daily_returns(equity):
+    """Simple returns between consecutive equity values."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return np.empty(0)
+    return equity[1:] / equity[:-1] - 1
+
+
+def sharpe_ratio(returns, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """Annualized Sharpe ratio of periodic returns with a zero risk-free rate."""
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) < 2:
+        return 0.0
+    deviation = returns.std(ddof=1)
+    if deviation == 0:
+        return 0.0
+    return float(returns.mean() / deviation * np.sqrt(periods_per_year))
+
+
+def max_drawdown(equity):
+    """Largest peak-to-trough loss of an equity curve as a positive fraction."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(equity)
+    return float(np.max(1 - equity / peaks))
+
+
+def cagr(equity, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """Compounding annual return of an equity curve sampled once per period."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2 or equity[0] <= 0:
+        return 0.0
+    years = (len(equity) - 1) / periods_per_year
+    return float((equity[-1] / equity[0]) ** (1 / years) - 1)
+
+
+def turnover(orders, equity, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """Annualized traded value divided by the average portfolio value."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0
+    traded = sum(abs(order.quantity * order.price) for order in orders)
+    years = max(len(equity), 1) / periods_per_year
+    return float(traded / equity.mean() / years)
+
+
+def summarize(result):
+    """Collect the headline statistics of a BacktestResult into a flat dict."""
+    equity = result.equity
+    return {
+        "end_equity": float(equity[-1]) if len(equity) else 0.0,
+        "cagr": cagr(equity),
+        "sharpe": sharpe_ratio(daily_returns(equity)),
+        "drawdown": max_drawdown(equity),
+        "turnover": turnover(result.orders, equity),
+        "orders": len(result.orders),
+        "fees": float(sum(order.fee for order in result.orders)),
+    }
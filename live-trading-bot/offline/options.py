@@ -0,0 +1,269 @@
+"""Option-chain loader and vectorized Black-Scholes pricing.
+
+LEAN packs a day of option bars into one zip per underlying, with one CSV per
+contract whose name encodes the right, strike (x10000) and expiry::
+
+    option/usa/minute/aapl/20140606_trade_american.zip
+        20140606_aapl_minute_trade_american_call_5750000_20140621.csv
+
+``chain_index`` parses a zip's member names once into arrays (right, strike,
+expiry, member), so narrowing a chain to the strikes and expiries near the
+money is a boolean mask; ``load_chain`` then decompresses only those
+members. Implied volatility and the Greeks of the whole chain come from one
+vectorized Black-Scholes pass (a fixed number of safeguarded Newton steps),
+and ``pick_contract`` chooses the contract for a covered-call or
+protective-put signal from those arrays.
+
+Black-Scholes treats the American contracts as European and ignores
+dividends, which slightly underprices deep in-the-money puts; the overlay
+targets out-of-the-money strikes, where the difference is small.
+"""
+import argparse
+import os
+import re
+import zipfile
+from collections import namedtuple
+
+import numpy as np
+
+from offline.data import (
+    DATA_FOLDER,
+    PRICE_SCALE,
+    QUOTE_COLUMNS,
+    TRADE_COLUMNS,
+    parse_int_csv,
+    read_intraday_bars,
+    yyyymmdd_to_datetime64,
+)
+
+CALL = 0
+PUT = 1
+RIGHTS = {"call": CALL, "put": PUT}
+DAYS_PER_YEAR = 365.0
+MEMBER_NAME = re.compile(r"_(call|put)_(\d+)_(\d{8})\.csv$")
+
+ChainIndex = namedtuple("ChainIndex", "path right strike expiry member")
+Chain = namedtuple("Chain", "date time spot right strike expiry years price volume member")
+Greeks = namedtuple("Greeks", "iv delta gamma vega theta rho")
+
+_indexes = {}
+
+
+def option_zip_path(underlying, date, kind="trade", resolution="minute", style="american", data_folder=None):
+    folder = os.path.join(data_folder or DATA_FOLDER, "option", "usa", resolution, underlying.lower())
+    return os.path.join(folder, f"{date}_{kind}_{style}.zip")
+
+
+def chain_index(path):
+    """Contract arrays of one option zip, parsed from its member names once per process."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    index = _indexes.get(path)
+    if index is not None and index[0] == key:
+        return index[1]
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+    parsed = [(name, MEMBER_NAME.search(name)) for name in names]
+    parsed = [(name, match) for name, match in parsed if match]
+    index = ChainIndex(
+        path,
+        np.array([RIGHTS[match.group(1)] for _, match in parsed], dtype=np.int8),
+        np.array([int(match.group(2)) for _, match in parsed], dtype=np.float64) / PRICE_SCALE,
+        yyyymmdd_to_datetime64([int(match.group(3)) for _, match in parsed]),
+        np.array([name for name, _ in parsed]),
+    )
+    _indexes[path] = (key, index)
+    return index
+
+
+def near_money(index, spot, date, moneyness=0.10, min_days=7, max_days=60, right=None):
+    """Mask of contracts within ``moneyness`` of spot and expiring in [min_days, max_days]."""
+    days = (index.expiry - np.datetime64(date, "D")).astype(np.int64)
+    mask = (np.abs(index.strike / spot - 1) <= moneyness) & (days >= min_days) & (days <= max_days)
+    if right is not None:
+        mask &= index.right == right
+    return mask
+
+
+def _last_price(rows, kind, cutoff):
+    """Last trade close (or bid/ask mid) at or before ``cutoff`` epoch ms, plus volume."""
+    time, values = rows
+    keep = time <= cutoff
+    if not keep.any():
+        return np.nan, 0.0
+    last = np.flatnonzero(keep)[-1]
+    if kind == "trade":
+        return values[last, TRADE_COLUMNS.index("close")] / PRICE_SCALE, float(values[keep, TRADE_COLUMNS.index("volume")].sum())
+    bid = values[last, QUOTE_COLUMNS.index("bid_close")]
+    ask = values[last, QUOTE_COLUMNS.index("ask_close")]
+    if bid <= 0 or ask <= 0:
+        return np.nan, 0.0
+    return (bid + ask) / 2 / PRICE_SCALE, 0.0
+
+
+def load_chain(underlying, date, time="10:00", spot=None, kind="trade", moneyness=0.10, min_days=7,
+               max_days=60, right=None, data_folder=None):
+    """Near-the-money contracts of one day priced at ``time`` (exchange time).
+
+    ``spot`` defaults to the underlying's last minute close at ``time``
+    (FileNotFoundError without minute data that day, LookupError when its
+    first bar is later). Contracts without a bar by then have a NaN price.
+    """
+    date = str(date).replace("-", "")
+    hours, minutes = (int(part) for part in time.split(":"))
+    midnight = yyyymmdd_to_datetime64([int(date)])[0]
+    cutoff_time = midnight.astype("datetime64[m]") + np.timedelta64(hours * 60 + minutes, "m")
+    cutoff = cutoff_time.astype("datetime64[ms]").astype(np.int64)
+    if spot is None:
+        bars = read_intraday_bars(underlying, date, "minute", "trade", data_folder)
+        if bars is None:
+            raise FileNotFoundError(f"No minute bars of {underlying} on {date} to take the spot price from")
+        closes = bars.close[bars.time <= cutoff_time.astype("datetime64[ms]")]
+        if not len(closes):
+            raise LookupError(f"No minute bar of {underlying} on {date} by {time} to take the spot price from")
+        spot = float(closes[-1])
+
+    index = chain_index(option_zip_path(underlying, date, kind, data_folder=data_folder))
+    rows = np.flatnonzero(near_money(index, spot, midnight, moneyness, min_days, max_days, right))
+    columns = len(TRADE_COLUMNS) if kind == "trade" else len(QUOTE_COLUMNS)
+    prices = np.full(len(rows), np.nan)
+    volumes = np.zeros(len(rows))
+    day_ms = midnight.astype("datetime64[ms]").astype(np.int64)
+    with zipfile.ZipFile(index.path) as archive:
+        for position, row in enumerate(rows):
+            parsed = parse_int_csv(archive.read(index.member[row]), columns + 1)
+            prices[position], volumes[position] = _last_price((parsed[:, 0] + day_ms, parsed[:, 1:]), kind, cutoff)
+
+    expiry = index.expiry[rows]
+    # Contracts expire at the 16:00 close
+    years = ((expiry.astype("datetime64[m]") + np.timedelta64(16 * 60, "m")) - cutoff_time).astype(np.int64) / (DAYS_PER_YEAR * 1440)
+    return Chain(midnight, cutoff_time, spot, index.right[rows], index.strike[rows], expiry, years, prices, volumes, index.member[rows])
+
+
+def norm_cdf(x):
+    """Standard normal CDF (Abramowitz & Stegun 26.2.17, |error| < 7.5e-8)."""
+    x = np.asarray(x, dtype=np.float64)
+    t = 1 / (1 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = norm_pdf(x) * poly
+    return np.where(x >= 0, 1 - upper, upper)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * np.square(x)) / np.sqrt(2 * np.pi)
+
+
+def _d1_d2(spot, strike, years, rate, vol):
+    root = vol * np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / root
+    return d1, d1 - root
+
+
+def black_scholes(spot, strike, years, rate, vol, right):
+    """European option prices; ``right`` is CALL/PUT per contract."""
+    d1, d2 = _d1_d2(spot, strike, years, rate, vol)
+    discount = strike * np.exp(-rate * years)
+    call = spot * norm_cdf(d1) - discount * norm_cdf(d2)
+    put = discount * norm_cdf(-d2) - spot * norm_cdf(-d1)
+    return np.where(right == CALL, call, put)
+
+
+def implied_volatility(price, spot, strike, years, rate, right, iterations=30, low=1e-4, high=5.0):
+    """Implied volatility of every contract at once.
+
+    Newton steps on vega, falling back to bisection whenever a step leaves the
+    current bracket; prices outside the no-arbitrage bounds give NaN.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    strike = np.asarray(strike, dtype=np.float64)
+    years = np.maximum(np.asarray(years, dtype=np.float64), 1e-6)
+    right = np.asarray(right)
+    discount = strike * np.exp(-rate * years)
+    intrinsic = np.where(right == CALL, np.maximum(spot - discount, 0), np.maximum(discount - spot, 0))
+    ceiling = np.where(right == CALL, spot, discount)
+    valid = np.isfinite(price) & (price > intrinsic) & (price < ceiling)
+
+    lower = np.full(price.shape, low)
+    upper = np.full(price.shape, high)
+    vol = np.full(price.shape, 0.3)
+    for _ in range(iterations):
+        error = black_scholes(spot, strike, years, rate, vol, right) - price
+        upper = np.where(error > 0, vol, upper)
+        lower = np.where(error <= 0, vol, lower)
+        d1, _ = _d1_d2(spot, strike, years, rate, vol)
+        vega = spot * norm_pdf(d1) * np.sqrt(years)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            step = vol - error / vega
+        vol = np.where((step > lower) & (step < upper), step, (lower + upper) / 2)
+    return np.where(valid, vol, np.nan)
+
+
+def greeks(spot, strike, years, rate, vol, right):
+    """Delta, gamma, vega (per 1.00 vol), theta (per year) and rho of each contract."""
+    years = np.maximum(np.asarray(years, dtype=np.float64), 1e-6)
+    d1, d2 = _d1_d2(spot, strike, years, rate, vol)
+    is_call = np.asarray(right) == CALL
+    discount = strike * np.exp(-rate * years)
+    density = norm_pdf(d1)
+    delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1)
+    gamma = density / (spot * vol * np.sqrt(years))
+    vega = spot * density * np.sqrt(years)
+    decay = -spot * density * vol / (2 * np.sqrt(years))
+    theta = np.where(is_call, decay - rate * discount * norm_cdf(d2), decay + rate * discount * norm_cdf(-d2))
+    rho = np.where(is_call, discount * years * norm_cdf(d2), -discount * years * norm_cdf(-d2))
+    return delta, gamma, vega, theta, rho
+
+
+def chain_greeks(chain, rate=0.01):
+    """Implied volatility and Greeks of every contract in a Chain."""
+    iv = implied_volatility(chain.price, chain.spot, chain.strike, chain.years, rate, chain.right)
+    return Greeks(iv, *greeks(chain.spot, chain.strike, chain.years, rate, iv, chain.right))
+
+
+def pick_contract(chain, values, signal, target_delta=0.30):
+    """Row of the contract to trade for a "covered_call" or "protective_put" signal.
+
+    ``values`` are the chain's Greeks from ``chain_greeks``. Out-of-the-money
+    contracts of the matching right with a valid implied volatility are
+    ranked by distance from ``target_delta`` (in absolute value), then by
+    time to expiry. Returns None when nothing qualifies.
+    """
+    right = CALL if signal == "covered_call" else PUT
+    otm = chain.strike > chain.spot if right == CALL else chain.strike < chain.spot
+    rows = np.flatnonzero((chain.right == right) & otm & np.isfinite(values.iv))
+    if len(rows) == 0:
+        return None
+    distance = np.abs(np.abs(values.delta[rows]) - target_delta)
+    return int(rows[np.lexsort((chain.years[rows], distance))[0]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price a near-the-money option chain and pick overlay contracts.")
+    parser.add_argument("underlying")
+    parser.add_argument("date", help="YYYYMMDD")
+    parser.add_argument("--time", default="10:00")
+    parser.add_argument("--spot", type=float)
+    parser.add_argument("--kind", default="trade", choices=("trade", "quote"))
+    parser.add_argument("--moneyness", type=float, default=0.10)
+    parser.add_argument("--rate", type=float, default=0.01)
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    chain = load_chain(args.underlying, args.date, args.time, args.spot, args.kind, args.moneyness, data_folder=args.data_folder)
+    values = chain_greeks(chain, args.rate)
+    priced = np.isfinite(values.iv)
+    print(f"{args.underlying.upper()} {args.date} {args.time}: spot ${chain.spot:.2f}, {len(chain.strike)} contracts near the money, {priced.sum()} priced")
+    for signal in ("covered_call", "protective_put"):
+        row = pick_contract(chain, values, signal)
+        if row is None:
+            print(f"   {signal}: no contract")
+            continue
+        right = "call" if chain.right[row] == CALL else "put"
+        print(
+            f"   {signal}: {right} {chain.strike[row]:g} exp {chain.expiry[row]} at ${chain.price[row]:.2f}, "
+            f"iv {values.iv[row]:.1%}, delta {values.delta[row]:.2f}, theta/day {values.theta[row] / DAYS_PER_YEAR:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Pre-flight data check: every request of a backtest against the local data tree.
+
+``data_requests`` derives the (symbol, resolution, date range) requests of an
+algorithm statically from its ``Initialize`` (``offline.source``), plus what
+LEAN loads implicitly: the SPY hour benchmark, factor and map files of each
+equity and the interest-rate series. ``DataIndex`` scans ``data/`` once,
+listing which daily/hour zips, intraday day files, factor/map files and
+coarse days exist, and ``check`` compares every request with it against the
+exchange calendar's trading days. Daily and hour coverage comes from the day
+index of the columnar cache rather than from re-reading the zips.
+
+A gap can be closed by a stand-in: consolidating the same symbol from a finer
+local resolution (``offline.consolidate``), or an explicit substitute ticker
+(``--substitute MSFT=SPY``). ``--strict`` exits non-zero while required
+series still have gaps, so a run never starts on a fraction of its symbols.
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from offline.cache import open_series
+from offline.data import DATA_FOLDER, WHOLE_HISTORY_RESOLUTIONS
+from offline.market_hours import MarketCalendar
+from offline.source import extract_parameters, extract_subscriptions
+
+BENCHMARK = "SPY"
+BENCHMARK_RESOLUTION = "hour"
+INTRADAY_RESOLUTIONS = ("minute", "second", "tick")
+# Finer resolutions a bar series can be consolidated from, nearest first
+FINER = {
+    "daily": ("minute", "second", "tick"),
+    "hour": ("minute", "second", "tick"),
+    "minute": ("second", "tick"),
+    "second": ("tick",),
+}
+
+DataRequest = namedtuple("DataRequest", "kind ticker resolution start end required")
+StandIn = namedtuple("StandIn", "ticker resolution")
+Gap = namedtuple("Gap", "request status expected missing first_missing last_missing stand_in")
+
+
+def _dated_names(folder):
+    """Sorted distinct days of the files in a folder named ``YYYYMMDD...``."""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return np.empty(0, dtype="datetime64[D]")
+    stamps = sorted({name[:8] for name in names if name[:8].isdigit()})
+    return np.array([f"{stamp[:4]}-{stamp[4:6]}-{stamp[6:]}" for stamp in stamps], dtype="datetime64[D]")
+
+
+def _names(folder, suffix):
+    try:
+        return {name[: -len(suffix)] for name in os.listdir(folder) if name.endswith(suffix)}
+    except OSError:
+        return set()
+
+
+class DataIndex:
+    """What the local data tree holds, from one scan of its folders."""
+
+    def __init__(self, data_folder=None, cache_folder=None):
+        self.data_folder = data_folder or DATA_FOLDER
+        self.cache_folder = cache_folder
+        root = os.path.join(self.data_folder, "equity", "usa")
+        self.zips = {resolution: _names(os.path.join(root, resolution), ".zip") for resolution in WHOLE_HISTORY_RESOLUTIONS}
+        self.intraday = {}
+        for resolution in INTRADAY_RESOLUTIONS:
+            folder = os.path.join(root, resolution)
+            tickers = os.listdir(folder) if os.path.isdir(folder) else []
+            self.intraday[resolution] = {ticker: _dated_names(os.path.join(folder, ticker)) for ticker in tickers}
+        option_folder = os.path.join(self.data_folder, "option", "usa", "minute")
+        self.options = {
+            ticker: _dated_names(os.path.join(option_folder, ticker))
+            for ticker in (os.listdir(option_folder) if os.path.isdir(option_folder) else [])
+        }
+        self.factor_files = _names(os.path.join(root, "factor_files"), ".csv")
+        self.map_files = _names(os.path.join(root, "map_files"), ".csv")
+        self.coarse_days = _dated_names(os.path.join(root, "fundamental", "coarse"))
+        self._days = {}
+
+    def days(self, kind, ticker, resolution):
+        """Days with local data for one series (empty when there is none)."""
+        ticker = ticker.lower()
+        if kind == "coarse":
+            return self.coarse_days
+        if kind == "option":
+            return self.options.get(ticker, np.empty(0, dtype="datetime64[D]"))
+        if resolution in INTRADAY_RESOLUTIONS:
+            return self.intraday[resolution].get(ticker, np.empty(0, dtype="datetime64[D]"))
+        key = (ticker, resolution)
+        if key not in self._days:
+            days = np.empty(0, dtype="datetime64[D]")
+            if ticker in self.zips.get(resolution, ()):
+                series = open_series(ticker, resolution, "trade", self.data_folder, self.cache_folder)
+                if series is not None:
+                    days = series.days.astype("datetime64[D]")
+            self._days[key] = days
+        return self._days[key]
+
+    def has_file(self, kind, ticker):
+        if kind == "factor":
+            return ticker.lower() in self.factor_files
+        if kind == "map":
+            return ticker.lower() in self.map_files
+        if kind == "interest-rate":
+            return os.path.isfile(os.path.join(self.data_folder, "alternative", "interest-rate", "usa", "interest-rate.csv"))
+        raise ValueError(f"Unknown file kind {kind!r}")
+
+
+def data_requests(source, start=None, end=None):
+    """Every data request the algorithm in ``source`` makes, derived statically."""
+    parameters = extract_parameters(source)
+    found = extract_subscriptions(source)
+    start = np.datetime64(start or parameters.get("start_date", "1998-01-01"), "D")
+    # LEAN runs to the current day without SetEndDate
+    end = np.datetime64(end or parameters.get("end_date", date.today().isoformat()), "D")
+    first = start - np.timedelta64(found["warmup_days"], "D")
+
+    requests = []
+    equities = []
+    for subscription in found["subscriptions"]:
+        kind = "option" if subscription.security_type == "option" else "bars"
+        requests.append(DataRequest(kind, subscription.ticker, subscription.resolution, first, end, True))
+        if subscription.security_type == "equity":
+            equities.append(subscription.ticker)
+    if found["universe"]:
+        requests.append(DataRequest("coarse", "coarse", "daily", first, end, True))
+    benchmark = found["benchmark"] or BENCHMARK
+    requests.append(DataRequest("bars", benchmark, BENCHMARK_RESOLUTION, first, end, False))
+    for ticker in dict.fromkeys(equities + [benchmark]):
+        requests.append(DataRequest("factor", ticker, None, None, None, False))
+        requests.append(DataRequest("map", ticker, None, None, None, False))
+    requests.append(DataRequest("interest-rate", "usa", None, None, None, False))
+    return requests
+
+
+def _missing(expected, days):
+    return expected[~np.isin(expected, days)]
+
+
+def check(requests, index, calendar=None, substitutes=None):
+    """One Gap per request; stand-ins are tried for bar series with missing days."""
+    calendar = calendar or MarketCalendar.load()
+    substitutes = {ticker.upper(): value.upper() for ticker, value in (substitutes or {}).items()}
+    gaps = []
+    for request in requests:
+        if request.start is None:
+            present = index.has_file(request.kind, request.ticker)
+            gaps.append(Gap(request, "ok" if present else "missing", 1, 0 if present else 1, None, None, None))
+            continue
+        expected = calendar.trading_days(request.start, request.end)
+        missing = _missing(expected, index.days(request.kind, request.ticker, request.resolution))
+        status = "ok" if not len(missing) else "missing" if len(missing) == len(expected) else "partial"
+
+        stand_in = None
+        if len(missing) and request.kind == "bars":
+            candidates = [StandIn(request.ticker, finer) for finer in FINER.get(request.resolution, ())]
+            if request.ticker.upper() in substitutes:
+                candidates.insert(0, StandIn(substitutes[request.ticker.upper()], request.resolution))
+            for candidate in candidates:
+                remaining = _missing(missing, index.days("bars", candidate.ticker, candidate.resolution))
+                if len(remaining) < len(missing):
+                    stand_in = candidate
+                    missing = remaining
+                    status = "stand-in" if not len(missing) else "partial"
+                    break
+        gaps.append(Gap(
+            request, status, len(expected), len(missing),
+            missing[0] if len(missing) else None, missing[-1] if len(missing) else None, stand_in,
+        ))
+    return gaps
+
+
+def blocking(gaps):
+    """Required requests still missing days after stand-ins."""
+    return [gap for gap in gaps if gap.request.required and gap.missing]
+
+
+def stand_ins(gaps):
+    """{ticker: StandIn} for the bar series that resolved to a stand-in."""
+    return {gap.request.ticker: gap.stand_in for gap in gaps if gap.stand_in is not None}
+
+
+def format_report(gaps):
+    lines = [f"{'kind':<14}{'symbol':<8}{'resolution':<11}{'status':<10}{'missing':>13}  detail"]
+    for gap in gaps:
+        request = gap.request
+        detail = []
+        if gap.first_missing is not None:
+            detail.append(f"{gap.first_missing} .. {gap.last_missing}")
+        if gap.stand_in is not None:
+            detail.append(f"stand-in {gap.stand_in.ticker} {gap.stand_in.resolution}")
+        if not request.required:
+            detail.append("optional")
+        lines.append(
+            f"{request.kind:<14}{request.ticker:<8}{request.resolution or '-':<11}{gap.status:<10}"
+            f"{f'{gap.missing}/{gap.expected}':>13}  {', '.join(detail)}"
+        )
+    return "\n".join(lines)
+
+
+def parse_substitutes(values):
+    """``["MSFT=SPY", ...]`` into {"MSFT": "SPY"}."""
+    substitutes = {}
+    for value in values or ():
+        ticker, _, stand_in = value.partition("=")
+        if not stand_in:
+            raise ValueError(f"Expected TICKER=STAND_IN, got {value!r}")
+        substitutes[ticker.strip().upper()] = stand_in.strip().upper()
+    return substitutes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check every data request of an algorithm against the local data tree.")
+    parser.add_argument("algorithm", nargs="?", default=os.path.join(os.path.dirname(__file__), "..", "main.py"))
+    parser.add_argument("--start", help="override the algorithm's start date")
+    parser.add_argument("--end", help="override the algorithm's end date")
+    parser.add_argument("--substitute", action="append", metavar="TICKER=STAND_IN", help="read STAND_IN for TICKER")
+    parser.add_argument("--strict", action="store_true", help="exit non-zero while required data has gaps")
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    with open(args.algorithm) as handle:
+        requests = data_requests(handle.read(), args.start, args.end)
+    gaps = check(requests, DataIndex(args.data_folder), substitutes=parse_substitutes(args.substitute))
+    print(format_report(gaps))
+    unresolved = blocking(gaps)
+    if unresolved:
+        tickers = ", ".join(sorted({gap.request.ticker for gap in unresolved}))
+        print(f"{len(unresolved)} required series have gaps: {tickers}")
+        if args.strict:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
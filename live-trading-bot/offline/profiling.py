@@ -0,0 +1,261 @@
+"""Per-callback timing of the algorithm: histograms, flame graph and summary table.
+
+``Profiler.instrument(algorithm, "RebalancePortfolio", "MarketOrder", ...)``
+replaces each named method on the algorithm instance with a timed wrapper
+(scheduled events must be instrumented before ``Schedule.On`` captures
+them). Lean binds event handlers such as ``OnData`` when it constructs the
+algorithm, before ``Initialize``, so an instance wrapper would never be
+called; those handlers delegate to a method wrapped with ``wrap`` instead.
+Instrument either ``Log`` or a logger built on it, not both, or every line
+is counted twice. Every call records wall time into a per-callback log2 histogram
+(bucket ``b`` holds calls of [2**(b-1), 2**b) ns), the call count, the bytes
+logged while it was the innermost callback and, with ``allocations``, the
+peak traced memory it allocated (``tracemalloc``, which slows everything
+down while on). Nested calls (``MarketOrder`` inside ``Rebalance``)
+are kept as call stacks with their self time for a flame graph.
+
+A disabled profiler instruments nothing, so the switched-off cost is zero.
+
+At the end of a run ``emit`` writes the collected data as ``PROFILE`` lines
+to the algorithm log, and ``python -m offline.profiling <backtest folder>``
+turns them into ``<id>-profile.txt`` (summary table) and
+``<id>-profile.folded`` (collapsed stacks for flamegraph.pl / speedscope)
+next to the run's ``-summary.json``. Local runs can call ``write`` directly.
+"""
+import argparse
+import functools
+import glob
+import json
+import os
+import time as timer
+import tracemalloc
+
+HISTOGRAM_BUCKETS = 64
+PROFILE_PREFIX = "PROFILE "
+FOLDED_PREFIX = "PROFILE-FOLDED "
+
+
+class CallbackStats:
+    """Counters of one callback."""
+
+    __slots__ = ("name", "count", "total_ns", "max_ns", "histogram", "allocated", "log_bytes")
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.allocated = 0
+        self.log_bytes = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "count": self.count,
+            "total_ns": self.total_ns,
+            "max_ns": self.max_ns,
+            "histogram": {bucket: count for bucket, count in enumerate(self.histogram) if count},
+            "allocated": self.allocated,
+            "log_bytes": self.log_bytes,
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        stats = cls(values["name"])
+        for name in ("count", "total_ns", "max_ns", "allocated", "log_bytes"):
+            setattr(stats, name, values[name])
+        for bucket, count in values["histogram"].items():
+            stats.histogram[int(bucket)] = count
+        return stats
+
+    def quantile(self, level):
+        """Upper bound in ns of the histogram bucket holding the ``level`` quantile."""
+        if not self.count:
+            return 0
+        wanted = level * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= wanted:
+                return min(1 << bucket, self.max_ns)
+        return self.max_ns
+
+
+class Profiler:
+    """Timed wrappers for algorithm callbacks, collecting CallbackStats and call stacks."""
+
+    def __init__(self, enabled=True, allocations=False, clock=timer.perf_counter_ns):
+        self.enabled = enabled
+        self.allocations = allocations and enabled
+        self.clock = clock
+        self.stats = {}
+        self.folded = {}
+        self.originals = {}
+        self._stack = []
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stats(self, name):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = CallbackStats(name)
+        return stats
+
+    def wrap(self, name, function):
+        """A timed version of ``function`` (``function`` itself when disabled)."""
+        if not self.enabled:
+            return function
+        stats = self._stats(name)
+        stack = self._stack
+        folded = self.folded
+        clock = self.clock
+        allocations = self.allocations
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            # Frame: [name, time spent in nested callbacks]
+            frame = [name, 0]
+            stack.append(frame)
+            if allocations:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - started
+                if allocations:
+                    stats.allocated += max(tracemalloc.get_traced_memory()[1] - before, 0)
+                path = tuple(entry[0] for entry in stack)
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                folded[path] = folded.get(path, 0) + elapsed - frame[1]
+                stats.count += 1
+                stats.total_ns += elapsed
+                if elapsed > stats.max_ns:
+                    stats.max_ns = elapsed
+                stats.histogram[min(elapsed.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+        return timed
+
+    def wrap_log(self, name, log):
+        """A timed log function that also charges the message bytes to the calling callback."""
+        if not self.enabled:
+            return log
+        timed = self.wrap(name, log)
+        stats = self._stats(name)
+        stack = self._stack
+
+        @functools.wraps(log)
+        def counted(message, *args, **kwargs):
+            size = len(str(message).encode())
+            stats.log_bytes += size
+            if stack:
+                self.stats[stack[-1][0]].log_bytes += size
+            return timed(message, *args, **kwargs)
+
+        return counted
+
+    def instrument(self, target, *names, logs=("Log", "Debug")):
+        """Replace the named methods of ``target`` with timed wrappers; no-op when disabled."""
+        if not self.enabled:
+            return
+        for name in names:
+            original = getattr(target, name)
+            self.originals[name] = original
+            wrapper = self.wrap_log(name, original) if name in logs else self.wrap(name, original)
+            setattr(target, name, wrapper)
+
+    def folded_lines(self):
+        """Collapsed stacks with self time in microseconds, as flamegraph.pl reads them."""
+        return [f"{';'.join(path)} {max(total // 1000, 1)}" for path, total in sorted(self.folded.items())]
+
+    def emit(self, log=None):
+        """Write the profile as PROFILE lines through the (uninstrumented) log."""
+        log = log or self.originals.get("Log")
+        if log is None or not self.enabled:
+            return
+        for stats in sorted(self.stats.values(), key=lambda stats: -stats.total_ns):
+            log(PROFILE_PREFIX + json.dumps(stats.to_dict(), separators=(",", ":")))
+        for line in self.folded_lines():
+            log(FOLDED_PREFIX + line)
+
+    def write(self, prefix):
+        """Write ``<prefix>-profile.txt`` and ``<prefix>-profile.folded``."""
+        return write_profile(prefix, self.stats.values(), self.folded_lines())
+
+
+def format_table(stats, folded_lines=()):
+    """Summary table of CallbackStats, slowest total first.
+
+    Shares are of the total profiled time: the sum of the self times in
+    ``folded_lines`` (so nested calls are not counted twice), or the largest
+    callback total without them.
+    """
+    stats = sorted(stats, key=lambda entry: -entry.total_ns)
+    self_us = sum(int(line.rsplit(" ", 1)[1]) for line in folded_lines)
+    grand_total = self_us * 1000 or max((entry.total_ns for entry in stats), default=0) or 1
+    lines = [
+        f"{'callback':<24}{'calls':>9}{'total ms':>11}{'share':>8}{'mean us':>10}{'p50 us':>9}"
+        f"{'p99 us':>9}{'max us':>10}{'alloc KB':>10}{'log KB':>9}"
+    ]
+    for entry in stats:
+        mean = entry.total_ns / entry.count / 1000 if entry.count else 0.0
+        lines.append(
+            f"{entry.name:<24}{entry.count:>9}{entry.total_ns / 1e6:>11.2f}{entry.total_ns / grand_total:>8.1%}"
+            f"{mean:>10.1f}{entry.quantile(0.5) / 1000:>9.1f}{entry.quantile(0.99) / 1000:>9.1f}"
+            f"{entry.max_ns / 1000:>10.1f}{entry.allocated / 1024:>10.1f}{entry.log_bytes / 1024:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def write_profile(prefix, stats, folded_lines):
+    table_path = f"{prefix}-profile.txt"
+    folded_path = f"{prefix}-profile.folded"
+    with open(table_path, "w") as handle:
+        handle.write(format_table(stats, folded_lines) + "\n")
+    with open(folded_path, "w") as handle:
+        handle.write("".join(line + "\n" for line in folded_lines))
+    return table_path, folded_path
+
+
+def parse_log(lines):
+    """CallbackStats and folded lines from the PROFILE lines of a Lean log."""
+    stats = []
+    folded = []
+    for line in lines:
+        position = line.find(PROFILE_PREFIX)
+        if position >= 0:
+            stats.append(CallbackStats.from_dict(json.loads(line[position + len(PROFILE_PREFIX):])))
+            continue
+        position = line.find(FOLDED_PREFIX)
+        if position >= 0:
+            folded.append(line[position + len(FOLDED_PREFIX):].rstrip("\n"))
+    return stats, folded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the profile of a backtest next to its -summary.json.")
+    parser.add_argument("folder", help="backtests/<timestamp> folder of a run with profiling enabled")
+    args = parser.parse_args()
+
+    summaries = glob.glob(os.path.join(args.folder, "*-summary.json"))
+    if not summaries:
+        raise SystemExit(f"No -summary.json in {args.folder}")
+    prefix = summaries[0][: -len("-summary.json")]
+    log_path = prefix + "-log.txt"
+    if not os.path.exists(log_path):
+        log_path = os.path.join(args.folder, "log.txt")
+    with open(log_path, errors="replace") as handle:
+        stats, folded = parse_log(handle)
+    if not stats:
+        raise SystemExit(f"No PROFILE lines in {log_path}; set profile = True in Initialize")
+    for path in write_profile(prefix, stats, folded):
+        print(f"Wrote {path}")
+    print(format_table(stats, folded))
+
+
+if __name__ == "__main__":
+    main()
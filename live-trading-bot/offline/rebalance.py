@@ -0,0 +1,110 @@
+"""Batched rebalance: every target weight solved at once, sells before buys.
+
+Calling ``SetHoldings`` once per ticker re-evaluates the portfolio on every
+call and submits the orders in dict order, so a buy can go out before the
+sell that frees its cash. ``plan_rebalance`` instead sizes all trades from
+one snapshot of holdings and prices, the way ``SetHoldings`` sizes a single
+one:
+
+* the target value is ``weight * total value`` less Lean's free-portfolio
+  buffer, and a buy keeps back the fee its order would pay;
+* quantities round toward zero to whole lots;
+* orders whose margin is below Lean's minimum share of the portfolio are
+  dropped (see ``minimum_order_margin``), and so are names whose weight is within ``band`` of the target
+  (the no-trade band; names with a zero target are always sold);
+* buys are scaled down when they would need more than the cash plus the
+  proceeds of the sells.
+
+The plan lists the sells first so they can be submitted ahead of the buys.
+Everything is a vector operation over the names, five or several thousand.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from offline.fills import order_fees
+
+# Lean SetHoldings keeps this share of the portfolio free as a buffer for fees
+FREE_PORTFOLIO_VALUE_PERCENTAGE = 0.0025
+# Orders whose margin is below this share of the portfolio are ignored by SetHoldings
+MINIMUM_ORDER_MARGIN_PERCENTAGE = 0.001
+# Default margin account leverage for US equities
+EQUITY_LEVERAGE = 2.0
+
+RebalancePlan = namedtuple("RebalancePlan", "columns quantity fee")
+
+
+def minimum_order_margin(universe_size=0):
+    """Minimum order margin share for a strategy trading ``universe_size`` coarse names (0 outside universe mode).
+
+    Equal universe weights of ``universe_weight / N`` fall under Lean's minimum
+    for a few hundred names, which would drop every order, so universe mode
+    keeps orders of any size. ``main.py`` and ``offline.universe`` both use this.
+    """
+    return 0.0 if universe_size > 0 else MINIMUM_ORDER_MARGIN_PERCENTAGE
+
+
+def round_lots(quantities, lots=None):
+    """Quantities rounded toward zero to whole lots (lot 1 where ``lots`` is missing)."""
+    quantities = np.asarray(quantities, dtype=np.float64)
+    if lots is None:
+        lots = 1.0
+    lots = np.nan_to_num(np.asarray(lots, dtype=np.float64), nan=1.0)
+    lots = np.where(lots > 0, lots, 1.0)
+    # The epsilon keeps 0.3 / 0.1 lots from truncating to 2
+    return np.trunc(quantities / lots + np.copysign(1e-9, quantities)) * lots
+
+
+def plan_rebalance(quantity, prices, weights, cash, lots=None, band=0.0, pending=None, fees=order_fees,
+                   minimum_margin=MINIMUM_ORDER_MARGIN_PERCENTAGE, total_value=None):
+    """Trades that bring every priced name to its weight, sells first.
+
+    ``quantity`` are the holdings, ``pending`` the quantities of open orders
+    (targets net them out like Lean does) and ``prices`` the marks; names
+    without a positive price are left alone. ``minimum_margin`` of 0 keeps
+    orders of any size. ``total_value`` is the value the weights apply to,
+    Lean's TotalPortfolioValue; pass it when holdings outside the plan exist,
+    otherwise it is the cash plus the names given.
+    """
+    quantity = np.asarray(quantity, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    priced = prices > 0
+    prices = np.where(priced, prices, 0.0)
+    if total_value is None:
+        total_value = cash + float(quantity @ prices)
+    committed = quantity if pending is None else quantity + pending
+
+    target_value = weights * total_value * (1 - FREE_PORTFOLIO_VALUE_PERCENTAGE)
+    safe_prices = np.where(priced, prices, 1.0)
+    estimate = round_lots((target_value - committed * prices) / safe_prices, lots)
+    fee_buffer = np.where(estimate > 0, fees(estimate, prices), 0.0)
+    delta = np.where(priced, round_lots((target_value - fee_buffer) / safe_prices, lots) - committed, 0.0)
+
+    trade = delta != 0
+    trade &= np.abs(delta * prices) / EQUITY_LEVERAGE >= minimum_margin * total_value
+    if band > 0 and total_value > 0:
+        drift = np.abs(committed * prices / total_value - weights)
+        trade &= (drift > band) | (weights == 0)
+    delta = np.where(trade, delta, 0.0)
+
+    sells = np.flatnonzero(delta < 0)
+    buys = np.flatnonzero(delta > 0)
+    sell_fees = fees(delta[sells], prices[sells])
+    available = cash - float(delta[sells] @ prices[sells]) - float(sell_fees.sum())
+    bought = delta[buys]
+    buy_lots = None if lots is None else np.broadcast_to(lots, delta.shape)[buys]
+    # Two passes: the $1 minimum fees make the first scaling slightly short
+    for _ in range(2):
+        buy_fees = fees(bought, prices[buys])
+        need = float(bought @ prices[buys]) + float(buy_fees.sum())
+        if need <= available or need <= 0:
+            break
+        bought = round_lots(bought * max(available, 0.0) / need, buy_lots)
+    keep = bought > 0
+    buys, bought = buys[keep], bought[keep]
+    return RebalancePlan(
+        np.concatenate([sells, buys]),
+        np.concatenate([delta[sells], bought]),
+        np.concatenate([sell_fees, fees(bought, prices[buys])]),
+    )
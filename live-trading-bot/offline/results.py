@@ -0,0 +1,226 @@
+"""Streaming access to Lean backtest result JSON files.
+
+A result file (``backtests/<timestamp>/<id>.json``) is memory-mapped and its
+structure is located without building Python objects for the rest of the
+document: a NumPy bracket-depth profile finds where each large section ends,
+and regular expressions step over keys, strings and small values. Only the
+requested slice is handed to ``json.loads``.
+
+The byte offsets of every top-level key and every chart are kept in a sidecar
+``<id>.json.index`` file; later queries seek straight to the section they need.
+The sidecar is ignored when the result file's size or mtime changes.
+"""
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+INDEX_SUFFIX = ".index"
+INDEX_VERSION = 1
+
+_STRUCTURE = re.compile(rb'["{}\[\]]')
+_STRING_BODY = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+_SCALAR_END = re.compile(rb"[,}\]\s]")
+
+
+def _skip_whitespace(buffer, position):
+    return _WHITESPACE.match(buffer, position).end()
+
+
+def _string_end(buffer, position):
+    """End offset of the string whose opening quote is at ``position``."""
+    return _STRING_BODY.match(buffer, position + 1).end()
+
+
+def depth_profile(buffer):
+    """Bracket nesting depth after every byte, ignoring brackets inside strings."""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    quotes = np.flatnonzero(data == ord('"'))
+    escaped = np.zeros(len(quotes), dtype=bool)
+    for index in np.flatnonzero(data[np.maximum(quotes - 1, 0)] == ord("\\")):
+        run = 0
+        while data[quotes[index] - 1 - run] == ord("\\"):
+            run += 1
+        escaped[index] = run % 2 == 1
+    toggles = np.zeros(len(data), dtype=np.int8)
+    toggles[quotes[~escaped]] = 1
+    in_string = np.cumsum(toggles, dtype=np.int64) % 2 == 1
+
+    steps = np.zeros(len(data), dtype=np.int32)
+    steps[(data == ord("{")) | (data == ord("["))] = 1
+    steps[(data == ord("}")) | (data == ord("]"))] = -1
+    steps[in_string] = 0
+    return np.cumsum(steps, dtype=np.int32)
+
+
+def _value_end(buffer, position, depth=None):
+    """End offset of the JSON value starting at ``position``.
+
+    With a ``depth`` profile the end of an object or array is found by one
+    vectorized search instead of walking its brackets.
+    """
+    opening = buffer[position:position + 1]
+    if opening == b'"':
+        return _string_end(buffer, position)
+    if opening not in (b"{", b"["):
+        match = _SCALAR_END.search(buffer, position)
+        return match.start() if match else len(buffer)
+    if depth is not None:
+        closing = np.argmax(depth[position:] < depth[position])
+        return position + int(closing) + 1
+    depth = 0
+    cursor = position
+    while True:
+        match = _STRUCTURE.search(buffer, cursor)
+        if match is None:
+            raise ValueError(f"Unterminated JSON value at offset {position}")
+        token = match.group()
+        if token == b'"':
+            cursor = _string_end(buffer, match.start())
+            continue
+        cursor = match.end()
+        depth += 1 if token in (b"{", b"[") else -1
+        if depth == 0:
+            return cursor
+
+
+def iter_members(buffer, position, depth=None):
+    """Yield (key, value_start, value_end) for the object opening at ``position``."""
+    cursor = _skip_whitespace(buffer, position + 1)
+    if buffer[cursor:cursor + 1] == b"}":
+        return
+    while True:
+        key_end = _string_end(buffer, cursor)
+        key = json.loads(buffer[cursor:key_end])
+        cursor = _skip_whitespace(buffer, key_end)
+        cursor = _skip_whitespace(buffer, cursor + 1)  # the colon
+        end = _value_end(buffer, cursor, depth)
+        yield key, cursor, end
+        cursor = _skip_whitespace(buffer, end)
+        if buffer[cursor:cursor + 1] != b",":
+            return
+        cursor = _skip_whitespace(buffer, cursor + 1)
+
+
+def iter_items(buffer, position):
+    """Yield (value_start, value_end) for the array opening at ``position``."""
+    cursor = _skip_whitespace(buffer, position + 1)
+    if buffer[cursor:cursor + 1] == b"]":
+        return
+    while True:
+        end = _value_end(buffer, cursor)
+        yield cursor, end
+        cursor = _skip_whitespace(buffer, end)
+        if buffer[cursor:cursor + 1] != b",":
+            return
+        cursor = _skip_whitespace(buffer, cursor + 1)
+
+
+class ResultFile:
+    """Lazy reader of one backtest result JSON."""
+
+    def __init__(self, path, use_index=True):
+        self.path = path
+        self.use_index = use_index
+        self._handle = open(path, "rb")
+        self._buffer = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = None
+
+    def close(self):
+        self._buffer.close()
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def index(self):
+        """{"sections": {key: [start, end]}, "charts": {name: [start, end]}}."""
+        if self._index is None:
+            self._index = self._read_index() if self.use_index else None
+            if self._index is None:
+                self._index = self._build_index()
+                if self.use_index:
+                    self._write_index()
+        return self._index
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _read_index(self):
+        try:
+            with open(self.path + INDEX_SUFFIX) as handle:
+                index = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != INDEX_VERSION or index.get("source") != self._stat():
+            return None
+        return index
+
+    def _write_index(self):
+        try:
+            with open(self.path + INDEX_SUFFIX, "w") as handle:
+                json.dump(self._index, handle)
+        except OSError:
+            pass
+
+    def _build_index(self):
+        buffer = self._buffer
+        depth = depth_profile(buffer)
+        start = _skip_whitespace(buffer, 0)
+        sections = {key: [begin, end] for key, begin, end in iter_members(buffer, start, depth)}
+        charts = {}
+        if "charts" in sections:
+            charts = {name: [begin, end] for name, begin, end in iter_members(buffer, sections["charts"][0], depth)}
+        return {"version": INDEX_VERSION, "source": self._stat(), "sections": sections, "charts": charts}
+
+    def _load(self, span):
+        return json.loads(self._buffer[span[0]:span[1]])
+
+    def keys(self):
+        return list(self.index["sections"])
+
+    def section(self, key, default=None):
+        """Parse one top-level key such as "statistics" or "totalPerformance"."""
+        span = self.index["sections"].get(key)
+        return default if span is None else self._load(span)
+
+    def chart_names(self):
+        return list(self.index["charts"])
+
+    def chart(self, name):
+        """Parse one chart, e.g. chart("Strategy Equity")."""
+        span = self.index["charts"].get(name)
+        if span is None:
+            raise KeyError(f"No chart named {name!r} in {self.path}")
+        return self._load(span)
+
+    def series(self, chart, name):
+        """Values of one chart series, e.g. series("Strategy Equity", "Equity")."""
+        return self.chart(chart)["series"][name]["values"]
+
+    def iter_orders(self):
+        """Yield the entries of the "orders" section one at a time."""
+        span = self.index["sections"].get("orders")
+        if span is None or self._buffer[span[0]:span[0] + 1] != b"{":
+            return
+        for _, begin, end in iter_members(self._buffer, span[0]):
+            yield json.loads(self._buffer[begin:end])
+
+
+def iter_order_events(path):
+    """Yield the events of an ``-order-events.json`` file one at a time."""
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = _skip_whitespace(buffer, 0)
+            for begin, end in iter_items(buffer, start):
+                yield json.loads(buffer[begin:end])
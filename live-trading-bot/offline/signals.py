@@ -0,0 +1,56 @@
+"""Batched DRIP / DCA / covered-call / protective-put checks of BuffettStrategy.
+
+``evaluate`` takes one slice worth of per-symbol arrays and returns every
+order intent and signal for that slice in a single pass, so the cost per bar
+is a few array operations whatever the number of symbols. Both main.py's
+``OnData`` and the offline replay call it, which keeps the two in lockstep.
+
+The checks run in the order ``OnData`` always used:
+
+* DRIP buys ``trunc(dividend * shares / price)`` shares and resets the last
+  purchase price, so a reinvested symbol is not also DCA'd on the same bar.
+* DCA buys ``max(1, trunc(shares * dca_fraction))`` shares when the close is
+  more than ``dca_threshold`` below the last purchase price.
+* Covered-call and protective-put signals compare against the last purchase
+  price as it was before the DCA reset.
+
+Symbols never bought have a NaN last purchase price, which fails every
+comparison.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Intents = namedtuple("Intents", "drip dividend_cash dca covered_call protective_put last_purchase_price")
+
+
+def evaluate(prices, has_bar, last_purchase_price, quantity, dividends, dca_threshold=0.05,
+             call_threshold=0.10, put_threshold=0.10, dca_fraction=0.10):
+    """Order intents of one slice.
+
+    ``prices``, ``last_purchase_price``, ``quantity`` and ``dividends`` (per
+    share distribution, 0 when none) are float arrays over the symbols and
+    ``has_bar`` flags symbols with a bar in the slice. ``drip`` and ``dca``
+    in the result are share counts (0 for no order); the input arrays are
+    not modified.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    quantity = np.asarray(quantity, dtype=np.float64)
+    has_bar = np.asarray(has_bar, dtype=bool)
+    last_purchase_price = np.array(last_purchase_price, dtype=np.float64)
+
+    dividend_cash = np.asarray(dividends, dtype=np.float64) * quantity
+    paid = (dividend_cash > 0) & (prices > 0)
+    drip = np.zeros(len(prices))
+    drip[paid] = np.trunc(dividend_cash[paid] / prices[paid])
+    dividend_cash = np.where(dividend_cash > 0, dividend_cash, 0.0)
+    last_purchase_price[drip > 0] = prices[drip > 0]
+
+    # NaN comparisons are False, so symbols without a purchase drop out here
+    dca_flags = has_bar & (prices < last_purchase_price * (1 - dca_threshold))
+    covered_call = has_bar & (prices > last_purchase_price * (1 + call_threshold))
+    protective_put = has_bar & (prices < last_purchase_price * (1 - put_threshold))
+    dca = np.where(dca_flags, np.maximum(1, np.trunc(quantity * dca_fraction)), 0.0)
+    last_purchase_price[dca_flags] = prices[dca_flags]
+
+    return Intents(drip, dividend_cash, dca, covered_call, protective_put, last_purchase_price)
@@ -0,0 +1,229 @@
+"""Static inspection of algorithm source files (main.py) without running Lean."""
+import ast
+import hashlib
+import os
+from collections import namedtuple
+
+INITIALIZE_NAMES = ("Initialize", "initialize")
+# Lean subscribes at minute resolution unless told otherwise
+DEFAULT_RESOLUTION = "minute"
+
+Subscription = namedtuple("Subscription", "security_type ticker resolution")
+
+
+def find_initialize(tree):
+    """Return the first Initialize/initialize method defined in a module AST."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name in INITIALIZE_NAMES:
+            return node
+    return None
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def _call_name(node):
+    func = node.func
+    return func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+
+
+def extract_parameters(source):
+    """Collect literal ``self.<name> = ...`` settings and dates/cash from Initialize.
+
+    Numbers, strings and booleans are returned as-is; dicts of literals (the
+    target allocation) are flattened into ``<name>:<key>`` entries.
+    """
+    tree = ast.parse(source)
+    initialize = find_initialize(tree)
+    if initialize is None:
+        return {}
+
+    parameters = {}
+    for node in ast.walk(initialize):
+        if isinstance(node, ast.Assign):
+            value = _literal(node.value)
+            for target in node.targets:
+                if not (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self"):
+                    continue
+                if isinstance(value, (bool, int, float, str)):
+                    parameters[target.attr] = value
+                elif isinstance(value, dict) and value:
+                    for key, item in value.items():
+                        if isinstance(item, (bool, int, float, str)):
+                            parameters[f"{target.attr}:{key}"] = item
+        elif isinstance(node, ast.Call):
+            name = (_call_name(node) or "").lower().replace("_", "")
+            arguments = [_literal(argument) for argument in node.args]
+            if name in ("setstartdate", "setenddate") and len(arguments) == 3 and all(isinstance(a, int) for a in arguments):
+                year, month, day = arguments
+                parameters["start_date" if name == "setstartdate" else "end_date"] = f"{year:04d}-{month:02d}-{day:02d}"
+            elif name == "setcash" and arguments and isinstance(arguments[0], (int, float)):
+                parameters["cash"] = arguments[0]
+    return parameters
+
+
+def _self_attributes(initialize):
+    """Literal values (lists and dicts included) first assigned to ``self.<name>``.
+
+    Later reassignments usually sit in a branch (e.g. clearing the symbol list
+    in universe mode), so the first literal wins.
+    """
+    attributes = {}
+    for node in ast.walk(initialize):
+        if isinstance(node, ast.Assign):
+            value = _literal(node.value)
+            for target in node.targets:
+                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self":
+                    attributes.setdefault(target.attr, value)
+    return attributes
+
+
+def _value(node, attributes, bindings):
+    """Possible values of an expression: a list, or None when it is not static."""
+    if isinstance(node, ast.Constant):
+        return [node.value]
+    if isinstance(node, ast.Name):
+        return bindings.get(node.id)
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "self":
+        value = attributes.get(node.attr)
+        return None if value is None else [value]
+    return None
+
+
+def _iterated(node, attributes, bindings):
+    """Values a for-loop iterates over (``self.symbols``, ``self.weights.items()``, ...)."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in ("items", "keys", "values"):
+        values = _value(node.func.value, attributes, bindings)
+        if not values or not isinstance(values[0], dict):
+            return None
+        mapping = values[0]
+        return {"items": list(mapping.items()), "keys": list(mapping), "values": list(mapping.values())}[node.func.attr]
+    values = _value(node, attributes, bindings)
+    if values and isinstance(values[0], (list, tuple, dict, set)):
+        return list(values[0])
+    return None
+
+
+def _truth(node, attributes):
+    """Static truth of an if-test over literal attributes; None when unknown."""
+    try:
+        expression = ast.Expression(body=node)
+        names = {}
+        for child in ast.walk(node):
+            if isinstance(child, ast.Attribute) and isinstance(child.value, ast.Name) and child.value.id == "self":
+                if child.attr not in attributes:
+                    return None
+            elif isinstance(child, ast.Call):
+                return None
+        names["self"] = type("StaticSelf", (), attributes)()
+        return bool(eval(compile(ast.fix_missing_locations(expression), "<initialize>", "eval"), {"__builtins__": {}}, names))
+    except Exception:
+        return None
+
+
+def _resolution(call):
+    node = call.args[1] if len(call.args) > 1 else None
+    for keyword in call.keywords:
+        if keyword.arg == "resolution":
+            node = keyword.value
+    if isinstance(node, ast.Attribute):
+        return node.attr.lower()
+    return DEFAULT_RESOLUTION
+
+
+def _warmup_days(call):
+    """Calendar days of a SetWarmUp(timedelta(days=N)) or SetWarmUp(N) call."""
+    if not call.args:
+        return 0
+    argument = call.args[0]
+    if isinstance(argument, ast.Call) and _call_name(argument) == "timedelta":
+        days = 0
+        for keyword in argument.keywords:
+            value = _literal(keyword.value)
+            if isinstance(value, (int, float)):
+                days += value * {"days": 1, "weeks": 7, "hours": 1 / 24}.get(keyword.arg, 0)
+        if argument.args and isinstance(_literal(argument.args[0]), (int, float)):
+            days += _literal(argument.args[0])
+        return int(round(days))
+    value = _literal(argument)
+    # A bar count: assume daily bars, padded for weekends
+    return int(value * 7 / 5) + 1 if isinstance(value, int) else 0
+
+
+def extract_subscriptions(source):
+    """Statically list the data Initialize subscribes to.
+
+    Follows for-loops over literal ``self`` lists/dicts and if-tests that only
+    read literal ``self`` attributes (untestable branches are both taken).
+    Returns {"subscriptions": [Subscription], "warmup_days", "benchmark",
+    "universe"}.
+    """
+    tree = ast.parse(source)
+    initialize = find_initialize(tree)
+    found = {"subscriptions": [], "warmup_days": 0, "benchmark": None, "universe": False}
+    if initialize is None:
+        return found
+    attributes = _self_attributes(initialize)
+
+    def handle(call, bindings):
+        name = (_call_name(call) or "").lower().replace("_", "")
+        if name in ("addequity", "addoption", "addforex", "addcrypto", "addindex", "addfuture") and call.args:
+            tickers = _value(call.args[0], attributes, bindings) or []
+            security_type = name[3:]
+            for ticker in tickers:
+                if isinstance(ticker, str):
+                    found["subscriptions"].append(Subscription(security_type, ticker, _resolution(call)))
+        elif name == "adduniverse":
+            found["universe"] = True
+        elif name == "setwarmup":
+            found["warmup_days"] = _warmup_days(call)
+        elif name == "setbenchmark" and call.args:
+            value = _value(call.args[0], attributes, bindings)
+            found["benchmark"] = value[0] if value and isinstance(value[0], str) else found["benchmark"]
+
+    def visit(statements, bindings):
+        for statement in statements:
+            if isinstance(statement, ast.If):
+                truth = _truth(statement.test, attributes)
+                if truth is not False:
+                    visit(statement.body, bindings)
+                if truth is not True:
+                    visit(statement.orelse, bindings)
+            elif isinstance(statement, ast.For):
+                values = _iterated(statement.iter, attributes, bindings) or []
+                inner = dict(bindings)
+                if isinstance(statement.target, ast.Name):
+                    inner[statement.target.id] = values
+                elif isinstance(statement.target, ast.Tuple) and statement.target.elts:
+                    first = statement.target.elts[0]
+                    if isinstance(first, ast.Name):
+                        inner[first.id] = [value[0] for value in values if isinstance(value, tuple)]
+                visit(statement.body, inner)
+                visit(statement.orelse, bindings)
+            elif isinstance(statement, (ast.With, ast.Try)):
+                visit(statement.body, bindings)
+            else:
+                for node in ast.walk(statement):
+                    if isinstance(node, ast.Call):
+                        handle(node, bindings)
+
+    visit(initialize.body, {})
+    return found
+
+
+def code_hash(folder):
+    """SHA-256 over the relative paths and contents of the .py files in a folder."""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).replace(os.sep, "/").encode())
+            with open(path, "rb") as handle:
+                digest.update(handle.read())
+    return digest.hexdigest()
@@ -0,0 +1,216 @@
+"""Time-ordered replay of many symbols' tick, second or minute archives.
+
+Each stream (ticker, resolution, kind) is a lazy chain of its day files,
+decoded in fixed-size byte chunks by ``consolidate.iter_rows`` and filtered to
+the regular session; only one day file per stream is open at a time. A cursor
+holds the stream's current chunk and has the next one decoding on a
+background thread pool, so decompression and parsing run ahead of the
+consumer while memory stays at two chunks per stream.
+
+``replay`` merges the cursors with a heap keyed by each one's next timestamp
+and yields ``Slice`` batches: every row in [time, time + slice_ms), grouped
+by stream like Lean's Slice groups data by symbol. A slice only touches the
+cursors that have rows in it, at O(log n) each, and windows without data are
+skipped rather than stepped through.
+
+Trade ticks carry ``price`` and ``quantity``, quote ticks ``bid``,
+``bid_size``, ``ask`` and ``ask_size``; second and minute streams carry the
+bar columns. Times are epoch milliseconds in exchange time.
+"""
+import argparse
+import heapq
+import resource
+import time as timer
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from offline.consolidate import CHUNK_BYTES, iter_rows
+from offline.data import intraday_files
+from offline.market_hours import MarketCalendar
+
+Stream = namedtuple("Stream", "ticker resolution kind")
+Slice = namedtuple("Slice", "time end data")
+
+TICK_COLUMNS = {
+    "trade": {"price": "close", "quantity": "volume"},
+    "quote": {"bid": "bid_close", "bid_size": "bid_size", "ask": "ask_close", "ask_size": "ask_size"},
+}
+
+
+def iter_chunks(stream, start=None, end=None, extended_hours=False, data_folder=None, chunk_bytes=CHUNK_BYTES):
+    """Yield (epoch ms, {column: values}) chunks of a stream's day files in time order."""
+    calendar = MarketCalendar.load()
+    for date, path in intraday_files(stream.ticker, stream.resolution, stream.kind, data_folder):
+        day = np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:]}", "D")
+        if (start and day < np.datetime64(start, "D")) or (end and day > np.datetime64(end, "D")):
+            continue
+        if not extended_hours:
+            if not calendar.is_trading_day([day])[0]:
+                continue
+            session_open, session_close = (
+                value.astype("datetime64[ms]").astype(np.int64)
+                for value in (calendar.session_open([day])[0], calendar.session_close([day])[0])
+            )
+        for time, columns in iter_rows(path, date, stream.resolution, stream.kind, chunk_bytes):
+            if not extended_hours:
+                keep = (time >= session_open) & (time < session_close)
+                time = time[keep]
+                columns = {name: values[keep] for name, values in columns.items()}
+            if stream.resolution == "tick":
+                columns = {name: columns[source] for name, source in TICK_COLUMNS[stream.kind].items()}
+            if len(time):
+                yield time, columns
+
+
+class _Cursor:
+    """A stream's current chunk and read position, with the next chunk decoding in the pool."""
+
+    __slots__ = ("stream", "chunks", "pool", "future", "time", "columns", "position")
+
+    def __init__(self, stream, chunks, pool):
+        self.stream = stream
+        self.chunks = chunks
+        self.pool = pool
+        self.time = None
+        self.columns = None
+        self.position = 0
+        self.future = pool.submit(next, chunks, None)
+
+    def advance(self):
+        """Move to the prefetched chunk and start decoding the one after; False at the end."""
+        chunk = self.future.result()
+        if chunk is None:
+            self.time = self.columns = self.future = None
+            return False
+        self.time, self.columns = chunk
+        self.position = 0
+        self.future = self.pool.submit(next, self.chunks, None)
+        return True
+
+    @property
+    def next_time(self):
+        return int(self.time[self.position])
+
+    def take(self, end):
+        """Rows of the current chunk before ``end``, advancing to the next chunk when it runs out."""
+        stop = self.position + int(np.searchsorted(self.time[self.position:], end))
+        rows = slice(self.position, stop)
+        piece = self.time[rows], {name: values[rows] for name, values in self.columns.items()}
+        self.position = stop
+        if stop == len(self.time):
+            self.advance()
+        return piece
+
+    def close(self):
+        # The generator may be running in the pool; let that call finish first
+        if self.future is not None:
+            try:
+                self.future.result()
+            except Exception:
+                pass
+        self.chunks.close()
+
+
+def _join(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    return np.concatenate([time for time, _ in pieces]), {
+        name: np.concatenate([columns[name] for _, columns in pieces]) for name in pieces[0][1]
+    }
+
+
+def replay(streams, start=None, end=None, slice_ms=1000, workers=4, extended_hours=False, data_folder=None,
+           chunk_bytes=CHUNK_BYTES):
+    """Yield Slices of every stream's rows in global time order, ``slice_ms`` wide."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        cursors = [
+            _Cursor(stream, iter_chunks(stream, start, end, extended_hours, data_folder, chunk_bytes), pool)
+            for stream in streams
+        ]
+        try:
+            heap = [(cursor.next_time, index) for index, cursor in enumerate(cursors) if cursor.advance()]
+            heapq.heapify(heap)
+            while heap:
+                window = heap[0][0] // slice_ms * slice_ms
+                stop = window + slice_ms
+                data = {}
+                while heap and heap[0][0] < stop:
+                    _, index = heapq.heappop(heap)
+                    cursor = cursors[index]
+                    pieces = [cursor.take(stop)]
+                    while cursor.time is not None and cursor.next_time < stop:
+                        pieces.append(cursor.take(stop))
+                    data[cursor.stream] = _join(pieces)
+                    if cursor.time is not None:
+                        heapq.heappush(heap, (cursor.next_time, index))
+                yield Slice(window, stop, data)
+        finally:
+            for cursor in cursors:
+                cursor.close()
+
+
+def _last_valid(values, default):
+    valid = np.flatnonzero(~np.isnan(values))
+    return values[valid[-1]] if len(valid) else default
+
+
+def parse_streams(tickers, resolution, kinds):
+    return [Stream(ticker.lower(), resolution, kind) for ticker in tickers for kind in kinds]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay tick/second/minute archives of many symbols in time order.")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--resolution", default="tick", choices=("tick", "second", "minute"))
+    parser.add_argument("--kinds", default="trade,quote", help="comma separated: trade, quote")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--slice-ms", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--extended-hours", action="store_true")
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    streams = parse_streams(args.tickers, args.resolution, args.kinds.split(","))
+    # An OnData-style consumer: last trade, traded volume and best quote per stream
+    last_price = {}
+    volume = {}
+    best = {}
+    rows = slices = 0
+    started = timer.perf_counter()
+    for current in replay(streams, args.start, args.end, args.slice_ms, args.workers, args.extended_hours,
+                          args.data_folder, args.chunk_kb << 10):
+        slices += 1
+        for stream, (time, columns) in current.data.items():
+            rows += len(time)
+            if stream.kind == "trade":
+                prices = columns["price"] if "price" in columns else columns["close"]
+                last_price[stream.ticker] = prices[-1]
+                volume[stream.ticker] = volume.get(stream.ticker, 0.0) + float(
+                    (columns["quantity"] if "quantity" in columns else columns["volume"]).sum()
+                )
+            else:
+                bid, ask = (columns["bid"], columns["ask"]) if "bid" in columns else (columns["bid_close"], columns["ask_close"])
+                # Quote ticks update one side at a time (the other is NaN)
+                previous_bid, previous_ask = best.get(stream.ticker, (np.nan, np.nan))
+                best[stream.ticker] = (_last_valid(bid, previous_bid), _last_valid(ask, previous_ask))
+    elapsed = timer.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{rows} rows of {len(streams)} streams in {slices} slices: {elapsed:.2f} s "
+        f"({rows / max(elapsed, 1e-9) / 1e6:.2f} M rows/s), peak RSS {peak_mb:.0f} MB"
+    )
+    for ticker in sorted(set(last_price) | set(best)):
+        bid, ask = best.get(ticker, (np.nan, np.nan))
+        print(
+            f"   {ticker}: last {last_price.get(ticker, np.nan):.2f}, volume {volume.get(ticker, 0):,.0f}, "
+            f"last spread {ask - bid:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Parallel parameter sweeps of the offline BuffettStrategy replay.
+
+The market is loaded once in the parent process and copied into shared memory
+blocks; pool workers map those blocks as NumPy arrays instead of re-reading the
+zips, so each task only ships a small dict of parameter overrides.
+
+Parameters are the StrategyParams fields (``dca_threshold``, ``call_threshold``,
+``put_threshold``, ``dca_fraction``, ...) plus ``weight:<TICKER>`` entries for
+the target allocation.
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from offline.engine import Market, StrategyParams, load_market, run_backtest
+from offline.metrics import summarize
+
+WEIGHT_PREFIX = "weight:"
+
+_worker_market = None
+_worker_blocks = []
+
+
+def grid(space):
+    """Yield every combination of a {name: [values]} space."""
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_search(space, count, seed=None):
+    """Yield ``count`` samples of a space of (low, high) ranges or value lists."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        sample = {}
+        for name, choices in space.items():
+            if isinstance(choices, tuple) and len(choices) == 2:
+                sample[name] = rng.uniform(*choices)
+            else:
+                sample[name] = rng.choice(list(choices))
+        yield sample
+
+
+def apply_overrides(params, overrides):
+    """Return a copy of params with sweep overrides applied."""
+    fields = {}
+    weights = dict(params.target_allocation)
+    for name, value in overrides.items():
+        if name.startswith(WEIGHT_PREFIX):
+            weights[name[len(WEIGHT_PREFIX):]] = value
+        else:
+            fields[name] = value
+    return replace(params, target_allocation=weights, **fields)
+
+
+def share_market(market):
+    """Copy the market arrays into shared memory and describe how to map them."""
+    blocks = []
+    layout = {}
+    for name in Market._fields:
+        value = getattr(market, name)
+        if name == "symbols":
+            layout[name] = value
+            continue
+        array = np.ascontiguousarray(value)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        layout[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, layout
+
+
+def attach_market(layout):
+    """Map a shared market layout back into a Market of NumPy views."""
+    blocks = []
+    fields = {}
+    for name, spec in layout.items():
+        if name == "symbols":
+            fields[name] = spec
+            continue
+        block_name, shape, dtype = spec
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        fields[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return Market(**fields), blocks
+
+
+def _init_worker(layout):
+    global _worker_market, _worker_blocks
+    _worker_market, _worker_blocks = attach_market(layout)
+
+
+def _run_one(task):
+    index, base, overrides = task
+    result = run_backtest(apply_overrides(base, overrides), _worker_market)
+    return index, overrides, summarize(result)
+
+
+def run_sweep(candidates, base=None, workers=None, output=None, chunksize=16, data_folder=None):
+    """Run every candidate override set and stream one results row per run.
+
+    Rows are appended to ``output`` (CSV) as they complete and also returned,
+    sorted by candidate order.
+    """
+    base = base or StrategyParams()
+    candidates = list(candidates)
+    market = load_market(base.symbols, base.start, base.end, base.warmup_days, data_folder)
+    blocks, layout = share_market(market)
+    names = sorted({name for overrides in candidates for name in overrides})
+
+    rows = []
+    writer = None
+    handle = open(output, "w", newline="") if output else None
+    try:
+        tasks = ((index, base, overrides) for index, overrides in enumerate(candidates))
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(layout,)) as pool:
+            for index, overrides, stats in pool.map(_run_one, tasks, chunksize=chunksize):
+                row = {"run": index, **{name: overrides.get(name) for name in names}, **stats}
+                rows.append(row)
+                if handle:
+                    if writer is None:
+                        writer = csv.DictWriter(handle, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+                    handle.flush()
+    finally:
+        if handle:
+            handle.close()
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return rows
+
+
+def parse_space(specs):
+    """Parse ``name=a,b,c`` (values) or ``name=low:high`` (range) arguments."""
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if ":" in values:
+            low, high = values.split(":")
+            space[name] = (float(low), float(high))
+        else:
+            space[name] = [float(value) for value in values.split(",")]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep BuffettStrategy parameters across local cores.")
+    parser.add_argument("space", nargs="+", help="name=v1,v2,... for grids or name=low:high for random ranges")
+    parser.add_argument("--random", type=int, help="number of random samples instead of a full grid")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--start", default=StrategyParams.start)
+    parser.add_argument("--end")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", default="sweep.csv")
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    space = parse_space(args.space)
+    if args.random:
+        candidates = random_search(space, args.random, args.seed)
+    elif any(isinstance(values, tuple) for values in space.values()):
+        sys.exit("Ranges (low:high) need --random; use comma separated values for a grid")
+    else:
+        candidates = grid(space)
+
+    rows = run_sweep(candidates, StrategyParams(start=args.start, end=args.end), args.workers, args.output, data_folder=args.data_folder)
+    best = max(rows, key=lambda row: row["sharpe"], default=None)
+    print(f"{len(rows)} runs written to {args.output}")
+    if best:
+        print(f"Best Sharpe {best['sharpe']:.3f}: {best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Compiled symbol-properties and security databases with vectorized rounding.
+
+``symbol-properties-database.csv`` is compiled once into a folder of ``.npy``
+arrays under the cache folder and memory-mapped read-only afterwards, so
+sweep workers share the same pages instead of each parsing the CSV into
+dicts of strings:
+
+* ``keys.npy``: fixed-width ``market/type/SYMBOL`` byte keys, sorted, one per
+  row; a lookup is a vectorized ``searchsorted``. Like LEAN, a missing symbol
+  falls back to the market's ``[*]`` row of the same type.
+* numeric columns (contract multiplier, minimum price variation, lot size,
+  minimum order size, price magnifier, strike multiplier) as float64, NaN
+  where the CSV leaves them empty.
+* ``strings.npy``: each distinct text value once; the text columns (market,
+  symbol, type, quote currency, description, market ticker) store int32
+  positions into it.
+
+``security-database.csv`` (security id -> CUSIP, FIGI, SEDOL, ISIN, CIK) is
+compiled alongside it the same way. ``round_orders`` rounds order quantities
+toward zero to whole lots and prices to the nearest tick for many orders at
+once; US equities below $1 tick at $0.0001 like LEAN's equity price variation
+model.
+"""
+import argparse
+import csv
+import os
+import shutil
+import time as timer
+from collections import namedtuple
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER, FORMAT_VERSION, Source, fingerprint, is_fresh, write_manifest
+from offline.data import DATA_FOLDER
+from offline.rebalance import round_lots
+
+PROPERTIES_PATH = os.path.join(DATA_FOLDER, "symbol-properties", "symbol-properties-database.csv")
+SECURITIES_PATH = os.path.join(DATA_FOLDER, "symbol-properties", "security-database.csv")
+TEXT_COLUMNS = ("market", "symbol", "type", "quote_currency", "description", "market_ticker")
+NUMBER_COLUMNS = (
+    "contract_multiplier", "minimum_price_variation", "lot_size", "minimum_order_size", "price_magnifier", "strike_multiplier",
+)
+SECURITY_COLUMNS = ("cusip", "figi", "sedol", "isin", "cik")
+WILDCARD = "[*]"
+SUB_DOLLAR_TICK = 0.0001
+
+Properties = namedtuple("Properties", TEXT_COLUMNS + NUMBER_COLUMNS)
+
+
+def make_key(market, security_type, symbol):
+    return f"{market.lower()}/{security_type.lower()}/{symbol.upper()}".encode()
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def _rows(path):
+    with open(path, newline="") as handle:
+        for row in csv.reader(handle):
+            if row and not row[0].startswith("#"):
+                yield row
+
+
+def compile_tables(properties_path=None, securities_path=None, cache_folder=None):
+    """Compile both CSVs into the cached array folder."""
+    properties_path = properties_path or PROPERTIES_PATH
+    securities_path = securities_path or SECURITIES_PATH
+    rows = list(_rows(properties_path))[1:]
+    text = {name: [] for name in TEXT_COLUMNS}
+    numbers = np.full((len(rows), len(NUMBER_COLUMNS)), np.nan)
+    keys = []
+    for position, row in enumerate(rows):
+        row = row + [""] * (len(TEXT_COLUMNS) + len(NUMBER_COLUMNS) - len(row))
+        market, symbol, security_type, description, currency = row[:5]
+        for name, value in zip(TEXT_COLUMNS, (market.lower(), symbol, security_type.lower(), currency, description, row[8])):
+            text[name].append(value)
+        numbers[position] = [_number(row[index]) for index in (5, 6, 7, 9, 10, 11)]
+        keys.append(make_key(market, security_type, symbol))
+
+    securities = [row for row in _rows(securities_path) if len(row) >= 1 + len(SECURITY_COLUMNS)] if os.path.exists(securities_path) else []
+    security_text = {name: [row[index + 1] for row in securities] for index, name in enumerate(SECURITY_COLUMNS)}
+
+    # Intern every text value once
+    pool = sorted(set().union(*text.values(), *security_text.values()))
+    ids = {value: position for position, value in enumerate(pool)}
+    order = np.argsort(np.array(keys, dtype=bytes), kind="stable")
+    security_order = np.argsort(np.array([row[0] for row in securities], dtype=bytes), kind="stable")
+
+    folder = os.path.join(cache_folder or CACHE_FOLDER, "symbol-properties")
+    staging = folder + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, "strings.npy"), np.array([value.encode() for value in pool], dtype=bytes))
+    np.save(os.path.join(staging, "keys.npy"), np.array(keys, dtype=bytes)[order])
+    for name in TEXT_COLUMNS:
+        np.save(os.path.join(staging, f"{name}.npy"), np.array([ids[value] for value in text[name]], dtype=np.int32)[order])
+    for index, name in enumerate(NUMBER_COLUMNS):
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(numbers[order, index]))
+    np.save(os.path.join(staging, "security_ids.npy"), np.array([row[0] for row in securities], dtype=bytes)[security_order])
+    for name in SECURITY_COLUMNS:
+        values = np.array([ids[value] for value in security_text[name]], dtype=np.int32)
+        np.save(os.path.join(staging, f"security_{name}.npy"), values[security_order] if len(values) else values)
+    sources = [path for path in (properties_path, securities_path) if os.path.exists(path)]
+    write_manifest(staging, {"version": FORMAT_VERSION, "sources": {path: fingerprint(path) for path in sources}})
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(staging, folder)
+    return folder
+
+
+class SymbolPropertiesTable:
+    """Memory-mapped symbol properties with a sorted key index."""
+
+    def __init__(self, folder):
+        def load(name):
+            return np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+
+        self.folder = folder
+        self.strings = load("strings")
+        self.keys = load("keys")
+        self.columns = {name: load(name) for name in TEXT_COLUMNS + NUMBER_COLUMNS}
+        self.security_ids = load("security_ids")
+        self.security_columns = {name: load(f"security_{name}") for name in SECURITY_COLUMNS}
+
+    @classmethod
+    def load(cls, properties_path=None, securities_path=None, cache_folder=None):
+        """Open the compiled table, compiling it when missing or stale."""
+        folder = os.path.join(cache_folder or CACHE_FOLDER, "symbol-properties")
+        sources = [Source(None, path) for path in (properties_path or PROPERTIES_PATH, securities_path or SECURITIES_PATH)
+                   if os.path.exists(path)]
+        if not is_fresh(folder, sources):
+            compile_tables(properties_path, securities_path, cache_folder)
+        return cls(folder)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def string_id(self, value):
+        """Position of an interned string, or -1."""
+        position = int(np.searchsorted(self.strings, value.encode()))
+        return position if position < len(self.strings) and self.strings[position] == value.encode() else -1
+
+    def _find(self, keys):
+        # Keys wider than the index would be truncated into false matches
+        fits = np.array([len(key) <= self.keys.itemsize for key in keys], dtype=bool)
+        keys = np.asarray(keys, dtype=self.keys.dtype)
+        positions = np.searchsorted(self.keys, keys)
+        inside = np.minimum(positions, len(self.keys) - 1)
+        return np.where(fits & (self.keys[inside] == keys), inside, -1)
+
+    def lookup(self, markets, symbols, security_types):
+        """Row of each (market, symbol, type), falling back to the ``[*]`` row; -1 when neither exists.
+
+        Arguments are strings or equal-length sequences of strings.
+        """
+        markets, symbols, security_types = np.broadcast_arrays(
+            np.asarray(markets, dtype=object), np.asarray(symbols, dtype=object), np.asarray(security_types, dtype=object)
+        )
+        shape = markets.shape
+        markets, symbols, security_types = (values.ravel() for values in (markets, symbols, security_types))
+        rows = self._find([make_key(*entry) for entry in zip(markets, security_types, symbols)])
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            rows[missing] = self._find([make_key(markets[row], security_types[row], WILDCARD) for row in missing])
+        return rows.reshape(shape)
+
+    def column(self, name, rows):
+        """Values of a column for rows (NaN / None where a row is -1)."""
+        rows = np.asarray(rows)
+        found = rows >= 0
+        values = self.columns[name][np.where(found, rows, 0)]
+        if name in NUMBER_COLUMNS:
+            return np.where(found, values, np.nan)
+        return np.where(found, self.strings[values].astype(str).astype(object), None)
+
+    def get(self, market, symbol, security_type):
+        """Properties of one symbol, or None."""
+        row = int(self.lookup(market, symbol, security_type))
+        if row < 0:
+            return None
+        return Properties(*(
+            self.strings[self.columns[name][row]].decode() if name in TEXT_COLUMNS else float(self.columns[name][row])
+            for name in Properties._fields
+        ))
+
+    def identifiers(self, security_id):
+        """{cusip, figi, sedol, isin, cik} of a security id such as "AAPL R735QTJ8XC9X", or None."""
+        key = np.asarray(security_id, dtype=self.security_ids.dtype) if len(self.security_ids) else None
+        if key is None:
+            return None
+        position = int(np.searchsorted(self.security_ids, key))
+        if position == len(self.security_ids) or self.security_ids[position] != key:
+            return None
+        return {name: self.strings[values[position]].decode() for name, values in self.security_columns.items()}
+
+    def round_orders(self, rows, quantities, prices=None, security_types=None):
+        """Quantities rounded toward zero to whole lots and prices to the nearest tick.
+
+        Rows of -1 keep lot 1 and tick 0.01. With ``security_types`` (or the
+        types of the rows), equity prices under $1 use SUB_DOLLAR_TICK.
+        """
+        rows = np.asarray(rows)
+        rounded = round_lots(quantities, self.column("lot_size", rows))
+        if prices is None:
+            return rounded
+        prices = np.asarray(prices, dtype=np.float64)
+        ticks = np.nan_to_num(self.column("minimum_price_variation", rows), nan=0.01)
+        ticks = np.where(ticks > 0, ticks, 0.01)
+        if security_types is None:
+            equity = (rows >= 0) & (self.columns["type"][np.maximum(rows, 0)] == self.string_id("equity"))
+        else:
+            equity = np.asarray(security_types, dtype=object) == "equity"
+        ticks = np.where(equity & (np.abs(prices) < 1), SUB_DOLLAR_TICK, ticks)
+        decimals = int(np.ceil(-np.log10(ticks.min()))) + 2 if ticks.size else 2
+        return rounded, np.round(np.round(prices / ticks) * ticks, decimals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile and query the symbol-properties database.")
+    parser.add_argument("symbols", nargs="*", help="market/type/SYMBOL entries, e.g. usa/equity/AAPL")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    started = timer.perf_counter()
+    if args.rebuild:
+        compile_tables()
+    table = SymbolPropertiesTable.load()
+    print(f"{len(table)} rows, {len(table.strings)} interned strings, opened in {(timer.perf_counter() - started) * 1000:.1f} ms")
+    for entry in args.symbols:
+        market, security_type, symbol = entry.split("/")
+        print(f"{entry}: {table.get(market, symbol, security_type)}")
+
+
+if __name__ == "__main__":
+    main()
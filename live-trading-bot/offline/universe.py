@@ -0,0 +1,269 @@
+"""Coarse-fundamental universe selection and an array-backed universe replay.
+
+Every ``fundamental/coarse/<date>.csv`` is compiled once into date-sorted
+columns (close, volume, dollar volume, has-fundamental flag, factors) with
+security ids interned to integers and per-date row offsets, cached next to
+the columnar bar cache. A day's selection is then a slice plus one
+``argpartition`` over dollar volume.
+
+Per-symbol state lives in ``offline.book.SymbolBook``, which (like
+``select_rows``) has no dependency on the replay engine so ``main.py`` can
+import it.
+
+``run_universe`` replays the strategy on the selected universe: equal target
+weights, a rebalance on the first day and at each month start (names that
+left the universe are sold), and the DCA/option checks of ``offline.signals``.
+Like ``offline.engine``, DCA orders are queued, rebalances net them out and
+they fill on the next day with a price. Coarse files only carry closes and no
+dividends, so unlike the engine every order fills at a close (the engine fills
+queued orders at the next open) and there is no DRIP.
+"""
+import argparse
+import os
+import time as timer
+from collections import namedtuple
+
+import numpy as np
+
+from offline.book import COARSE_COLUMNS, CoarseDay, SymbolBook, select_rows
+from offline.cache import CACHE_FOLDER, FORMAT_VERSION, Source, fingerprint, is_fresh, write_manifest
+from offline.data import DATA_FOLDER, yyyymmdd_to_datetime64
+from offline.fills import order_fees
+from offline.metrics import daily_returns, max_drawdown, sharpe_ratio
+from offline.rebalance import minimum_order_margin, plan_rebalance
+from offline.signals import evaluate
+
+UniverseResult = namedtuple("UniverseResult", "days equity cash orders fees selected selection_seconds rebalance_seconds")
+
+
+def coarse_folder(data_folder=None):
+    return os.path.join(data_folder or DATA_FOLDER, "equity", "usa", "fundamental", "coarse")
+
+
+def _list_coarse(data_folder=None):
+    folder = coarse_folder(data_folder)
+    if not os.path.isdir(folder):
+        return []
+    return [Source(name[:-4], os.path.join(folder, name)) for name in sorted(os.listdir(folder)) if name.endswith(".csv")]
+
+
+def compile_coarse(data_folder=None, cache_folder=None):
+    """Pack every coarse file into the cached, date-sorted index; returns its folder."""
+    sources = _list_coarse(data_folder)
+    securities = {}
+    symbols = {}
+    dates = []
+    offsets = [0]
+    ids = []
+    tickers = []
+    values = []
+    for source in sources:
+        with open(source.path) as handle:
+            for line in handle:
+                fields = line.rstrip("\n").split(",")
+                if len(fields) < 8:
+                    continue
+                ids.append(securities.setdefault(fields[0], len(securities)))
+                tickers.append(symbols.setdefault(fields[1], len(symbols)))
+                values.append((
+                    float(fields[2]), float(fields[3]), float(fields[4]),
+                    fields[5] == "True", float(fields[6]), float(fields[7]),
+                ))
+        dates.append(int(source.date))
+        offsets.append(len(ids))
+
+    values = np.array(values, dtype=np.float64).reshape(-1, len(COARSE_COLUMNS))
+    folder = os.path.join(cache_folder or CACHE_FOLDER, "equity", "usa", "fundamental", "coarse")
+    os.makedirs(folder, exist_ok=True)
+    np.savez(
+        os.path.join(folder, "index.npz"),
+        dates=yyyymmdd_to_datetime64(dates).astype(np.int64),
+        offsets=np.array(offsets, dtype=np.int64),
+        security=np.array(ids, dtype=np.int32),
+        symbol=np.array(tickers, dtype=np.int32),
+        security_names=np.array(list(securities)),
+        symbol_names=np.array(list(symbols)),
+        **{name: values[:, index] for index, name in enumerate(COARSE_COLUMNS)},
+    )
+    write_manifest(folder, {
+        "version": FORMAT_VERSION,
+        "sources": {source.path: fingerprint(source.path) for source in sources},
+    })
+    return folder
+
+
+class CoarseIndex:
+    """Date-sorted coarse fundamental rows with O(1) access to one day."""
+
+    def __init__(self, folder):
+        with np.load(os.path.join(folder, "index.npz")) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+        self.dates = self.arrays["dates"].astype("datetime64[D]")
+        self.offsets = self.arrays["offsets"]
+        self.security_names = self.arrays["security_names"]
+        self.symbol_names = self.arrays["symbol_names"]
+        self.has_fundamental = self.arrays["has_fundamental"].astype(bool)
+
+    @classmethod
+    def load(cls, data_folder=None, cache_folder=None):
+        """Open the index, recompiling it when a coarse file was added or changed."""
+        folder = os.path.join(cache_folder or CACHE_FOLDER, "equity", "usa", "fundamental", "coarse")
+        if not is_fresh(folder, _list_coarse(data_folder)):
+            compile_coarse(data_folder, cache_folder)
+        return cls(folder)
+
+    def rows(self, date):
+        """Row slice of one date (empty when the date has no file)."""
+        position = int(np.searchsorted(self.dates, np.datetime64(date, "D")))
+        if position >= len(self.dates) or self.dates[position] != np.datetime64(date, "D"):
+            return slice(0, 0)
+        return slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+
+    def day(self, date):
+        rows = self.rows(date)
+        arrays = self.arrays
+        return CoarseDay(
+            np.datetime64(date, "D"), arrays["security"][rows], arrays["symbol"][rows],
+            arrays["close"][rows], arrays["volume"][rows], arrays["dollar_volume"][rows],
+            self.has_fundamental[rows], arrays["price_factor"][rows], arrays["split_factor"][rows],
+        )
+
+    def select(self, date, size, min_price=5.0, require_fundamental=True):
+        """Rows of the ``size`` largest dollar-volume names on a date, largest first."""
+        return select_rows(self.day(date), size, min_price, require_fundamental)
+
+    def tickers(self, day, rows):
+        return [str(name) for name in self.symbol_names[day.symbol[rows]]]
+
+
+def run_universe(index, params, size=500, start=None, end=None, weight=0.8, min_price=5.0, band=None):
+    """Replay the strategy (``offline.engine.StrategyParams``) over the top ``size`` coarse names."""
+    band = params.rebalance_band if band is None else band
+    days = index.dates
+    if start:
+        days = days[days >= np.datetime64(start, "D")]
+    if end:
+        days = days[days <= np.datetime64(end, "D")]
+
+    book = SymbolBook()
+    # Security id -> book column (-1 when not in the book), so a day's rows map with one gather
+    lookup = np.full(len(index.security_names), -1, dtype=np.int64)
+    cash = float(params.cash)
+    equity = np.empty(len(days))
+    cash_curve = np.empty(len(days))
+    selected = np.empty(len(days), dtype=np.int64)
+    orders = 0
+    fees_paid = 0.0
+    selection_seconds = 0.0
+    rebalance_seconds = 0.0
+    months = days.astype("datetime64[M]")
+
+    for step, date in enumerate(days):
+        started = timer.perf_counter()
+        day = index.day(date)
+        rows = select_rows(day, size, min_price)
+        for security in day.security[rows][lookup[day.security[rows]] < 0]:
+            lookup[security] = book.add(int(security))
+        chosen = lookup[day.security[rows]]
+        selected[step] = len(chosen)
+        selection_seconds += timer.perf_counter() - started
+
+        started = timer.perf_counter()
+        columns = lookup[day.security]
+        known = columns >= 0
+        has_bar = np.zeros(book.capacity, dtype=bool)
+        has_bar[columns[known]] = True
+        # book.price keeps the last close seen, which marks held names missing from today's file
+        book.price[columns[known]] = day.close[known]
+        marks = book.price
+        if step == 0 or months[step] != months[step - 1]:
+            book.weight[:] = 0.0
+            book.weight[chosen] = weight / max(len(chosen), 1)
+            # Sized against the whole portfolio and resetting every priced target, like main.py Rebalance
+            plan = plan_rebalance(
+                book.quantity, np.where(book.active, marks, np.nan), book.weight, cash, band=band,
+                pending=book.pending, minimum_margin=minimum_order_margin(size),
+                total_value=cash + float(book.quantity @ np.nan_to_num(marks)),
+            )
+            traded = plan.columns
+            cash -= float(plan.quantity @ marks[traded] + plan.fee.sum())
+            book.quantity[traded] += plan.quantity
+            targets = book.active & (book.weight > 0) & ~np.isnan(marks)
+            book.last_purchase_price[targets] = marks[targets]
+            orders += len(traded)
+            fees_paid += float(plan.fee.sum())
+
+        # Yesterday's queued DCA orders fill at today's close, once the name has one
+        queued = np.flatnonzero((book.pending != 0) & has_bar)
+        if len(queued):
+            fees = order_fees(book.pending[queued], marks[queued])
+            cash -= float(book.pending[queued] @ marks[queued] + fees.sum())
+            book.quantity[queued] += book.pending[queued]
+            book.pending[queued] = 0.0
+            orders += len(queued)
+            fees_paid += float(fees.sum())
+
+        intents = evaluate(
+            marks, has_bar, book.last_purchase_price, book.quantity, np.zeros(book.capacity),
+            params.dca_threshold, params.call_threshold, params.put_threshold, params.dca_fraction,
+        )
+        book.pending += intents.dca
+        book.last_purchase_price = intents.last_purchase_price
+
+        # Forget names that are neither held nor targeted so the book stays bounded
+        for column in np.flatnonzero(book.active & (book.quantity == 0) & (book.pending == 0) & (book.weight == 0)):
+            lookup[book.keys[column]] = -1
+            book.remove(book.keys[column])
+        rebalance_seconds += timer.perf_counter() - started
+
+        equity[step] = cash + float(book.quantity @ np.nan_to_num(marks))
+        cash_curve[step] = cash
+
+    return UniverseResult(days, equity, cash_curve, orders, fees_paid, selected, selection_seconds, rebalance_seconds)
+
+
+def benchmark(index, params, sizes=(500, 1000, 3000)):
+    """Per-day selection and rebalance cost of run_universe at each universe size."""
+    rows = []
+    for size in sizes:
+        result = run_universe(index, params, size)
+        count = max(len(result.days), 1)
+        rows.append((size, len(result.days), result.selection_seconds / count, result.rebalance_seconds / count, result.orders))
+    return rows
+
+
+def main():
+    from offline.engine import StrategyParams
+
+    parser = argparse.ArgumentParser(description="Replay BuffettStrategy on a coarse-fundamental universe.")
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--cash", type=float, default=StrategyParams.cash)
+    parser.add_argument("--weight", type=float, default=0.8, help="total target weight spread over the universe")
+    parser.add_argument("--band", type=float, default=0.0, help="no-trade band around each target weight")
+    parser.add_argument("--data-folder")
+    parser.add_argument("--benchmark", action="store_true", help="time selection and rebalance at 500/1000/3000 names")
+    args = parser.parse_args()
+
+    started = timer.perf_counter()
+    index = CoarseIndex.load(args.data_folder)
+    print(f"Coarse index: {len(index.dates)} days, {len(index.security_names)} securities in {(timer.perf_counter() - started) * 1000:.1f} ms")
+
+    params = StrategyParams(cash=args.cash)
+    if args.benchmark:
+        print("   size  days  select ms/day  rebalance ms/day  orders")
+        for size, days, select, rebalance, orders in benchmark(index, params):
+            print(f"   {size:>4}  {days:>4}  {select * 1000:>13.3f}  {rebalance * 1000:>16.3f}  {orders:>6}")
+        return
+
+    result = run_universe(index, params, args.size, args.start, args.end, args.weight, band=args.band)
+    print(f"{len(result.days)} days, {result.orders} orders, ${result.fees:.2f} fees")
+    print(
+        f"End equity: ${result.equity[-1]:.2f}, Sharpe: {sharpe_ratio(daily_returns(result.equity)):.2f}, "
+        f"Drawdown: {max_drawdown(result.equity):.2%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
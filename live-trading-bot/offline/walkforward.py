@@ -0,0 +1,244 @@
+"""Walk-forward optimization of the BuffettStrategy thresholds.
+
+Windows are laid out on month boundaries from a fixed origin: each one fits
+the parameter grid on ``train_months`` of history (or on everything since the
+origin with ``anchored``) and then trades the best candidate, untouched, over
+the following ``test_months``. The out-of-sample segments are chained into one
+equity curve, each segment starting from the value the previous one ended at.
+
+Windows are independent, so they run in a process pool over the shared market
+arrays of ``offline.sweep``. Every finished window is stored as JSON under the
+cache folder, keyed by its dates, the grid, the fixed parameters, the replay
+code and a hash of the market rows up to the window's last test day (all
+the replay of that window reads). Extending the date range, or appending
+bars to the daily files, only computes windows whose key is new: with a
+fixed origin the earlier windows keep their dates and their data.
+
+The default grid covers the DCA threshold and fraction. The put and call
+thresholds only raise ``Signal`` records and never trade, so the replay's
+equity cannot tell their values apart and there is nothing to fit them on.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, replace
+
+import numpy as np
+
+from offline.cache import CACHE_FOLDER, file_sha1
+from offline.engine import CHECKPOINT_MODULES, StrategyParams, load_market, market_hash, run_backtest
+from offline.metrics import cagr, daily_returns, max_drawdown, sharpe_ratio, summarize
+from offline.sweep import apply_overrides, attach_market, grid, parse_space, share_market
+
+WALKFORWARD_FOLDER = os.path.join(CACHE_FOLDER, "walkforward")
+CACHE_VERSION = 1
+# Modules whose changes can change a window's result: everything the replay imports, plus scoring
+REPLAY_MODULES = CHECKPOINT_MODULES + ("metrics.py", "walkforward.py")
+DEFAULT_SPACE = {
+    "dca_threshold": [0.03, 0.05, 0.08],
+    "dca_fraction": [0.05, 0.10, 0.20],
+}
+
+Window = namedtuple("Window", "train_start train_end test_start test_end")
+
+_worker_market = None
+_worker_blocks = []
+
+
+def windows(first_day, last_day, train_months=6, test_months=3, anchored=False):
+    """Train/test windows whose test segments tile (first_day + train_months, last_day]."""
+    origin = np.datetime64(first_day, "M")
+    first_day = np.datetime64(first_day, "D")
+    last_day = np.datetime64(last_day, "D")
+    laid_out = []
+    test_start = origin + np.timedelta64(train_months, "M")
+    while test_start.astype("datetime64[D]") <= last_day:
+        test_end = min((test_start + np.timedelta64(test_months, "M")).astype("datetime64[D]") - 1, last_day)
+        train_start = origin if anchored else test_start - np.timedelta64(train_months, "M")
+        laid_out.append(Window(
+            str(max(train_start.astype("datetime64[D]"), first_day)),
+            str(test_start.astype("datetime64[D]") - 1),
+            str(test_start.astype("datetime64[D]")),
+            str(test_end),
+        ))
+        test_start += np.timedelta64(test_months, "M")
+    return laid_out
+
+
+def code_fingerprint():
+    folder = os.path.dirname(__file__)
+    return {name: file_sha1(os.path.join(folder, name)) for name in REPLAY_MODULES}
+
+
+def data_fingerprint(market, window):
+    """Hash of the market rows a window's replay reads: everything up to its last test day."""
+    last = int(np.searchsorted(market.days, np.datetime64(window.test_end, "D"), side="right")) - 1
+    return market_hash(market, last)
+
+
+def window_key(window, candidates, base, metric, code, data):
+    fixed = {name: value for name, value in asdict(base).items() if name not in ("start", "end")}
+    payload = {
+        "version": CACHE_VERSION,
+        "window": window._asdict(),
+        "candidates": candidates,
+        "base": fixed,
+        "metric": metric,
+        "code": code,
+        "data": data,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_cached(key, folder=None):
+    path = os.path.join(folder or WALKFORWARD_FOLDER, f"{key}.json")
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cached(key, result, folder=None):
+    folder = folder or WALKFORWARD_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    staging = os.path.join(folder, f"{key}.json.tmp")
+    with open(staging, "w") as handle:
+        json.dump(result, handle)
+    os.replace(staging, os.path.join(folder, f"{key}.json"))
+
+
+def fit_window(window, candidates, base, metric, market):
+    """Pick the best candidate on the train segment and replay it on the test segment."""
+    best, best_rank = None, None
+    for overrides in candidates:
+        params = replace(apply_overrides(base, overrides), start=window.train_start, end=window.train_end)
+        score = summarize(run_backtest(params, market))[metric]
+        if metric == "drawdown":
+            score = -score
+        # Ties (e.g. a DCA fraction that never traded) go to the candidate closest to the baseline
+        rank = (score, sum(getattr(base, name) == value for name, value in overrides.items()))
+        if best is None or rank > best_rank:
+            best, best_rank = overrides, rank
+    best_score = best_rank[0]
+    params = replace(apply_overrides(base, best), start=window.test_start, end=window.test_end)
+    result = run_backtest(params, market)
+    return {
+        "window": window._asdict(),
+        "best": best,
+        "train_score": float(best_score if metric != "drawdown" else -best_score),
+        "test": summarize(result),
+        "days": [str(day) for day in result.days],
+        "equity": result.equity.tolist(),
+    }
+
+
+def _init_worker(layout):
+    global _worker_market, _worker_blocks
+    _worker_market, _worker_blocks = attach_market(layout)
+
+
+def _fit_one(task):
+    key, window, candidates, base, metric = task
+    return key, fit_window(window, candidates, base, metric, _worker_market)
+
+
+def run_walkforward(candidates, base=None, train_months=6, test_months=3, anchored=False, metric="sharpe",
+                    workers=None, data_folder=None, cache_folder=None):
+    """Fit and test every window, reusing memoized ones; returns (window results, cached count)."""
+    base = base or StrategyParams()
+    candidates = list(candidates)
+    market = load_market(base.symbols, base.start, base.end, base.warmup_days, data_folder)
+    days = market.days[market.days >= np.datetime64(base.start, "D")]
+    if not len(days):
+        return [], 0
+    laid_out = windows(base.start, days[-1], train_months, test_months, anchored)
+    code = code_fingerprint()
+    keys = [
+        window_key(window, candidates, base, metric, code, data_fingerprint(market, window)) for window in laid_out
+    ]
+
+    results = {key: read_cached(key, cache_folder) for key in keys}
+    cached = sum(1 for result in results.values() if result is not None)
+    tasks = [(key, window, candidates, base, metric) for key, window in zip(keys, laid_out) if results[key] is None]
+    if workers == 1 or len(tasks) < 2:
+        for key, window, *arguments in tasks:
+            results[key] = fit_window(window, *arguments, market)
+            write_cached(key, results[key], cache_folder)
+    else:
+        blocks, layout = share_market(market)
+        try:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(layout,)) as pool:
+                for key, result in pool.map(_fit_one, tasks):
+                    write_cached(key, result, cache_folder)
+                    results[key] = result
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    return [results[key] for key in keys], cached
+
+
+def stitch(results, cash):
+    """Chain the test segments into one (days, equity) curve starting from ``cash``."""
+    days, equity = [], []
+    value = float(cash)
+    for result in results:
+        segment = np.asarray(result["equity"], dtype=np.float64)
+        if not len(segment):
+            continue
+        days.extend(result["days"])
+        equity.append(segment * (value / cash))
+        value = equity[-1][-1]
+    return np.array(days, dtype="datetime64[D]"), np.concatenate(equity) if equity else np.empty(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward optimization of BuffettStrategy thresholds.")
+    parser.add_argument("space", nargs="*", help="name=v1,v2,... grid (default: DCA threshold and fraction)")
+    parser.add_argument("--start", default=StrategyParams.start)
+    parser.add_argument("--end")
+    parser.add_argument("--train-months", type=int, default=6)
+    parser.add_argument("--test-months", type=int, default=3)
+    parser.add_argument("--anchored", action="store_true", help="train on everything since the start")
+    parser.add_argument("--metric", default="sharpe", choices=("sharpe", "cagr", "drawdown", "end_equity"))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="CSV of the stitched out-of-sample equity curve")
+    parser.add_argument("--data-folder")
+    args = parser.parse_args()
+
+    space = parse_space(args.space) if args.space else DEFAULT_SPACE
+    if any(isinstance(values, tuple) for values in space.values()):
+        parser.error("Walk-forward fits a grid; use comma separated values")
+    base = StrategyParams(start=args.start, end=args.end)
+    results, cached = run_walkforward(
+        grid(space), base, args.train_months, args.test_months, args.anchored, args.metric,
+        args.workers, args.data_folder,
+    )
+    print(f"{len(results)} windows ({cached} from cache, {len(results) - cached} fitted)")
+    for result in results:
+        window = result["window"]
+        best = ", ".join(f"{name}={value:g}" for name, value in result["best"].items())
+        print(
+            f"   test {window['test_start']} .. {window['test_end']}: {best}  "
+            f"train {args.metric} {result['train_score']:.3f}, test sharpe {result['test']['sharpe']:.3f}"
+        )
+    days, equity = stitch(results, base.cash)
+    if len(equity):
+        print(
+            f"Out-of-sample {days[0]} .. {days[-1]}: end ${equity[-1]:.2f}, CAGR {cagr(equity):.2%}, "
+            f"Sharpe {sharpe_ratio(daily_returns(equity)):.3f}, drawdown {max_drawdown(equity):.2%}"
+        )
+    if args.output and len(equity):
+        with open(args.output, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["day", "equity"])
+            writer.writerows(zip(days.astype(str), equity.round(2)))
+
+
+if __name__ == "__main__":
+    main()